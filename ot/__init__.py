@@ -20,6 +20,7 @@ from . import da
 from . import gromov
 from . import smooth
 from . import stochastic
+from . import partial
 
 # OT functions
 from .lp import emd, emd2
@@ -33,4 +34,4 @@ __version__ = "0.4.0"
 
 __all__ = ["emd", "emd2", "sinkhorn", "sinkhorn2", "utils", 'datasets',
            'bregman', 'lp', 'tic', 'toc', 'toq', 'gromov',
-           'dist', 'unif', 'barycenter', 'sinkhorn_lpl1_mm', 'da', 'optim']
+           'dist', 'unif', 'barycenter', 'sinkhorn_lpl1_mm', 'da', 'optim', 'partial']
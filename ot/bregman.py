@@ -8,7 +8,10 @@ Bregman projections for regularized OT
 #
 # License: MIT License
 
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
+import scipy.sparse as sp
 
 
 def sinkhorn(a, b, M, reg, method='sinkhorn', numItermax=1000,
@@ -122,7 +125,8 @@ def sinkhorn(a, b, M, reg, method='sinkhorn', numItermax=1000,
 
 
 def sinkhorn2(a, b, M, reg, method='sinkhorn', numItermax=1000,
-              stopThr=1e-9, verbose=False, log=False, **kwargs):
+              stopThr=1e-9, verbose=False, log=False, return_grad=False,
+              **kwargs):
     u"""
     Solve the entropic regularization optimal transport problem and return the loss
 
@@ -167,12 +171,24 @@ def sinkhorn2(a, b, M, reg, method='sinkhorn', numItermax=1000,
         Print information along iterations
     log : bool, optional
         record log if True
+    return_grad : bool, optional
+        return the entropic regularized OT objective W and its gradients
+        w.r.t. a, b and M if True (only available for a single target
+        distribution b)
 
 
     Returns
     -------
     W : (nt) ndarray or float
-        Optimal transportation matrix for the given parameters
+        OT loss <gamma,M>_F of the optimal transportation matrix, or the
+        regularized objective <gamma,M>_F + reg*Omega(gamma) if return_grad
+        (the transport loss is then in log['transport_loss'])
+    grad : tuple of ndarray (ns,), (nt,) and (ns,nt)
+        gradients of the regularized objective W w.r.t. a, b and M, return
+        only if return_grad==True in parameters. By the envelope theorem,
+        they are the centered dual potentials reg*log(u) and reg*log(v) for
+        a and b and the OT matrix for M, all obtained from the final
+        scalings without a second solve.
     log : dict
         log dictionary return only if log==True in parameters
 
@@ -229,14 +245,41 @@ def sinkhorn2(a, b, M, reg, method='sinkhorn', numItermax=1000,
             return sinkhorn_knopp(a, b, M, reg, **kwargs)
 
     b = np.asarray(b, dtype=np.float64)
+
+    if return_grad:
+        if len(b.shape) > 1:
+            raise ValueError('return_grad is only available for a single '
+                             'target distribution b')
+        M = np.asarray(M, dtype=np.float64)
+
+        # loss and gradients share the OT matrix and the final potentials
+        G, log_sink = sinkhorn(a, b, M, reg, method=method,
+                               numItermax=numItermax, stopThr=stopThr,
+                               verbose=verbose, log=True, **kwargs)
+        # the gradients are the ones of the regularized objective
+        transport_loss = np.sum(G * M)
+        Gpos = G[G > 0]
+        res = np.array([transport_loss + reg * np.sum(Gpos * np.log(Gpos))])
+        log_sink['transport_loss'] = transport_loss
+        if 'alpha' in log_sink:
+            f, g = log_sink['alpha'], log_sink['beta']
+        else:
+            f, g = reg * np.log(log_sink['u']), reg * np.log(log_sink['v'])
+        grad = (f - np.mean(f), g - np.mean(g), G)
+        if log:
+            return res, grad, log_sink
+        else:
+            return res, grad
+
     if len(b.shape) < 2:
         b = b.reshape((-1, 1))
 
     return sink()
 
 
-def sinkhorn_knopp(a, b, M, reg, numItermax=1000,
-                   stopThr=1e-9, verbose=False, log=False, **kwargs):
+def sinkhorn_knopp(a, b, M, reg, numItermax=1000, stopThr=1e-9,
+                   verbose=False, log=False, batch_size=None, processes=None,
+                   control=None, warmstart=None, **kwargs):
     """
     Solve the entropic regularization optimal transport problem and return the OT matrix
 
@@ -278,14 +321,30 @@ def sinkhorn_knopp(a, b, M, reg, numItermax=1000,
         Print information along iterations
     log : bool, optional
         record log if True
+    batch_size : int, optional
+        with multiple targets, solve the problems by chunks of batch_size
+        targets (bounds the memory used by the scalings)
+    processes : int, optional
+        number of threads used to solve the chunks of targets (the kernel is
+        shared between the threads)
+    control : ot.utils.SolverControl, optional
+        time, matvec and duality gap budgets (the best scalings found so far
+        are returned when a budget is exhausted)
+    warmstart : tuple of vectors, optional
+        if given, starting dual potentials alpha and beta (the scalings are
+        u=exp(alpha/reg) and v=exp(beta/reg)), e.g. log['warmstart'] of a
+        previous problem with a close M
 
 
     Returns
     -------
     gamma : (ns x nt) ndarray
-        Optimal transportation matrix for the given parameters
+        Optimal transportation matrix for the given parameters (or OT losses
+        (nbb,) for multiple targets)
     log : dict
-        log dictionary return only if log==True in parameters
+        log dictionary return only if log==True in parameters. For multiple
+        targets log['couplings'] is a generator yielding the OT matrix of
+        each target on demand.
 
     Examples
     --------
@@ -321,6 +380,77 @@ def sinkhorn_knopp(a, b, M, reg, numItermax=1000,
     if len(b) == 0:
         b = np.ones((M.shape[1],), dtype=np.float64) / M.shape[1]
 
+    if len(b.shape) > 1:
+        nbb = b.shape[1]
+    else:
+        nbb = 0
+
+    # Next 3 lines equivalent to K= np.exp(-M/reg), but faster to compute
+    K = np.empty(M.shape, dtype=M.dtype)
+    np.divide(M, -reg, out=K)
+    np.exp(K, out=K)
+
+    if control is not None:
+        control.start()
+
+    if warmstart is None:
+        u0 = None
+    else:
+        u0 = np.exp(warmstart[0] / reg)
+
+    if nbb and batch_size is not None and nbb > batch_size:
+        # independent chunks of targets sharing the same kernel
+        chunks = [(b[:, i:i + batch_size],
+                   None if u0 is None else u0[:, i:i + batch_size])
+                  for i in range(0, nbb, batch_size)]
+        pool = ThreadPool(processes)
+        try:
+            res = pool.map(
+                lambda c: _sinkhorn_knopp_scalings(a, c[0], K, reg, numItermax,
+                                                   stopThr, verbose, control,
+                                                   c[1]),
+                chunks)
+        finally:
+            pool.close()
+            pool.join()
+        u = np.hstack([r[0] for r in res])
+        v = np.hstack([r[1] for r in res])
+        # worst error of the chunks still running at each check
+        errs = [r[2] for r in res]
+        err = [max(e[i] for e in errs if i < len(e))
+               for i in range(max(len(e) for e in errs))]
+    else:
+        u, v, err = _sinkhorn_knopp_scalings(a, b, K, reg, numItermax,
+                                             stopThr, verbose, control, u0)
+
+    if log:
+        log = {'err': err, 'u': u, 'v': v,
+               'warmstart': (reg * np.log(u), reg * np.log(v))}
+        if control is not None:
+            control.update_log(log)
+
+    if nbb:  # return only loss
+        res = _multi_target_loss(u, K, v, M)
+        if log:
+            log['couplings'] = (u[:, i].reshape((-1, 1)) * K *
+                                v[:, i].reshape((1, -1)) for i in range(nbb))
+            return res, log
+        else:
+            return res
+
+    else:  # return OT matrix
+
+        if log:
+            return u.reshape((-1, 1)) * K * v.reshape((1, -1)), log
+        else:
+            return u.reshape((-1, 1)) * K * v.reshape((1, -1))
+
+
+def _sinkhorn_knopp_scalings(a, b, K, reg, numItermax=1000, stopThr=1e-9,
+                             verbose=False, control=None, u0=None):
+    """Sinkhorn-Knopp iterations on kernel K starting from the scaling u0,
+    return scalings and errors"""
+
     # init data
     Nini = len(a)
     Nfin = len(b)
@@ -330,8 +460,7 @@ def sinkhorn_knopp(a, b, M, reg, numItermax=1000,
     else:
         nbb = 0
 
-    if log:
-        log = {'err': []}
+    errs = []
 
     # we assume that no distances are null except those of the diagonal of
     # distances
@@ -341,27 +470,43 @@ def sinkhorn_knopp(a, b, M, reg, numItermax=1000,
     else:
         u = np.ones(Nini) / Nini
         v = np.ones(Nfin) / Nfin
-
-    # print(reg)
-
-    # Next 3 lines equivalent to K= np.exp(-M/reg), but faster to compute
-    K = np.empty(M.shape, dtype=M.dtype)
-    np.divide(M, -reg, out=K)
-    np.exp(K, out=K)
-
-    # print(np.min(K))
-    tmp = np.empty(K.shape, dtype=M.dtype)
-    tmp2 = np.empty(b.shape, dtype=M.dtype)
+    if u0 is not None:
+        u = u0
+
+    tmp = np.empty(K.shape, dtype=K.dtype)
+    tmp2 = np.empty(b.shape, dtype=K.dtype)
+
+    def marginal_error(u, v):
+        """squared error on the target marginal and duality gap"""
+        np.multiply(u.reshape(-1, 1), K, out=tmp)
+        np.multiply(tmp, v.reshape(1, -1), out=tmp)
+        np.sum(tmp, axis=0, out=tmp2)
+        np.subtract(tmp2, b, out=tmp2)
+        # the source marginal is exact after the update of u
+        gap = abs(np.dot(reg * np.log(v), tmp2))
+        return np.linalg.norm(tmp2)**2, gap
+
+    def target_errors(u, v):
+        """squared errors on the target marginals of each target"""
+        return np.sum((v * np.dot(K.T, u) - b)**2, axis=0)
 
     Kp = (1 / a).reshape(-1, 1) * K
     cpt = 0
     err = 1
+    best = (np.inf, u, v)
+    if nbb and control is not None:
+        # best scalings of each target for the budget fallback
+        best_errs = np.full(nbb, np.inf)
+        best_u = u.copy()
+        best_v = v.copy()
     while (err > stopThr and cpt < numItermax):
         uprev = u
         vprev = v
         KtransposeU = np.dot(K.T, u)
         v = np.divide(b, KtransposeU)
         u = 1. / np.dot(Kp, v)
+        if control is not None:
+            control.add_matvec(2)
 
         if (np.any(KtransposeU == 0) or
                 np.any(np.isnan(u)) or np.any(np.isnan(v)) or
@@ -372,20 +517,25 @@ def sinkhorn_knopp(a, b, M, reg, numItermax=1000,
             u = uprev
             v = vprev
             break
+        gap = None
         if cpt % 10 == 0:
             # we can speed up the process by checking for the error only all
             # the 10th iterations
             if nbb:
                 err = np.sum((u - uprev)**2) / np.sum((u)**2) + \
                     np.sum((v - vprev)**2) / np.sum((v)**2)
+                if control is not None:
+                    control.add_matvec(1)
+                    errs_k = target_errors(u, v)
+                    better = errs_k < best_errs
+                    best_errs[better] = errs_k[better]
+                    best_u[:, better] = u[:, better]
+                    best_v[:, better] = v[:, better]
             else:
-                np.multiply(u.reshape(-1, 1), K, out=tmp)
-                np.multiply(tmp, v.reshape(1, -1), out=tmp)
-                np.sum(tmp, axis=0, out=tmp2)
-                tmp2 -= b
-                err = np.linalg.norm(tmp2)**2
-            if log:
-                log['err'].append(err)
+                err, gap = marginal_error(u, v)
+                if err < best[0]:
+                    best = (err, u, v)
+            errs.append(err)
 
             if verbose:
                 if cpt % 200 == 0:
@@ -393,30 +543,38 @@ def sinkhorn_knopp(a, b, M, reg, numItermax=1000,
                         '{:5s}|{:12s}'.format('It.', 'Err') + '\n' + '-' * 19)
                 print('{:5d}|{:8e}|'.format(cpt, err))
         cpt = cpt + 1
-    if log:
-        log['u'] = u
-        log['v'] = v
 
-    if nbb:  # return only loss
-        res = np.zeros((nbb))
-        for i in range(nbb):
-            res[i] = np.sum(
-                u[:, i].reshape((-1, 1)) * K * v[:, i].reshape((1, -1)) * M)
-        if log:
-            return res, log
-        else:
-            return res
+        if control is not None and control.stop(gap):
+            # return the best iterate found so far
+            if nbb:
+                worse = target_errors(u, v) > best_errs
+                u = np.where(worse, best_u, u)
+                v = np.where(worse, best_v, v)
+            elif marginal_error(u, v)[0] > best[0]:
+                u, v = best[1], best[2]
+            break
 
-    else:  # return OT matrix
+    return u, v, errs
 
-        if log:
-            return u.reshape((-1, 1)) * K * v.reshape((1, -1)), log
-        else:
-            return u.reshape((-1, 1)) * K * v.reshape((1, -1))
+
+def _multi_target_loss(u, K, v, M, max_elements=2**22):
+    """OT losses sum_ij u_ik K_ij v_jk M_ij for all targets k
+
+    The contraction is computed by blocks of rows of K*M so that only one
+    temporary of at most max_elements values is allocated.
+    """
+    n, m = K.shape
+    res = np.zeros(u.shape[1])
+    step = max(1, max_elements // m)
+    for i in range(0, n, step):
+        KM = K[i:i + step] * M[i:i + step]
+        res += np.sum(u[i:i + step] * np.dot(KM, v), axis=0)
+    return res
 
 
 def sinkhorn_stabilized(a, b, M, reg, numItermax=1000, tau=1e3, stopThr=1e-9,
-                        warmstart=None, verbose=False, print_period=20, log=False, **kwargs):
+                        warmstart=None, verbose=False, print_period=20, log=False,
+                        control=None, **kwargs):
     """
     Solve the entropic regularization OT problem with log stabilization
 
@@ -463,6 +621,10 @@ def sinkhorn_stabilized(a, b, M, reg, numItermax=1000, tau=1e3, stopThr=1e-9,
         Print information along iterations
     log : bool, optional
         record log if True
+    control : ot.utils.SolverControl, optional
+        time, matvec and duality gap budgets (the best scalings found so far
+        are returned when a budget is exhausted, the last ones with multiple
+        targets)
 
 
     Returns
@@ -549,11 +711,15 @@ def sinkhorn_stabilized(a, b, M, reg, numItermax=1000, tau=1e3, stopThr=1e-9,
 
     # print(np.min(K))
 
+    if control is not None:
+        control.start()
+
     K = get_K(alpha, beta)
     transp = K
     loop = 1
     cpt = 0
     err = 1
+    best = (np.inf, alpha, beta, u, v)
     while loop:
 
         uprev = u
@@ -562,6 +728,8 @@ def sinkhorn_stabilized(a, b, M, reg, numItermax=1000, tau=1e3, stopThr=1e-9,
         # sinkhorn update
         v = b / (np.dot(K.T, u) + 1e-16)
         u = a / (np.dot(K, v) + 1e-16)
+        if control is not None:
+            control.add_matvec(2)
 
         # remove numerical problems and store them in K
         if np.abs(u).max() > tau or np.abs(v).max() > tau:
@@ -576,6 +744,7 @@ def sinkhorn_stabilized(a, b, M, reg, numItermax=1000, tau=1e3, stopThr=1e-9,
                     u, v = np.ones(na) / na, np.ones(nb) / nb
             K = get_K(alpha, beta)
 
+        gap = None
         if cpt % print_period == 0:
             # we can speed up the process by checking for the error only all
             # the 10th iterations
@@ -584,7 +753,12 @@ def sinkhorn_stabilized(a, b, M, reg, numItermax=1000, tau=1e3, stopThr=1e-9,
                     np.sum((v - vprev)**2) / np.sum((v)**2)
             else:
                 transp = get_Gamma(alpha, beta, u, v)
-                err = np.linalg.norm((np.sum(transp, axis=0) - b))**2
+                merr = np.sum(transp, axis=0) - b
+                err = np.linalg.norm(merr)**2
+                # the source marginal is exact after the update of u
+                gap = abs(np.dot(beta + reg * np.log(v), merr))
+                if err < best[0]:
+                    best = (err, alpha, beta, u, v)
             if log:
                 log['err'].append(err)
 
@@ -608,36 +782,46 @@ def sinkhorn_stabilized(a, b, M, reg, numItermax=1000, tau=1e3, stopThr=1e-9,
             v = vprev
             break
 
+        if loop and control is not None and control.stop(gap):
+            # the absorbed potentials are shared by all the targets so the
+            # last iterate is returned for multiple targets
+            if not nbb:
+                # return the best iterate found so far
+                err = np.linalg.norm(v * np.dot(K.T, u) - b)**2
+                if err > best[0]:
+                    err, alpha, beta, u, v = best
+            break
+
         cpt = cpt + 1
 
     # print('err=',err,' cpt=',cpt)
     if log:
+        if control is not None:
+            control.update_log(log)
         log['logu'] = alpha / reg + np.log(u)
         log['logv'] = beta / reg + np.log(v)
         log['alpha'] = alpha + reg * np.log(u)
         log['beta'] = beta + reg * np.log(v)
         log['warmstart'] = (log['alpha'], log['beta'])
         if nbb:
-            res = np.zeros((nbb))
-            for i in range(nbb):
-                res[i] = np.sum(get_Gamma(alpha, beta, u[:, i], v[:, i]) * M)
+            res = _multi_target_loss(u, get_K(alpha, beta), v, M)
             return res, log
 
         else:
             return get_Gamma(alpha, beta, u, v), log
     else:
         if nbb:
-            res = np.zeros((nbb))
-            for i in range(nbb):
-                res[i] = np.sum(get_Gamma(alpha, beta, u[:, i], v[:, i]) * M)
+            res = _multi_target_loss(u, get_K(alpha, beta), v, M)
             return res
         else:
             return get_Gamma(alpha, beta, u, v)
 
 
 def sinkhorn_epsilon_scaling(a, b, M, reg, numItermax=100, epsilon0=1e4, numInnerItermax=100,
-                             tau=1e3, stopThr=1e-9, warmstart=None, verbose=False, print_period=10, log=False, **kwargs):
-    """
+                             tau=1e3, stopThr=1e-9, warmstart=None, verbose=False, print_period=10,
+                             log=False, scaling_base=np.exp(-1), truncate=None,
+                             control=None, **kwargs):
+    r"""
     Solve the entropic regularization optimal transport problem with log
     stabilization and epsilon scaling.
 
@@ -661,6 +845,15 @@ def sinkhorn_epsilon_scaling(a, b, M, reg, numItermax=100, epsilon0=1e4, numInne
     scaling algorithm as proposed in [2]_ but with the log stabilization
     proposed in [10]_ and the log scaling proposed in [9]_ algorithm 3.2
 
+    The regularization follows the geometric schedule
+    :math:`\epsilon_n = \max(reg, \epsilon_0 \cdot scaling\_base^n)`. The
+    scalings are absorbed in the dual potentials alpha and beta when the
+    regularization changes so that the kernel is computed only once per
+    epsilon level (and when the scalings exceed tau). The kernel can also be
+    truncated at each level, in which case it is built by blocks of rows and
+    stored as a sparse matrix, only its significant entries are
+    exponentiated and stored [9]_.
+
 
     Parameters
     ----------
@@ -674,22 +867,31 @@ def sinkhorn_epsilon_scaling(a, b, M, reg, numItermax=100, epsilon0=1e4, numInne
         Regularization term >0
     tau : float
         thershold for max value in u or v for log scaling
-    tau : float
-        thershold for max value in u or v for log scaling
     warmstart : tible of vectors
         if given then sarting values for alpha an beta log scalings
     numItermax : int, optional
-        Max number of iterations
+        Max number of epsilon levels (outer iterations)
     numInnerItermax : int, optional
-        Max number of iterationsin the inner slog stabilized sinkhorn
-    epsilon0 : int, optional
-        first epsilon regularization value (then exponential decrease to reg)
+        Max number of sinkhorn iterations for each epsilon level
+    epsilon0 : float, optional
+        first epsilon regularization value (then geometric decrease to reg)
+    scaling_base : float, optional
+        ratio in ]0,1[ between two successive epsilon values
+    truncate : float or None, optional
+        if given, kernel values below truncate (relative to the absorbed
+        potentials) are set to zero and the kernel is stored as a sparse
+        matrix. The memory used by the kernel is then proportional to its
+        number of entries above truncate (the returned OT matrix is dense).
+        Levels where more than half the entries are kept (large epsilon)
+        use the dense kernel.
     stopThr : float, optional
         Stop threshol on error (>0)
     verbose : bool, optional
         Print information along iterations
     log : bool, optional
         record log if True
+    control : ot.utils.SolverControl, optional
+        time and matvec budgets
 
 
     Returns
@@ -738,11 +940,6 @@ def sinkhorn_epsilon_scaling(a, b, M, reg, numItermax=100, epsilon0=1e4, numInne
     na = len(a)
     nb = len(b)
 
-    # nrelative umerical precision with 64 bits
-    numItermin = 35
-    numItermax = max(numItermin, numItermax)  # ensure that last velue is exact
-
-    cpt = 0
     if log:
         log = {'err': []}
 
@@ -753,55 +950,137 @@ def sinkhorn_epsilon_scaling(a, b, M, reg, numItermax=100, epsilon0=1e4, numInne
     else:
         alpha, beta = warmstart
 
-    def get_K(alpha, beta):
+    def get_K_dense(alpha, beta, regi):
         """log space computation"""
-        return np.exp(-(M - alpha.reshape((na, 1)) -
-                        beta.reshape((1, nb))) / reg)
-
-    # print(np.min(K))
-    def get_reg(n):  # exponential decreasing
-        return (epsilon0 - reg) * np.exp(-n) + reg
+        K = np.empty(M.shape, dtype=M.dtype)
+        np.subtract(M, alpha.reshape((na, 1)), out=K)
+        K -= beta.reshape((1, nb))
+        K /= -regi
+        np.exp(K, out=K)
+        return K
+
+    def get_K(alpha, beta, regi):
+        """log space computation (truncated and sparse if required)"""
+        if truncate is None:
+            return get_K_dense(alpha, beta, regi)
+        # the csr matrix is built by blocks of rows so that the dense log
+        # kernel is never stored
+        thr = regi * np.log(truncate)
+        step = max(1, 2 ** 16 // nb)
+        indptr, indices, data = [np.zeros(1, dtype=np.int64)], [], []
+        nnz = 0
+        for i in range(0, na, step):
+            logK = alpha[i:i + step, None] + beta[None, :] - M[i:i + step]
+            keep = logK >= thr
+            rows, cols = np.nonzero(keep)
+            indptr.append(nnz + np.cumsum(np.count_nonzero(keep, axis=1)))
+            indices.append(cols.astype(np.int32))
+            data.append(np.exp(logK[rows, cols] / regi))
+            nnz += len(cols)
+            if nnz > na * nb // 2:
+                # not sparse enough (large epsilon), the dense kernel is
+                # smaller than the sparse one
+                return get_K_dense(alpha, beta, regi)
+        return sp.csr_matrix((np.concatenate(data), np.concatenate(indices),
+                              np.concatenate(indptr)), shape=(na, nb))
+
+    def get_reg(n):  # geometric decrease down to reg
+        return max(reg, epsilon0 * scaling_base**n)
+
+    # the scalings are relative to the absorbed potentials alpha and beta
+    u, v = np.ones(na), np.ones(nb)
+
+    if control is not None:
+        control.start()
+
+    regi = get_reg(0)
+    K = get_K(alpha, beta, regi)
+    nkernel = 1
 
     loop = 1
     cpt = 0
+    niter = 0
     err = 1
     while loop:
 
-        regi = get_reg(cpt)
+        for it in range(numInnerItermax):
+            uprev = u
+            vprev = v
+
+            # sinkhorn update
+            v = b / (K.T.dot(u) + 1e-16)
+            u = a / (K.dot(v) + 1e-16)
+            niter += 1
+            if control is not None:
+                control.add_matvec(2)
+
+            if np.any(np.isnan(u)) or np.any(np.isnan(v)):
+                # we have reached the machine precision
+                # come back to previous solution and quit loop
+                print('Warning: numerical errors at iteration', niter)
+                u = uprev
+                v = vprev
+                loop = False
+                break
+
+            # remove numerical problems and store them in K
+            if np.abs(u).max() > tau or np.abs(v).max() > tau:
+                alpha, beta = alpha + regi * np.log(u), beta + regi * np.log(v)
+                u, v = np.ones(na), np.ones(nb)
+                K = get_K(alpha, beta, regi)
+                nkernel += 1
+
+            if it % 10 == 0:
+                # marginal violation computed with the current kernel
+                err = np.linalg.norm(v * K.T.dot(u) - b)**2
+                if err <= stopThr:
+                    break
+
+        err = np.linalg.norm(v * K.T.dot(u) - b)**2
+        if log:
+            log['err'].append(err)
 
-        G, logi = sinkhorn_stabilized(a, b, M, regi, numItermax=numInnerItermax, stopThr=1e-9, warmstart=(
-            alpha, beta), verbose=False, print_period=20, tau=tau, log=True)
+        if verbose:
+            if cpt % (print_period * 10) == 0:
+                print(
+                    '{:5s}|{:12s}|{:12s}'.format('It.', 'Reg', 'Err') + '\n' + '-' * 32)
+            if cpt % print_period == 0:
+                print('{:5d}|{:8e}|{:8e}|'.format(cpt, regi, err))
 
-        alpha = logi['alpha']
-        beta = logi['beta']
+        if regi <= reg and err <= stopThr:
+            loop = False
 
         if cpt >= numItermax:
             loop = False
 
-        if cpt % (print_period) == 0:  # spsion nearly converged
-            # we can speed up the process by checking for the error only all
-            # the 10th iterations
-            transp = G
-            err = np.linalg.norm(
-                (np.sum(transp, axis=0) - b))**2 + np.linalg.norm((np.sum(transp, axis=1) - a))**2
-            if log:
-                log['err'].append(err)
-
-            if verbose:
-                if cpt % (print_period * 10) == 0:
-                    print(
-                        '{:5s}|{:12s}'.format('It.', 'Err') + '\n' + '-' * 19)
-                print('{:5d}|{:8e}|'.format(cpt, err))
-
-        if err <= stopThr and cpt > numItermin:
+        if loop and control is not None and control.stop():
             loop = False
 
-        cpt = cpt + 1
-    # print('err=',err,' cpt=',cpt)
+        if loop:
+            cpt = cpt + 1
+            reg_next = get_reg(cpt)
+            if reg_next != regi:
+                # absorb the scalings in the potentials before decreasing
+                # epsilon so that the new kernel is already nearly scaled
+                alpha, beta = alpha + regi * np.log(u), beta + regi * np.log(v)
+                u, v = np.ones(na), np.ones(nb)
+                regi = reg_next
+                K = get_K(alpha, beta, regi)
+                nkernel += 1
+
+    if sp.issparse(K):
+        G = sp.diags(u).dot(K).dot(sp.diags(v)).toarray()
+    else:
+        G = u.reshape((-1, 1)) * K * v.reshape((1, -1))
+
     if log:
-        log['alpha'] = alpha
-        log['beta'] = beta
+        log['alpha'] = alpha + regi * np.log(u)
+        log['beta'] = beta + regi * np.log(v)
         log['warmstart'] = (log['alpha'], log['beta'])
+        log['niter'] = niter
+        log['nkernel'] = nkernel
+        if control is not None:
+            control.update_log(log)
         return G, log
     else:
         return G
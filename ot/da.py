@@ -11,18 +11,31 @@ Domain adaptation with optimal transport
 
 import numpy as np
 import scipy.linalg as linalg
+from scipy.spatial import cKDTree
 
 from .bregman import sinkhorn
 from .lp import emd
 from .utils import unif, dist, kernel, cost_normalization
 from .utils import check_params, deprecated, BaseEstimator
+from .utils import check_random_state
 from .optim import cg
 from .optim import gcg
 
 
+def _label_groups(labels):
+    """ return the class index of each sample, the permutation sorting the
+    samples by class and the start of each class in the sorted samples, so
+    that sums over the classes are np.add.reduceat(X[order], starts)"""
+    _, groups = np.unique(labels, return_inverse=True)
+    order = np.argsort(groups, kind='mergesort')
+    counts = np.bincount(groups)
+    starts = np.cumsum(counts) - counts
+    return groups, order, starts
+
+
 def sinkhorn_lpl1_mm(a, labels_a, b, M, reg, eta=0.1, numItermax=10,
                      numInnerItermax=200, stopInnerThr=1e-9, verbose=False,
-                     log=False):
+                     log=False, stopThr=1e-6):
     """
     Solve the entropic regularization optimal transport problem with nonconvex
     group lasso regularization
@@ -77,6 +90,9 @@ def sinkhorn_lpl1_mm(a, labels_a, b, M, reg, eta=0.1, numItermax=10,
         Print information along iterations
     log : bool, optional
         record log if True
+    stopThr : float, optional
+        Stop when the relative variation of the majoration weights of the
+        classes is below stopThr
 
 
     Returns
@@ -84,7 +100,8 @@ def sinkhorn_lpl1_mm(a, labels_a, b, M, reg, eta=0.1, numItermax=10,
     gamma : (ns x nt) ndarray
         Optimal transportation matrix for the given parameters
     log : dict
-        log dictionary return only if log==True in parameters
+        log dictionary return only if log==True in parameters, with the
+        relative variation of the weights of each iteration in err
 
 
     References
@@ -108,32 +125,57 @@ def sinkhorn_lpl1_mm(a, labels_a, b, M, reg, eta=0.1, numItermax=10,
     p = 0.5
     epsilon = 1e-3
 
-    indices_labels = []
-    classes = np.unique(labels_a)
-    for c in classes:
-        idxc, = np.where(labels_a == c)
-        indices_labels.append(idxc)
+    groups, order, starts = _label_groups(labels_a)
+
+    # the majoration weights are the same for all the samples of a class,
+    # they are stored as a (nclasses, nt) array W
+    W = np.zeros((len(starts), M.shape[1]))
+    Wprev = np.empty_like(W)
+    Mreg = np.empty(M.shape)
+    potentials = None
+
+    if log:
+        log = {'err': []}
 
-    W = np.zeros(M.shape)
+    if verbose:
+        print('{:5s}|{:12s}'.format('It.', 'Err') + '\n' + '-' * 19)
 
     for cpt in range(numItermax):
-        Mreg = M + eta * W
-        transp = sinkhorn(a, b, Mreg, reg, numItermax=numInnerItermax,
-                          stopThr=stopInnerThr)
+        # Mreg = M + eta * W[groups]
+        np.take(W, groups, axis=0, out=Mreg)
+        Mreg *= eta
+        Mreg += M
+        transp, logi = sinkhorn(a, b, Mreg, reg, numItermax=numInnerItermax,
+                                stopThr=stopInnerThr, log=True,
+                                warmstart=potentials)
+        # the next problem is close, start from the current potentials
+        potentials = logi['warmstart']
+
         # the transport has been computed. Check if classes are really
         # separated
-        W = np.ones(M.shape)
-        for (i, c) in enumerate(classes):
-            majs = np.sum(transp[indices_labels[i]], axis=0)
-            majs = p * ((majs + epsilon)**(p - 1))
-            W[indices_labels[i]] = majs
+        W, Wprev = Wprev, W
+        np.add.reduceat(transp[order], starts, axis=0, out=W)
+        W += epsilon
+        W **= p - 1
+        W *= p
+
+        err = np.linalg.norm(W - Wprev) / np.linalg.norm(W)
+        if log:
+            log['err'].append(err)
+        if verbose:
+            print('{:5d}|{:8e}|'.format(cpt, err))
+        if err < stopThr:
+            break
 
-    return transp
+    if log:
+        return transp, log
+    else:
+        return transp
 
 
 def sinkhorn_l1l2_gl(a, labels_a, b, M, reg, eta=0.1, numItermax=10,
                      numInnerItermax=200, stopInnerThr=1e-9, verbose=False,
-                     log=False):
+                     log=False, **kwargs):
     """
     Solve the entropic regularization optimal transport problem with group
     lasso regularization
@@ -188,6 +230,9 @@ def sinkhorn_l1l2_gl(a, labels_a, b, M, reg, eta=0.1, numItermax=10,
         Print information along iterations
     log : bool, optional
         record log if True
+    **kwargs : dict
+        parameters passed to the ot.optim.gcg solver, e.g. stopGap to stop
+        on the generalized conditional gradient gap
 
 
     Returns
@@ -213,29 +258,27 @@ def sinkhorn_l1l2_gl(a, labels_a, b, M, reg, eta=0.1, numItermax=10,
     ot.optim.gcg : Generalized conditional gradient for OT problems
 
     """
-    lstlab = np.unique(labels_a)
+    # rows sorted by class, so that the norms of the groups are segment
+    # reductions over contiguous rows
+    groups, order, starts = _label_groups(labels_a)
+
+    def group_norms(G):
+        """ norms of the blocks G[labels_a == lab, j], shape (nlab, nt)"""
+        return np.sqrt(np.add.reduceat(G[order]**2, starts, axis=0))
 
     def f(G):
-        res = 0
-        for i in range(G.shape[1]):
-            for lab in lstlab:
-                temp = G[labels_a == lab, i]
-                res += np.linalg.norm(temp)
-        return res
+        return np.sum(group_norms(G))
 
     def df(G):
+        # broadcast the norm of its group to each entry of G
+        n = group_norms(G)[groups]
         W = np.zeros(G.shape)
-        for i in range(G.shape[1]):
-            for lab in lstlab:
-                temp = G[labels_a == lab, i]
-                n = np.linalg.norm(temp)
-                if n:
-                    W[labels_a == lab, i] = temp / n
+        np.divide(G, n, out=W, where=n > 0)
         return W
 
     return gcg(a, b, M, reg, eta, f, df, G0=None, numItermax=numItermax,
                numInnerItermax=numInnerItermax, stopThr=stopInnerThr,
-               verbose=verbose, log=log)
+               verbose=verbose, log=log, **kwargs)
 
 
 def joint_OT_mapping_linear(xs, xt, mu=1, eta=0.001, bias=False, verbose=False,
@@ -425,11 +468,85 @@ def joint_OT_mapping_linear(xs, xt, mu=1, eta=0.001, bias=False, verbose=False,
         return G, L
 
 
+def kernel_approximation(xs, method='nystroem', n_components=100,
+                         kerneltype='gaussian', sigma=1, random_state=None):
+    """Low rank feature map approximating a kernel on the samples xs
+
+    Returns a function phi such that phi(x1).dot(phi(x2).T) approximates
+    the kernel matrix between x1 and x2 with n_components features, using
+    either the Nystroem method [25] on n_components random landmarks of xs
+    or the random Fourier features [26] of the gaussian kernel.
+
+    Parameters
+    ----------
+    xs : np.ndarray (ns,d)
+        samples in the source domain
+    method : str, optional
+        'nystroem' or 'rff' (random Fourier features)
+    n_components : int, optional
+        Number of features (for 'nystroem', at most ns and the directions of
+        the numerically singular landmark kernel are discarded)
+    kerneltype : str,optional
+        kernel used by calling function ot.utils.kernel (gaussian by default)
+    sigma : float, optional
+        Gaussian kernel bandwidth.
+    random_state : int, RandomState instance or None, optional
+        Seed of the landmarks or of the random features
+
+    Returns
+    -------
+    phi : function
+        feature map, phi(x) is a (n, r) ndarray with r <= n_components
+
+    References
+    ----------
+
+    .. [25] C. Williams, M. Seeger, "Using the Nystroem method to speed up
+       kernel machines", Neural Information Processing Systems (NIPS), 2001.
+
+    .. [26] A. Rahimi, B. Recht, "Random features for large-scale kernel
+       machines", Neural Information Processing Systems (NIPS), 2007.
+
+    """
+
+    generator = check_random_state(random_state)
+
+    if method == 'nystroem':
+        idx = generator.choice(xs.shape[0], min(n_components, xs.shape[0]),
+                               replace=False)
+        landmarks = xs[idx]
+        # K_nm K_mm^-1/2, the small eigenvalues of K_mm are discarded
+        w, V = linalg.eigh(kernel(landmarks, landmarks, method=kerneltype,
+                                  sigma=sigma))
+        keep = w > 1e-12 * np.max(w)
+        T = V[:, keep] / np.sqrt(w[keep])
+
+        def phi(x):
+            return kernel(x, landmarks, method=kerneltype,
+                          sigma=sigma).dot(T)
+
+    elif method == 'rff':
+        if kerneltype.lower() not in ['gaussian', 'gauss', 'rbf']:
+            raise ValueError("Random Fourier features are only available "
+                             "for the gaussian kernel")
+        W = generator.randn(xs.shape[1], n_components) / sigma
+        b = generator.rand(n_components) * 2 * np.pi
+
+        def phi(x):
+            return np.sqrt(2. / n_components) * np.cos(x.dot(W) + b)
+
+    else:
+        raise ValueError("Unknown kernel approximation '{}'".format(method))
+
+    return phi
+
+
 def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
                             sigma=1, bias=False, verbose=False, verbose2=False,
                             numItermax=100, numInnerItermax=10,
                             stopInnerThr=1e-6, stopThr=1e-5, log=False,
-                            **kwargs):
+                            kernel_approx=None, n_components=100,
+                            random_state=None, **kwargs):
     """Joint OT and nonlinear mapping estimation with kernels as proposed in [8]
 
     The function solves the following optimization problem:
@@ -462,6 +579,10 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
     descent that alternates between updates of G (using conditionnal gradient)
     and the update of L using a classical kernel least square solver.
 
+    For large ns, the kernel can be replaced by n_components features
+    approximating it (see ot.da.kernel_approximation), L is then a linear
+    mapping of the features and no ns x ns matrix is computed.
+
 
     Parameters
     ----------
@@ -491,6 +612,14 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
         Print information along iterations
     log : bool, optional
         record log if True
+    kernel_approx : str or function, optional
+        If given, approximate the kernel with the 'nystroem' or 'rff'
+        features or with a feature map returned by
+        ot.da.kernel_approximation (needed to map new samples)
+    n_components : int, optional
+        Number of features of the kernel approximation
+    random_state : int, RandomState instance or None, optional
+        Seed of the kernel approximation
 
 
     Returns
@@ -498,7 +627,8 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
     gamma : (ns x nt) ndarray
         Optimal transportation matrix for the given parameters
     L : (ns x d) ndarray
-        Nonlinear mapping matrix (ns+1 x d if bias)
+        Nonlinear mapping matrix (ns+1 x d if bias, r (+1) x d with the r
+        features of kernel_approx)
     log : dict
         log dictionary return only if log==True in parameters
 
@@ -519,8 +649,22 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
 
     ns, nt = xs.shape[0], xt.shape[0]
 
-    K = kernel(xs, xs, method=kerneltype, sigma=sigma)
-    if bias:
+    if kernel_approx is not None:
+        if not callable(kernel_approx):
+            kernel_approx = kernel_approximation(
+                xs, kernel_approx, n_components=n_components,
+                kerneltype=kerneltype, sigma=sigma, random_state=random_state)
+
+        # ridge regression on the features
+        K1 = kernel_approx(xs)
+        Kreg = np.eye(K1.shape[1] + int(bias))
+        if bias:
+            K1 = np.hstack((K1, np.ones((ns, 1))))
+            Kreg[-1] = 0
+        K0 = K1.T.dot(K1) + eta * Kreg
+
+    elif bias:
+        K = kernel(xs, xs, method=kerneltype, sigma=sigma)
         K1 = np.hstack((K, np.ones((ns, 1))))
         Id = np.eye(ns + 1)
         Id[-1] = 0
@@ -536,6 +680,7 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
         Kreg = Kp
 
     else:
+        K = kernel(xs, xs, method=kerneltype, sigma=sigma)
         K1 = K
         Id = np.eye(ns)
 
@@ -554,6 +699,10 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
     M = dist(xs, xt) * ns
     G = emd(a, b, M)
 
+    # K0 is symmetric positive definite and does not depend on G, it is
+    # factorized once
+    K0_cho = linalg.cho_factor(K0)
+
     vloss = []
 
     def loss(L, G):
@@ -564,12 +713,12 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
     def solve_L_nobias(G):
         """ solve L problem with fixed G (least square)"""
         xst = ns * G.dot(xt)
-        return np.linalg.solve(K0, xst)
+        return linalg.cho_solve(K0_cho, xst)
 
     def solve_L_bias(G):
         """ solve L problem with fixed G (least square)"""
         xst = ns * G.dot(xt)
-        return np.linalg.solve(K0, K1.T.dot(xst))
+        return linalg.cho_solve(K0_cho, K1.T.dot(xst))
 
     def solve_G(L, G0):
         """Update G with CG algorithm"""
@@ -584,7 +733,7 @@ def joint_OT_mapping_kernel(xs, xt, mu=1, eta=0.001, kerneltype='gaussian',
                numItermax=numInnerItermax, stopThr=stopInnerThr)
         return G
 
-    if bias:
+    if bias or kernel_approx is not None:
         solve_L = solve_L_bias
     else:
         solve_L = solve_L_nobias
@@ -1060,8 +1209,195 @@ class BaseTransport(BaseEstimator):
 
     transform method should always get as input a Xs parameter
     inverse_transform method should always get as input a Xt parameter
+
+    The barycentric mapping of the training samples is computed once for
+    each coupling. Out of sample points are transported with the mapping of
+    their nearest training sample, found with the index given by the
+    nn_index attribute: 'kd_tree' (default, scipy.spatial.cKDTree),
+    'brute' (pairwise distances) or a function building an index from the
+    training samples, with a query(X) method returning the distances and
+    indices of the nearest neighbours (e.g. sklearn.neighbors.BallTree).
+
+    With fit(..., batch_size=...) or partial_fit, the couplings are only
+    computed between minibatches of source and target samples, so that the
+    memory used by the cost and coupling matrices is bounded by the batch
+    size. The barycentric mapping is then the one of the average of the
+    minibatch couplings, and no full coupling_ is stored.
     """
 
+    nn_index = 'kd_tree'
+
+    def _minibatch_coupling(self, Xs, ys, Xt, yt):
+        """fit the estimator on a minibatch, return the sums of the
+        transported source and target samples and the masses of the samples
+        in the coupling"""
+        # fit rescales limit_max by the maximum of the cost
+        limit_max = self.limit_max
+        self.fit(Xs, ys, Xt, yt)
+        self.limit_max = limit_max
+        G = self.coupling_
+        return G.dot(Xt), np.sum(G, 1), G.T.dot(Xs), np.sum(G, 0)
+
+    def _set_minibatch_mapping(self, xs, transp_xs, xt, transp_xt):
+        """store the training samples and their barycentric mapping
+        estimated on minibatches"""
+        self.xs_ = xs
+        self.xt_ = xt
+        # no full coupling, the mappings are the ones of the minibatches
+        self.coupling_ = None
+        self.cost_ = None
+        self._mapping_cache = None
+        self._minibatch_mapping = {False: transp_xs, True: transp_xt}
+
+    def _fit_minibatch(self, Xs, ys, Xt, yt, batch_size, n_epochs=1,
+                       random_state=None):
+        """average the couplings of random minibatches of source and target
+        samples, each sample is in at least one minibatch per epoch"""
+        generator = check_random_state(random_state)
+        ns, nt = Xs.shape[0], Xt.shape[0]
+        sum_xs = np.zeros((ns, Xt.shape[1]))
+        mass_s = np.zeros(ns)
+        sum_xt = np.zeros((nt, Xs.shape[1]))
+        mass_t = np.zeros(nt)
+
+        for epoch in range(n_epochs):
+            batches_s = np.array_split(generator.permutation(ns),
+                                       max(1, ns // batch_size))
+            batches_t = np.array_split(generator.permutation(nt),
+                                       max(1, nt // batch_size))
+            for k in range(max(len(batches_s), len(batches_t))):
+                # the batches of the smallest domain are reused
+                idx_s = batches_s[k % len(batches_s)]
+                idx_t = batches_t[k % len(batches_t)]
+                res = self._minibatch_coupling(
+                    Xs[idx_s], None if ys is None else ys[idx_s],
+                    Xt[idx_t], None if yt is None else yt[idx_t])
+                sum_xs[idx_s] += res[0]
+                mass_s[idx_s] += res[1]
+                sum_xt[idx_t] += res[2]
+                mass_t[idx_t] += res[3]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            transp_xs = sum_xs / mass_s[:, None]
+            transp_xt = sum_xt / mass_t[:, None]
+        # set nans to 0
+        transp_xs[~ np.isfinite(transp_xs)] = 0
+        transp_xt[~ np.isfinite(transp_xt)] = 0
+
+        self._set_minibatch_mapping(Xs, transp_xs, Xt, transp_xt)
+        return self
+
+    def partial_fit(self, Xs=None, ys=None, Xt=None, yt=None):
+        """Transport a new minibatch of source and target samples (Xs, ys)
+        and (Xt, yt) and add them to the training samples
+
+        The coupling is only computed between the samples of the minibatch,
+        which allows to fit the estimator on chunks of samples streamed from
+        the disk. The samples of the previous calls keep their mapping.
+
+        Parameters
+        ----------
+        Xs : array-like, shape (n_source_samples, n_features)
+            The training input samples of the minibatch.
+        ys : array-like, shape (n_source_samples,)
+            The class labels
+        Xt : array-like, shape (n_target_samples, n_features)
+            The training input samples of the minibatch.
+        yt : array-like, shape (n_target_samples,)
+            The class labels. If some target samples are unlabeled, fill the
+            yt's elements with -1.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+
+        # check the necessary inputs parameters are here
+        if check_params(Xs=Xs, Xt=Xt):
+
+            # a fit since the last call restarts the stream
+            stream = getattr(self, '_stream', None)
+            if stream is None or stream.get('view') is not getattr(
+                    self, 'xs_', None):
+                stream = {}
+
+            res = self._minibatch_coupling(Xs, ys, Xt, yt)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                transp_Xs = res[0] / res[1][:, None]
+                transp_Xt = res[2] / res[3][:, None]
+            transp_Xs[~ np.isfinite(transp_Xs)] = 0
+            transp_Xt[~ np.isfinite(transp_Xt)] = 0
+
+            # the samples are stored in buffers with a doubling capacity
+            for key, X in [('xs', Xs), ('transp_xs', transp_Xs),
+                           ('xt', Xt), ('transp_xt', transp_Xt)]:
+                buf, n = stream.get(key, (np.empty((0, X.shape[1])), 0))
+                if n + X.shape[0] > buf.shape[0]:
+                    new_buf = np.empty((max(2 * buf.shape[0],
+                                            n + X.shape[0]), X.shape[1]))
+                    new_buf[:n] = buf[:n]
+                    buf = new_buf
+                buf[n:n + X.shape[0]] = X
+                stream[key] = (buf, n + X.shape[0])
+
+            self._set_minibatch_mapping(
+                *[stream[key][0][:stream[key][1]]
+                  for key in ['xs', 'transp_xs', 'xt', 'transp_xt']])
+            stream['view'] = self.xs_
+            self._stream = stream
+
+        return self
+
+    def _barycentric_mapping(self, inverse=False):
+        """barycentric mapping of the source samples (of the target samples
+        if inverse), cached for the current coupling"""
+        if self.coupling_ is None:
+            # fitted on minibatches, no full coupling
+            return self._minibatch_mapping[inverse]
+
+        if getattr(self, '_mapping_cache', None) is None:
+            self._mapping_cache = {}
+        cached = self._mapping_cache.get(inverse)
+        if cached is None or cached[0] is not self.coupling_:
+            if inverse:
+                transp = self.coupling_.T / np.sum(self.coupling_, 0)[:, None]
+                X = self.xs_
+            else:
+                transp = self.coupling_ / np.sum(self.coupling_, 1)[:, None]
+                X = self.xt_
+
+            # set nans to 0
+            transp[~ np.isfinite(transp)] = 0
+
+            cached = (self.coupling_, np.dot(transp, X))
+            self._mapping_cache[inverse] = cached
+        return cached[1]
+
+    def _nearest_neighbors(self, X, inverse=False):
+        """indices of the nearest source samples of X (nearest target
+        samples if inverse), the index is cached for the training samples"""
+        X_train = self.xt_ if inverse else self.xs_
+        if self.nn_index == 'brute':
+            return np.argmin(dist(X, X_train), axis=1)
+
+        if getattr(self, '_nn_cache', None) is None:
+            self._nn_cache = {}
+        cached = self._nn_cache.get(inverse)
+        stale = cached is None or cached[0] is not X_train
+        if stale or cached[1] != self.nn_index:
+            if self.nn_index == 'kd_tree':
+                index = cKDTree(X_train)
+            elif callable(self.nn_index):
+                index = self.nn_index(X_train)
+            else:
+                raise ValueError("Unknown nearest neighbors index "
+                                 "'{}'".format(self.nn_index))
+            cached = (X_train, self.nn_index, index)
+            self._nn_cache[inverse] = cached
+        _, idx = cached[2].query(X)
+        return np.asarray(idx).reshape(-1)
+
     def fit(self, Xs=None, ys=None, Xt=None, yt=None):
         """Build a coupling matrix from source and target sets of samples
         (Xs, ys) and (Xt, yt)
@@ -1099,18 +1435,15 @@ class BaseTransport(BaseEstimator):
                 if self.limit_max != np.infty:
                     self.limit_max = self.limit_max * np.max(self.cost_)
 
-                # assumes labeled source samples occupy the first rows
-                # and labeled target samples occupy the first columns
-                classes = [c for c in np.unique(ys) if c != -1]
-                for c in classes:
-                    idx_s = np.where((ys != c) & (ys != -1))
-                    idx_t = np.where(yt == c)
-
-                    # all the coefficients corresponding to a source sample
-                    # and a target sample :
-                    # with different labels get a infinite
-                    for j in idx_t[0]:
-                        self.cost_[idx_s[0], j] = self.limit_max
+                # all the coefficients corresponding to a labeled source
+                # sample and a target sample with a different label of a
+                # source class get a infinite cost
+                ys, yt = np.asarray(ys), np.asarray(yt)
+                classes = np.unique(ys[ys != -1])
+                mask = ys[:, None] != yt[None, :]
+                mask &= (ys != -1)[:, None]
+                mask &= np.in1d(yt, classes)[None, :]
+                np.putmask(self.cost_, mask, self.limit_max)
 
             # distribution estimation
             self.mu_s = self.distribution_estimation(Xs)
@@ -1119,6 +1452,7 @@ class BaseTransport(BaseEstimator):
             # store arrays of samples
             self.xs_ = Xs
             self.xt_ = Xt
+            self._minibatch_mapping = None
 
         return self
 
@@ -1179,16 +1513,12 @@ class BaseTransport(BaseEstimator):
         # check the necessary inputs parameters are here
         if check_params(Xs=Xs):
 
-            if np.array_equal(self.xs_, Xs):
+            # standard barycentric mapping of the training samples
+            transp_Xs_train = self._barycentric_mapping()
 
-                # perform standard barycentric mapping
-                transp = self.coupling_ / np.sum(self.coupling_, 1)[:, None]
-
-                # set nans to 0
-                transp[~ np.isfinite(transp)] = 0
+            if np.array_equal(self.xs_, Xs):
 
-                # compute transported samples
-                transp_Xs = np.dot(transp, self.xt_)
+                transp_Xs = transp_Xs_train.copy()
             else:
                 # perform out of sample mapping
                 indices = np.arange(Xs.shape[0])
@@ -1200,17 +1530,11 @@ class BaseTransport(BaseEstimator):
                 for bi in batch_ind:
 
                     # get the nearest neighbor in the source domain
-                    D0 = dist(Xs[bi], self.xs_)
-                    idx = np.argmin(D0, axis=1)
-
-                    # transport the source samples
-                    transp = self.coupling_ / np.sum(
-                        self.coupling_, 1)[:, None]
-                    transp[~ np.isfinite(transp)] = 0
-                    transp_Xs_ = np.dot(transp, self.xt_)
+                    idx = self._nearest_neighbors(Xs[bi])
 
                     # define the transported points
-                    transp_Xs_ = transp_Xs_[idx, :] + Xs[bi] - self.xs_[idx, :]
+                    transp_Xs_ = transp_Xs_train[idx, :] + Xs[bi]
+                    transp_Xs_ -= self.xs_[idx, :]
 
                     transp_Xs.append(transp_Xs_)
 
@@ -1248,16 +1572,12 @@ class BaseTransport(BaseEstimator):
         # check the necessary inputs parameters are here
         if check_params(Xt=Xt):
 
-            if np.array_equal(self.xt_, Xt):
-
-                # perform standard barycentric mapping
-                transp_ = self.coupling_.T / np.sum(self.coupling_, 0)[:, None]
+            # standard barycentric mapping of the training samples
+            transp_Xt_train = self._barycentric_mapping(inverse=True)
 
-                # set nans to 0
-                transp_[~ np.isfinite(transp_)] = 0
+            if np.array_equal(self.xt_, Xt):
 
-                # compute transported samples
-                transp_Xt = np.dot(transp_, self.xs_)
+                transp_Xt = transp_Xt_train.copy()
             else:
                 # perform out of sample mapping
                 indices = np.arange(Xt.shape[0])
@@ -1268,17 +1588,11 @@ class BaseTransport(BaseEstimator):
                 transp_Xt = []
                 for bi in batch_ind:
 
-                    D0 = dist(Xt[bi], self.xt_)
-                    idx = np.argmin(D0, axis=1)
-
-                    # transport the target samples
-                    transp_ = self.coupling_.T / np.sum(
-                        self.coupling_, 0)[:, None]
-                    transp_[~ np.isfinite(transp_)] = 0
-                    transp_Xt_ = np.dot(transp_, self.xs_)
+                    idx = self._nearest_neighbors(Xt[bi], inverse=True)
 
                     # define the transported points
-                    transp_Xt_ = transp_Xt_[idx, :] + Xt[bi] - self.xt_[idx, :]
+                    transp_Xt_ = transp_Xt_train[idx, :] + Xt[bi]
+                    transp_Xt_ -= self.xt_[idx, :]
 
                     transp_Xt.append(transp_Xt_)
 
@@ -1520,7 +1834,8 @@ class SinkhornTransport(BaseTransport):
         self.distribution_estimation = distribution_estimation
         self.out_of_sample_map = out_of_sample_map
 
-    def fit(self, Xs=None, ys=None, Xt=None, yt=None):
+    def fit(self, Xs=None, ys=None, Xt=None, yt=None,
+            batch_size=None, n_epochs=1, random_state=None):
         """Build a coupling matrix from source and target sets of samples
         (Xs, ys) and (Xt, yt)
 
@@ -1538,6 +1853,15 @@ class SinkhornTransport(BaseTransport):
 
             Warning: Note that, due to this convention -1 cannot be used as a
             class label
+        batch_size : int, optional (default=None)
+            If given, the couplings are estimated on random minibatches of
+            batch_size source and target samples and averaged, see
+            ot.da.BaseTransport. No full coupling is computed, so the
+            coupling_ and cost_ attributes are set to None
+        n_epochs : int, optional (default=1)
+            Number of passes over the samples when batch_size is given
+        random_state : int, RandomState instance or None, optional
+            Seed of the minibatches when batch_size is given
 
         Returns
         -------
@@ -1545,6 +1869,10 @@ class SinkhornTransport(BaseTransport):
             Returns self.
         """
 
+        if batch_size is not None:
+            return self._fit_minibatch(Xs, ys, Xt, yt, batch_size, n_epochs,
+                                       random_state)
+
         super(SinkhornTransport, self).fit(Xs, ys, Xt, yt)
 
         # coupling estimation
@@ -1618,7 +1946,8 @@ class EMDTransport(BaseTransport):
         self.out_of_sample_map = out_of_sample_map
         self.max_iter = max_iter
 
-    def fit(self, Xs, ys=None, Xt=None, yt=None):
+    def fit(self, Xs, ys=None, Xt=None, yt=None,
+            batch_size=None, n_epochs=1, random_state=None):
         """Build a coupling matrix from source and target sets of samples
         (Xs, ys) and (Xt, yt)
 
@@ -1636,6 +1965,15 @@ class EMDTransport(BaseTransport):
 
             Warning: Note that, due to this convention -1 cannot be used as a
             class label
+        batch_size : int, optional (default=None)
+            If given, the couplings are estimated on random minibatches of
+            batch_size source and target samples and averaged, see
+            ot.da.BaseTransport. No full coupling is computed, so the
+            coupling_ and cost_ attributes are set to None
+        n_epochs : int, optional (default=1)
+            Number of passes over the samples when batch_size is given
+        random_state : int, RandomState instance or None, optional
+            Seed of the minibatches when batch_size is given
 
         Returns
         -------
@@ -1643,6 +1981,10 @@ class EMDTransport(BaseTransport):
             Returns self.
         """
 
+        if batch_size is not None:
+            return self._fit_minibatch(Xs, ys, Xt, yt, batch_size, n_epochs,
+                                       random_state)
+
         super(EMDTransport, self).fit(Xs, ys, Xt, yt)
 
         returned_ = emd(
@@ -1730,7 +2072,8 @@ class SinkhornLpl1Transport(BaseTransport):
         self.out_of_sample_map = out_of_sample_map
         self.limit_max = limit_max
 
-    def fit(self, Xs, ys=None, Xt=None, yt=None):
+    def fit(self, Xs, ys=None, Xt=None, yt=None,
+            batch_size=None, n_epochs=1, random_state=None):
         """Build a coupling matrix from source and target sets of samples
         (Xs, ys) and (Xt, yt)
 
@@ -1748,6 +2091,15 @@ class SinkhornLpl1Transport(BaseTransport):
 
             Warning: Note that, due to this convention -1 cannot be used as a
             class label
+        batch_size : int, optional (default=None)
+            If given, the couplings are estimated on random minibatches of
+            batch_size source and target samples and averaged, see
+            ot.da.BaseTransport. No full coupling is computed, so the
+            coupling_ and cost_ attributes are set to None
+        n_epochs : int, optional (default=1)
+            Number of passes over the samples when batch_size is given
+        random_state : int, RandomState instance or None, optional
+            Seed of the minibatches when batch_size is given
 
         Returns
         -------
@@ -1755,6 +2107,10 @@ class SinkhornLpl1Transport(BaseTransport):
             Returns self.
         """
 
+        if batch_size is not None:
+            return self._fit_minibatch(Xs, ys, Xt, yt, batch_size, n_epochs,
+                                       random_state)
+
         # check the necessary inputs parameters are here
         if check_params(Xs=Xs, Xt=Xt, ys=ys):
 
@@ -1852,7 +2208,8 @@ class SinkhornL1l2Transport(BaseTransport):
         self.out_of_sample_map = out_of_sample_map
         self.limit_max = limit_max
 
-    def fit(self, Xs, ys=None, Xt=None, yt=None):
+    def fit(self, Xs, ys=None, Xt=None, yt=None,
+            batch_size=None, n_epochs=1, random_state=None):
         """Build a coupling matrix from source and target sets of samples
         (Xs, ys) and (Xt, yt)
 
@@ -1870,6 +2227,15 @@ class SinkhornL1l2Transport(BaseTransport):
 
             Warning: Note that, due to this convention -1 cannot be used as a
             class label
+        batch_size : int, optional (default=None)
+            If given, the couplings are estimated on random minibatches of
+            batch_size source and target samples and averaged, see
+            ot.da.BaseTransport. No full coupling is computed, so the
+            coupling_ and cost_ attributes are set to None
+        n_epochs : int, optional (default=1)
+            Number of passes over the samples when batch_size is given
+        random_state : int, RandomState instance or None, optional
+            Seed of the minibatches when batch_size is given
 
         Returns
         -------
@@ -1877,6 +2243,10 @@ class SinkhornL1l2Transport(BaseTransport):
             Returns self.
         """
 
+        if batch_size is not None:
+            return self._fit_minibatch(Xs, ys, Xt, yt, batch_size, n_epochs,
+                                       random_state)
+
         # check the necessary inputs parameters are here
         if check_params(Xs=Xs, Xt=Xt, ys=ys):
 
@@ -1932,6 +2302,14 @@ class MappingTransport(BaseEstimator):
         Print information along iterations
     log : bool, optional (default=False)
         record log if True
+    kernel_approx : string, optional (default=None)
+        If given, the gaussian kernel is approximated with 'nystroem' or
+        'rff' (random Fourier features) features, see
+        ot.da.kernel_approximation
+    n_components : int, optional (default=100)
+        Number of features of the kernel approximation
+    random_state : int, RandomState instance or None, optional (default=None)
+        Seed of the kernel approximation
 
     Attributes
     ----------
@@ -1942,6 +2320,11 @@ class MappingTransport(BaseEstimator):
         The associated mapping
         array-like, shape (n_source_samples (+ 1), n_features)
         (if bias) for kernel == gaussian
+        array-like, shape (n_components (+ 1), n_features) at most
+        (if bias) for kernel == gaussian with kernel_approx
+    features_ : function
+        The feature map of the kernel approximation (None for the linear
+        kernel or without kernel_approx)
     log_ : dictionary
         The dictionary of log, empty dic if parameter log is not True
 
@@ -1957,7 +2340,8 @@ class MappingTransport(BaseEstimator):
     def __init__(self, mu=1, eta=0.001, bias=False, metric="sqeuclidean",
                  norm=None, kernel="linear", sigma=1, max_iter=100, tol=1e-5,
                  max_inner_iter=10, inner_tol=1e-6, log=False, verbose=False,
-                 verbose2=False):
+                 verbose2=False, kernel_approx=None, n_components=100,
+                 random_state=None):
 
         self.metric = metric
         self.norm = norm
@@ -1973,6 +2357,9 @@ class MappingTransport(BaseEstimator):
         self.log = log
         self.verbose = verbose
         self.verbose2 = verbose2
+        self.kernel_approx = kernel_approx
+        self.n_components = n_components
+        self.random_state = random_state
 
     def fit(self, Xs=None, ys=None, Xt=None, yt=None):
         """Builds an optimal coupling and estimates the associated mapping
@@ -2004,6 +2391,7 @@ class MappingTransport(BaseEstimator):
 
             self.xs_ = Xs
             self.xt_ = Xt
+            self.features_ = None
 
             if self.kernel == "linear":
                 returned_ = joint_OT_mapping_linear(
@@ -2014,13 +2402,18 @@ class MappingTransport(BaseEstimator):
                     stopInnerThr=self.inner_tol, log=self.log)
 
             elif self.kernel == "gaussian":
+                if self.kernel_approx is not None:
+                    self.features_ = kernel_approximation(
+                        Xs, self.kernel_approx, n_components=self.n_components,
+                        kerneltype=self.kernel, sigma=self.sigma,
+                        random_state=self.random_state)
                 returned_ = joint_OT_mapping_kernel(
                     Xs, Xt, mu=self.mu, eta=self.eta, bias=self.bias,
                     sigma=self.sigma, verbose=self.verbose,
                     verbose2=self.verbose, numItermax=self.max_iter,
                     numInnerItermax=self.max_inner_iter,
                     stopInnerThr=self.inner_tol, stopThr=self.tol,
-                    log=self.log)
+                    log=self.log, kernel_approx=self.features_)
 
             # deal with the value of log
             if self.log:
@@ -2058,7 +2451,9 @@ class MappingTransport(BaseEstimator):
                 # compute transported samples
                 transp_Xs = np.dot(transp, self.xt_)
             else:
-                if self.kernel == "gaussian":
+                if self.features_ is not None:
+                    K = self.features_(Xs)
+                elif self.kernel == "gaussian":
                     K = kernel(Xs, self.xs_, method=self.kernel,
                                sigma=self.sigma)
                 elif self.kernel == "linear":
@@ -13,7 +13,7 @@ import cudamat
 
 
 def sinkhorn(a, b, M_GPU, reg, numItermax=1000, stopThr=1e-9, verbose=False,
-                log=False, returnAsGPU=False):
+                log=False, returnAsGPU=False, warmstart=None):
     r"""
     Solve the entropic regularization optimal transport problem on GPU
 
@@ -56,6 +56,9 @@ def sinkhorn(a, b, M_GPU, reg, numItermax=1000, stopThr=1e-9, verbose=False,
         record log if True
     returnAsGPU : bool, optional
         return the OT matrix as a cudamat.CUDAMatrix
+    warmstart : tuple of vectors, optional
+        if given, starting dual potentials alpha and beta, e.g.
+        log['warmstart'] of a previous problem with a close M
 
     Returns
     -------
@@ -97,7 +100,10 @@ def sinkhorn(a, b, M_GPU, reg, numItermax=1000, stopThr=1e-9, verbose=False,
 
     # we assume that no distances are null except those of the diagonal of
     # distances
-    u = (np.ones(Nini) / Nini).reshape((Nini, 1))
+    if warmstart is None:
+        u = (np.ones(Nini) / Nini).reshape((Nini, 1))
+    else:
+        u = np.exp(warmstart[0] / reg).reshape((Nini, 1))
     u_GPU = cudamat.CUDAMatrix(u)
     a_GPU = cudamat.CUDAMatrix(a.reshape((Nini, 1)))
     ones_GPU = cudamat.empty(u_GPU.shape).assign(1)
@@ -154,6 +160,8 @@ def sinkhorn(a, b, M_GPU, reg, numItermax=1000, stopThr=1e-9, verbose=False,
     if log:
         log['u'] = u_GPU.asarray()
         log['v'] = v_GPU.asarray()
+        log['warmstart'] = (reg * np.log(log['u'].ravel()),
+                            reg * np.log(log['v'].ravel()))
 
     K_GPU.mult_by_col(u_GPU, target=K_GPU)
     K_GPU.mult_by_row(v_GPU.transpose(), target=K_GPU)
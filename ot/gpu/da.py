@@ -77,7 +77,7 @@ def pairwiseEuclideanGPU(a, b, returnAsGPU=False, squared=False):
 
 def sinkhorn_lpl1_mm(a, labels_a, b, M_GPU, reg, eta=0.1, numItermax=10,
                      numInnerItermax=200, stopInnerThr=1e-9,
-                     verbose=False, log=False):
+                     verbose=False, log=False, stopThr=1e-6):
     """
     Solve the entropic regularization optimal transport problem with nonconvex group lasso regularization
 
@@ -125,6 +125,9 @@ def sinkhorn_lpl1_mm(a, labels_a, b, M_GPU, reg, eta=0.1, numItermax=10,
         Print information along iterations
     log : bool, optional
         record log if True
+    stopThr : float, optional
+        Stop when the relative variation of the majoration weights of the
+        classes is below stopThr
 
 
     Returns
@@ -132,7 +135,8 @@ def sinkhorn_lpl1_mm(a, labels_a, b, M_GPU, reg, eta=0.1, numItermax=10,
     gamma : (ns x nt) ndarray
         Optimal transportation matrix for the given parameters
     log : dict
-        log dictionary return only if log==True in parameters
+        log dictionary return only if log==True in parameters, with the
+        relative variation of the weights of each iteration in err
 
 
     References
@@ -158,33 +162,68 @@ def sinkhorn_lpl1_mm(a, labels_a, b, M_GPU, reg, eta=0.1, numItermax=10,
         idxc, = np.where(labels_a == c)
         indices_labels.append(cudamat.CUDAMatrix(idxc.reshape(1, -1)))
 
+    # buffers allocated once for all the iterations
+    tmpC_GPU = [cudamat.empty((Nfin, idx.shape[1])) for idx in indices_labels]
+    majs_GPU = [cudamat.empty((Nfin, 1)).assign(0) for idx in indices_labels]
+    newmajs_GPU = cudamat.empty((Nfin, 1))
+    transpT_GPU = cudamat.empty((Nfin, M_GPU.shape[0]))
+    WT_GPU = cudamat.empty((Nfin, M_GPU.shape[0]))
+
     Mreg_GPU = cudamat.empty(M_GPU.shape)
     W_GPU = cudamat.empty(M_GPU.shape).assign(0)
+    potentials = None
+
+    if log:
+        log = {'err': []}
+
+    if verbose:
+        print('{:5s}|{:12s}'.format('It.', 'Err') + '\n' + '-' * 19)
 
     for cpt in range(numItermax):
         Mreg_GPU.assign(M_GPU)
         Mreg_GPU.add_mult(W_GPU, eta)
-        transp_GPU = sinkhorn(a, b, Mreg_GPU, reg, numItermax=numInnerItermax,
-                              stopThr=stopInnerThr, returnAsGPU=True)
+        transp_GPU, logi = sinkhorn(a, b, Mreg_GPU, reg,
+                                    numItermax=numInnerItermax,
+                                    stopThr=stopInnerThr, log=True,
+                                    returnAsGPU=True, warmstart=potentials)
+        # the next problem is close, start from the current potentials
+        potentials = logi['warmstart']
+
         # the transport has been computed. Check if classes are really
         # separated
-        W_GPU.assign(1)
-        W_GPU = W_GPU.transpose()
+        transp_GPU.transpose(target=transpT_GPU)
+        diff2 = 0
+        norm2 = 0
         for (i, c) in enumerate(classes):
-            (_, nbRow) = indices_labels[i].shape
-            tmpC_GPU = cudamat.empty((Nfin, nbRow)).assign(0)
-            transp_GPU.transpose().select_columns(indices_labels[i], tmpC_GPU)
-            majs_GPU = tmpC_GPU.sum(axis=1).add(epsilon)
-            cudamat.pow(majs_GPU, (p - 1))
-            majs_GPU.mult(p)
-
-            tmpC_GPU.assign(0)
-            tmpC_GPU.add_col_vec(majs_GPU)
-            W_GPU.set_selected_columns(indices_labels[i], tmpC_GPU)
-
-        W_GPU = W_GPU.transpose()
-
-    return transp_GPU.asarray()
+            transpT_GPU.select_columns(indices_labels[i], tmpC_GPU[i])
+            tmpC_GPU[i].sum(axis=1, target=newmajs_GPU)
+            newmajs_GPU.add(epsilon)
+            cudamat.pow(newmajs_GPU, (p - 1))
+            newmajs_GPU.mult(p)
+
+            majs_GPU[i].subtract(newmajs_GPU)
+            diff2 += majs_GPU[i].euclid_norm()**2
+            majs_GPU[i].assign(newmajs_GPU)
+            norm2 += majs_GPU[i].euclid_norm()**2
+
+            tmpC_GPU[i].assign(0)
+            tmpC_GPU[i].add_col_vec(majs_GPU[i])
+            WT_GPU.set_selected_columns(indices_labels[i], tmpC_GPU[i])
+
+        WT_GPU.transpose(target=W_GPU)
+
+        err = np.sqrt(diff2 / norm2)
+        if log:
+            log['err'].append(err)
+        if verbose:
+            print('{:5d}|{:8e}|'.format(cpt, err))
+        if err < stopThr:
+            break
+
+    if log:
+        return transp_GPU.asarray(), log
+    else:
+        return transp_GPU.asarray()
 
 
 class OTDA_GPU(OTDA):
@@ -12,11 +12,155 @@ Gromov-Wasserstein transport method
 #
 # License: MIT License
 
+import os
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spl
 
 from .bregman import sinkhorn
-from .utils import dist
-from .optim import cg
+from .lp import emd
+from .utils import dist, check_random_state
+from .optim import cg, solve_1d_linesearch_quad
+
+
+def sqeuclidean_factors(x):
+    """ Return low-rank factors of the squared Euclidean distance matrix
+
+    The matrix C=ot.dist(x,x) of n points in dimension d is of rank at most
+    d+2 and is returned as the factors A, B of shape (n, d+2) such that
+    C=A*B^T. The factors can be given instead of C to the Gromov-Wasserstein
+    solvers with the square loss, so that the gradient is computed in
+    O(n^2 d) instead of O(n^3).
+
+    Parameters
+    ----------
+    x : ndarray, shape (n, d)
+        samples
+
+    Returns
+    -------
+    A : ndarray, shape (n, d+2)
+        left factor
+    B : ndarray, shape (n, d+2)
+        right factor
+
+    Examples
+    --------
+
+    >>> import ot
+    >>> x = np.random.randn(10, 2)
+    >>> A, B = ot.gromov.sqeuclidean_factors(x)
+    >>> np.allclose(A.dot(B.T), ot.dist(x, x))
+    True
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    x2 = np.sum(x ** 2, 1)[:, None]
+    ones = np.ones_like(x2)
+    A = np.hstack((x2, ones, -2 * x))
+    B = np.hstack((ones, x2, x))
+    return A, B
+
+
+def _is_factored(C):
+    """ return True if C is given as low-rank factors (A, B) with C=A*B^T"""
+    return isinstance(C, tuple)
+
+
+def _as_cost(C):
+    """ return C as float arrays (dense, sparse or low-rank factors)"""
+    if _is_factored(C):
+        return tuple(np.asarray(Ci, dtype=np.float64) for Ci in C)
+    if sp.issparse(C):
+        return sp.csr_matrix(C, dtype=np.float64)
+    return np.asarray(C, dtype=np.float64)
+
+
+def _product(hC1, T, hC2):
+    """ return hC1*T*hC2^T for dense, sparse or factored hC1 and hC2"""
+    if _is_factored(hC1):
+        A1, B1 = hC1
+        T = A1.dot(B1.T.dot(T))
+    else:
+        T = hC1.dot(T)
+    if _is_factored(hC2):
+        A2, B2 = hC2
+        return T.dot(B2).dot(A2.T)
+    if sp.issparse(hC2):
+        # C order as the dense products (expected by ot.lp.emd)
+        return np.ascontiguousarray(hC2.dot(T.T).T)
+    return T.dot(hC2.T)
+
+
+def _apply(f, C):
+    """ return f(C) elementwise, kept sparse for a sparse C if f(0)=0"""
+    if sp.issparse(C):
+        if f(np.zeros(1))[0] == 0:
+            C = C.copy()
+            C.data = f(C.data)
+            return C
+        return f(C.toarray())
+    return f(C)
+
+
+def _square_dot(C, p):
+    """ return (C**2)*p for dense or factored C"""
+    if _is_factored(C):
+        # (a_i.b_k)^2 = <a_i a_i^T, b_k b_k^T>
+        A, B = C
+        return np.sum(A.dot((B * p[:, None]).T.dot(B)) * A, 1)
+    return np.dot(C ** 2, p)
+
+
+def _loss_functions(loss_fun):
+    """ return f1, f2, h1, h2 with L(a,b) = f1(a)+f2(b)-h1(a)*h2(b)"""
+    if loss_fun == 'square_loss':
+        def f1(a):
+            return (a**2) / 2
+
+        def f2(b):
+            return (b**2) / 2
+
+        def h1(a):
+            return a
+
+        def h2(b):
+            return b
+    elif loss_fun == 'kl_loss':
+        def f1(a):
+            return a * np.log(a + 1e-15) - a
+
+        def f2(b):
+            return b
+
+        def h1(a):
+            return a
+
+        def h2(b):
+            return np.log(b + 1e-15)
+
+    return f1, f2, h1, h2
+
+
+def _init_one_side(C, p, loss_fun, source=True):
+    """ return f1(C)*p and h1(C) (or f2(C)*p and h2(C) for the target side)
+
+    These terms only depend on one space so they can be computed once per
+    space when the space is compared to several others.
+    """
+    if _is_factored(C):
+        if loss_fun != 'square_loss':
+            raise ValueError("Low-rank factors of the cost matrices are only "
+                             "supported with the square loss.")
+        return _square_dot(C, p) / 2, C
+
+    f1, f2, h1, h2 = _loss_functions(loss_fun)
+    if source:
+        return _apply(f1, C).dot(p), _apply(h1, C)
+    else:
+        return _apply(f2, C).dot(p), _apply(h2, C)
 
 
 def init_matrix(C1, C2, T, p, q, loss_fun='square_loss'):
@@ -46,11 +190,18 @@ def init_matrix(C1, C2, T, p, q, loss_fun='square_loss'):
             * h1(a)=a
             * h2(b)=log(b)
 
+    With the square loss, C1 and C2 can also be given as low-rank factors
+    (A, B) with C=A*B^T (see sqeuclidean_factors), hC1 and hC2 are then
+    returned as factors. C1 and C2 can also be scipy.sparse matrices (e.g.
+    graph adjacency matrices): hC1 and hC2 are then sparse when h1(0)=0 and
+    h2(0)=0 (both for the square loss, only hC1 for the kl loss) so that the
+    products with T scale with the number of edges.
+
     Parameters
     ----------
-    C1 : ndarray, shape (ns, ns)
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
          Metric cost matrix in the source space
-    C2 : ndarray, shape (nt, nt)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
          Metric costfr matrix in the target space
     T :  ndarray, shape (ns, nt)
          Coupling between source and target spaces
@@ -60,11 +211,12 @@ def init_matrix(C1, C2, T, p, q, loss_fun='square_loss'):
     Returns
     -------
 
-    constC : ndarray, shape (ns, nt)
-           Constant C matrix in Eq. (6)
-    hC1 : ndarray, shape (ns, ns)
+    constC : tuple of ndarray, shape (ns,) and (nt,)
+           Constant C matrix in Eq. (6), given by the vectors (constC1,
+           constC2) with constC = constC1*1^T + 1*constC2^T
+    hC1 : ndarray, shape (ns, ns) or tuple of ndarray
            h1(C1) matrix in Eq. (6)
-    hC2 : ndarray, shape (nt, nt)
+    hC2 : ndarray, shape (nt, nt) or tuple of ndarray
            h2(C) matrix in Eq. (6)
 
     References
@@ -75,40 +227,35 @@ def init_matrix(C1, C2, T, p, q, loss_fun='square_loss'):
 
     """
 
-    if loss_fun == 'square_loss':
-        def f1(a):
-            return (a**2) / 2
-
-        def f2(b):
-            return (b**2) / 2
-
-        def h1(a):
-            return a
+    constC1, hC1 = _init_one_side(C1, p, loss_fun, source=True)
+    constC2, hC2 = _init_one_side(C2, q, loss_fun, source=False)
 
-        def h2(b):
-            return b
-    elif loss_fun == 'kl_loss':
-        def f1(a):
-            return a * np.log(a + 1e-15) - a
+    return (constC1, constC2), hC1, hC2
 
-        def f2(b):
-            return b
 
-        def h1(a):
-            return a
+def _add_const(constC, A):
+    """ return constC + A computed in place of A
 
-        def h2(b):
-            return np.log(b + 1e-15)
+    constC is either dense or given by the vectors (constC1, constC2) of
+    constC = constC1*1^T + 1*constC2^T, added by broadcasting so that the
+    (ns, nt) matrix is never formed.
+    """
+    if isinstance(constC, tuple):
+        constC1, constC2 = constC
+        A += constC1[:, None]
+        A += constC2[None, :]
+    else:
+        A += constC
+    return A
 
-    constC1 = np.dot(np.dot(f1(C1), p.reshape(-1, 1)),
-                     np.ones(len(q)).reshape(1, -1))
-    constC2 = np.dot(np.ones(len(p)).reshape(-1, 1),
-                     np.dot(q.reshape(1, -1), f2(C2).T))
-    constC = constC1 + constC2
-    hC1 = h1(C1)
-    hC2 = h2(C2)
 
-    return constC, hC1, hC2
+def _const_dot(constC, T):
+    """ return <constC, T>_F (two dot products with the marginals of T when
+    constC is given by its vectors)"""
+    if isinstance(constC, tuple):
+        constC1, constC2 = constC
+        return constC1.dot(T.sum(1)) + constC2.dot(T.sum(0))
+    return np.sum(constC * T)
 
 
 def tensor_product(constC, hC1, hC2, T):
@@ -118,11 +265,12 @@ def tensor_product(constC, hC1, hC2, T):
 
     Parameters
     ----------
-    constC : ndarray, shape (ns, nt)
-           Constant C matrix in Eq. (6)
-    hC1 : ndarray, shape (ns, ns)
+    constC : tuple of ndarray, shape (ns,) and (nt,), or ndarray
+           Constant C matrix in Eq. (6) as returned by init_matrix (or
+           the dense (ns, nt) matrix)
+    hC1 : ndarray, shape (ns, ns) or tuple of ndarray
            h1(C1) matrix in Eq. (6)
-    hC2 : ndarray, shape (nt, nt)
+    hC2 : ndarray, shape (nt, nt) or tuple of ndarray
            h2(C) matrix in Eq. (6)
 
 
@@ -139,8 +287,8 @@ def tensor_product(constC, hC1, hC2, T):
     International Conference on Machine Learning (ICML). 2016.
 
     """
-    A = -np.dot(hC1, T).dot(hC2.T)
-    tens = constC + A
+    A = -_product(hC1, T, hC2)
+    tens = _add_const(constC, A)
     # tens -= tens.min()
     return tens
 
@@ -152,11 +300,12 @@ def gwloss(constC, hC1, hC2, T):
 
     Parameters
     ----------
-    constC : ndarray, shape (ns, nt)
-           Constant C matrix in Eq. (6)
-    hC1 : ndarray, shape (ns, ns)
+    constC : tuple of ndarray, shape (ns,) and (nt,), or ndarray
+           Constant C matrix in Eq. (6) as returned by init_matrix (or
+           the dense (ns, nt) matrix)
+    hC1 : ndarray, shape (ns, ns) or tuple of ndarray
            h1(C1) matrix in Eq. (6)
-    hC2 : ndarray, shape (nt, nt)
+    hC2 : ndarray, shape (nt, nt) or tuple of ndarray
            h2(C) matrix in Eq. (6)
     T : ndarray, shape (ns, nt)
            Current value of transport matrix T
@@ -175,9 +324,8 @@ def gwloss(constC, hC1, hC2, T):
 
     """
 
-    tens = tensor_product(constC, hC1, hC2, T)
-
-    return np.sum(tens * T)
+    # <constC, T> does not need the (ns, nt) constC matrix
+    return _const_dot(constC, T) - np.sum(_product(hC1, T, hC2) * T)
 
 
 def gwggrad(constC, hC1, hC2, T):
@@ -187,11 +335,12 @@ def gwggrad(constC, hC1, hC2, T):
 
     Parameters
     ----------
-    constC : ndarray, shape (ns, nt)
-           Constant C matrix in Eq. (6)
-    hC1 : ndarray, shape (ns, ns)
+    constC : tuple of ndarray, shape (ns,) and (nt,), or ndarray
+           Constant C matrix in Eq. (6) as returned by init_matrix (or
+           the dense (ns, nt) matrix)
+    hC1 : ndarray, shape (ns, ns) or tuple of ndarray
            h1(C1) matrix in Eq. (6)
-    hC2 : ndarray, shape (nt, nt)
+    hC2 : ndarray, shape (nt, nt) or tuple of ndarray
            h2(C) matrix in Eq. (6)
     T : ndarray, shape (ns, nt)
            Current value of transport matrix T
@@ -213,6 +362,235 @@ def gwggrad(constC, hC1, hC2, T):
                               T)  # [12] Prop. 2 misses a 2 factor
 
 
+def solve_gromov_linesearch(G, deltaG, cost_G, constC, hC1, hC2, M=0.,
+                            reg=1., dot=None):
+    """ Solve the exact line search of the conditional gradient for GW
+
+    The cost <M,G>_F + reg*gwloss(G) is a quadratic function of the step
+    along the direction deltaG, so the optimal step in [0,1] has a closed
+    form. Only the product h1(C1)*deltaG*h2(C2)^T is needed to compute it,
+    to be compared with the several evaluations of gwloss of an Armijo line
+    search. h1(C1) and h2(C2) are supposed symmetric as in gwggrad.
+
+    Parameters
+    ----------
+    G : ndarray, shape (ns, nt)
+        Current value of transport matrix G
+    deltaG : ndarray, shape (ns, nt)
+        Descent direction of the conditional gradient
+    cost_G : float
+        Value of the cost at G
+    constC : tuple of ndarray, shape (ns,) and (nt,), or ndarray
+           Constant C matrix in Eq. (6) as returned by init_matrix (or
+           the dense (ns, nt) matrix)
+    hC1 : ndarray, shape (ns, ns) or tuple of ndarray
+           h1(C1) matrix in Eq. (6)
+    hC2 : ndarray, shape (nt, nt) or tuple of ndarray
+           h2(C) matrix in Eq. (6)
+    M : ndarray, shape (ns, nt), optional
+        Linear cost matrix (default is 0)
+    reg : float, optional
+        Weight of the Gromov-Wasserstein loss (default is 1)
+    dot : ndarray, shape (ns, nt), optional
+        h1(C1)*deltaG*h2(C2)^T if already computed
+
+    Returns
+    -------
+    alpha : float
+        Optimal step in [0,1]
+    fc : int
+        nb of function call (always 1 for compatibility with
+        ot.optim.line_search_armijo)
+    cost_G : float
+        Value of the cost at G + alpha*deltaG
+
+    References
+    ----------
+    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
+    "Gromov-Wasserstein averaging of kernel and distance matrices."
+    International Conference on Machine Learning (ICML). 2016.
+
+    """
+    if dot is None:
+        dot = _product(hC1, deltaG, hC2)
+
+    # cost(G + alpha*deltaG) = a*alpha**2 + b*alpha + cost_G
+    a = -reg * np.sum(dot * deltaG)
+    cost_dG = _const_dot(constC, deltaG) - 2 * np.sum(dot * G)
+    b = np.sum(M * deltaG) + reg * cost_dG
+
+    alpha = solve_1d_linesearch_quad(a, b, cost_G)
+    cost_G = cost_G + a * alpha ** 2 + b * alpha
+
+    return alpha, 1, cost_G
+
+
+def _gw_cg_functions(constC, hC1, hC2, M=0., reg=1.):
+    """ Return the loss, gradient and exact line search for ot.optim.cg
+
+    The product h1(C1)*G*h2(C2)^T of the current iterate is kept between
+    the calls: the gradient computes it and the line search updates it
+    linearly with h1(C1)*deltaG*h2(C2)^T, so that one conditional gradient
+    iteration costs two matrix products instead of two per loss and
+    gradient evaluation.
+    """
+    cache = {}
+
+    def f(G):
+        return gwloss(constC, hC1, hC2, G)
+
+    def df(G):
+        if 'G' in cache and np.array_equal(cache['G'], G):
+            A = cache['A']
+        else:
+            A = _product(hC1, G, hC2)
+        cache['G'] = G
+        cache['A'] = A
+        tens = _add_const(constC, -A)
+        tens *= 2  # [12] Prop. 2 misses a 2 factor
+        return tens
+
+    def line_search(cost, G, deltaG, Mi, f_val):
+        dot = _product(hC1, deltaG, hC2)
+        alpha, fc, f_val = solve_gromov_linesearch(
+            G, deltaG, f_val, constC, hC1, hC2, M=M, reg=reg, dot=dot)
+        # G + alpha*deltaG is the next iterate of ot.optim.cg
+        cache['A'] = cache['A'] + alpha * dot
+        cache['G'] = G + alpha * deltaG
+        return alpha, fc, f_val
+
+    return f, df, line_search
+
+
+def _sinkhorn_scalings(a, b, K, u, numItermax=1000, stopThr=1e-9):
+    """ Sinkhorn iterations on the kernel K starting from the scaling u
+
+    Returns the scalings u, v and the number of iterations. The error on the
+    source marginal is checked at each iteration since K*v is computed
+    anyway by the update of u.
+    """
+    v = b / np.dot(K.T, u)
+    for cpt in range(numItermax):
+        Kv = np.dot(K, v)
+        # the target marginal is exact after the update of v
+        err = np.sum((u * Kv - a) ** 2)
+        if err < stopThr:
+            break
+        unew = a / Kv
+        Ktu = np.dot(K.T, unew)
+        if np.any(Ktu == 0) or np.any(np.isinf(unew)):
+            # we have reached the machine precision
+            # keep the previous scalings and quit loop
+            print('Warning: numerical errors at iteration', cpt)
+            break
+        u = unew
+        v = b / Ktu
+    return u, v, cpt + 1
+
+
+def _entropic_gw(p, q, constC, hC1, hC2, epsilon, M=0., alpha=1.,
+                 max_iter=1000, tol=1e-9, verbose=False, log=False, G0=None,
+                 solver='PGD', numInnerItermax=1000, stopInnerThr=1e-9):
+    """ Iterations of the entropic (fused) GW problem
+
+    Solves min_T <M,T>_F + alpha*gwloss(T) - epsilon*H(T) with a Sinkhorn
+    projection of the gradient M + alpha*gwggrad(T) at each iteration
+    (solver='PGD') or the proximal point iterations with a KL(T|T_k) term
+    (solver='PPA'), starting from G0. Returns the coupling and the log
+    (False if log is False).
+
+    The kernel and the couplings are computed in the same workspace at each
+    iteration and the Sinkhorn scalings are warm-started from the previous
+    iteration (for the proximal point they converge to exp(f/epsilon) and
+    exp(g/epsilon) for the dual potentials f, g of the linearized problem).
+    The Sinkhorn tolerance is tightened with the outer error, so that the
+    inexact projections do not stall the outer iterations, unless Sinkhorn
+    does not converge in numInnerItermax iterations (very small epsilon).
+    """
+    if solver not in ('PGD', 'PPA'):
+        raise ValueError("Unknown solver '{}', use 'PGD' or 'PPA'".format(
+            solver))
+
+    T = np.empty((len(p), len(q)))
+    if G0 is None:
+        np.outer(p, q, out=T)  # Initialization
+    else:
+        T[:] = G0
+
+    # workspace of the kernel and of the next coupling
+    K = np.empty_like(T)
+    Tnext = np.empty_like(T)
+
+    u = np.ones(len(p))
+
+    cpt = 0
+    err = 1
+    n_inner = 0
+    adaptive = True
+
+    if log:
+        log = {'err': []}
+
+    while (err > tol and cpt < max_iter):
+
+        # compute the gradient
+        tens = M + alpha * gwggrad(constC, hC1, hC2, T)
+
+        # K = exp(-tens/epsilon) (times T for the proximal point) up to a
+        # constant factor absorbed by the scalings
+        np.subtract(tens, tens.min(), out=K)
+        K /= -epsilon
+        np.exp(K, out=K)
+        if solver == 'PPA':
+            K *= T
+
+        # the inner tolerance follows the outer error as long as Sinkhorn
+        # converges in numInnerItermax iterations
+        if adaptive:
+            stopThr = min(stopInnerThr, (0.1 * err) ** 2)
+        else:
+            stopThr = stopInnerThr
+        u, v, n = _sinkhorn_scalings(p, q, K, u, numInnerItermax, stopThr)
+        n_inner += n
+        if n >= numInnerItermax:
+            adaptive = False
+
+        np.multiply(u[:, None], K, out=Tnext)
+        Tnext *= v[None, :]
+
+        err = np.linalg.norm(Tnext - T)
+        T, Tnext = Tnext, T
+
+        if log:
+            log['err'].append(err)
+
+        if verbose:
+            if cpt % 200 == 0:
+                print('{:5s}|{:12s}'.format(
+                    'It.', 'Err') + '\n' + '-' * 19)
+            print('{:5d}|{:8e}|'.format(cpt, err))
+
+        cpt += 1
+
+    if log:
+        log['niter'] = cpt
+        log['n_inner_iter'] = n_inner
+
+    return T, log
+
+
+def _weighted_sum_tCt(p, lambdas, T, Cs):
+    """ return sum_s lambdas[s]*T[s]^T*Cs[s]*T[s] / (p*p^T) computed in place"""
+    tmpsum = np.zeros((len(p), len(p)))
+    tmp = np.empty_like(tmpsum)
+    for s in range(len(T)):
+        np.dot(np.dot(T[s].T, Cs[s]), T[s], out=tmp)
+        tmp *= lambdas[s]
+        tmpsum += tmp
+    tmpsum /= np.outer(p, p)
+    return tmpsum
+
+
 def update_square_loss(p, lambdas, T, Cs):
     """
     Updates C according to the L2 Loss kernel with the S Ts couplings
@@ -234,11 +612,7 @@ def update_square_loss(p, lambdas, T, Cs):
     C : ndarray, shape (nt,nt)
         updated C matrix
     """
-    tmpsum = sum([lambdas[s] * np.dot(T[s].T, Cs[s]).dot(T[s])
-                  for s in range(len(T))])
-    ppt = np.outer(p, p)
-
-    return np.divide(tmpsum, ppt)
+    return _weighted_sum_tCt(p, lambdas, T, Cs)
 
 
 def update_kl_loss(p, lambdas, T, Cs):
@@ -246,219 +620,1072 @@ def update_kl_loss(p, lambdas, T, Cs):
     Updates C according to the KL Loss kernel with the S Ts couplings calculated at each iteration
 
 
-    Parameters
-    ----------
-    p  : ndarray, shape (N,)
-         weights in the targeted barycenter
-    lambdas : list of the S spaces' weights
-    T : list of S np.ndarray(ns,N)
-        the S Ts couplings calculated at each iteration
-    Cs : list of S ndarray, shape(ns,ns)
-         Metric cost matrices
+    Parameters
+    ----------
+    p  : ndarray, shape (N,)
+         weights in the targeted barycenter
+    lambdas : list of the S spaces' weights
+    T : list of S np.ndarray(ns,N)
+        the S Ts couplings calculated at each iteration
+    Cs : list of S ndarray, shape(ns,ns)
+         Metric cost matrices
+
+    Returns
+    ----------
+    C : ndarray, shape (ns,ns)
+        updated C matrix
+    """
+    return np.exp(_weighted_sum_tCt(p, lambdas, T, Cs))
+
+
+def update_feature_matrix(lambdas, Ys, Ts, p):
+    """
+    Updates the feature with respect to the S Ts couplings calculated at each
+    iteration (barycentric projection of the features)
+
+    Parameters
+    ----------
+    lambdas : list of float
+              list of the S spaces' weights
+    Ys : list of S ndarray, shape(ns,d)
+         The features
+    Ts : list of S np.ndarray(N,ns)
+         the S Ts couplings calculated at each iteration
+    p  : ndarray, shape (N,)
+         masses in the targeted barycenter
+
+    Returns
+    ----------
+    X : ndarray, shape (N,d)
+        updated feature matrix
+    """
+    X = lambdas[0] * np.dot(Ts[0], Ys[0])
+    for s in range(1, len(Ts)):
+        X += lambdas[s] * np.dot(Ts[s], Ys[s])
+
+    return X / p[:, None]
+
+
+def _dot(C, x):
+    """ return C*x for dense, sparse or factored C"""
+    if _is_factored(C):
+        A, B = C
+        return A.dot(B.T.dot(x))
+    return C.dot(x)
+
+
+def _leading_eigenvector(C, n):
+    """ return the eigenvector of the largest eigenvalue of the symmetric C"""
+    if n < 3:
+        if _is_factored(C):
+            C = C[0].dot(C[1].T)
+        elif sp.issparse(C):
+            C = C.toarray()
+        u = np.linalg.eigh(C)[1][:, -1]
+    else:
+        op = spl.LinearOperator((n, n), matvec=lambda x: _dot(C, x),
+                                dtype=np.float64)
+        u = spl.eigsh(op, k=1, which='LA', v0=np.ones(n))[1][:, 0]
+    if np.sum(u) < 0:
+        u = -u
+    return u
+
+
+def _monotone_coupling(x, y, p, q):
+    """ return the coupling of (x,p) and (y,q) that preserves the order of
+    the values (the optimal 1D transport for convex costs)"""
+    ix = np.argsort(x, kind='mergesort')
+    iy = np.argsort(y, kind='mergesort')
+    cp = np.cumsum(p[ix])
+    cq = np.cumsum(q[iy])
+    cuts = np.unique(np.concatenate(([0], cp, cq)))
+    cuts = cuts[cuts <= min(cp[-1], cq[-1])]
+    mass = np.diff(cuts)
+    middles = cuts[:-1] + mass / 2
+    i = np.minimum(np.searchsorted(cp, middles), len(p) - 1)
+    j = np.minimum(np.searchsorted(cq, middles), len(q) - 1)
+    T = np.zeros((len(p), len(q)))
+    np.add.at(T, (ix[i], iy[j]), mass)
+    return T
+
+
+def init_coupling(C1, C2, p, q, method='product'):
+    """
+    Returns an initial coupling for the Gromov-Wasserstein solvers
+
+    The following methods are available:
+
+    - 'product' : the independent coupling p*q^T
+    - 'sorted' : the points of both spaces are sorted by their mean cost
+      to the other points (C*p) and matched in this order, which is the
+      transport plan of the first lower bound of [13]
+    - 'spectral' : the points are sorted and matched along the leading
+      eigenvectors of C1 and C2
+
+    Parameters
+    ----------
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (or its low-rank factors)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the target space (or its low-rank factors)
+    p :  ndarray, shape (ns,)
+         distribution in the source space
+    q :  ndarray, shape (nt,)
+         distribution in the target space
+    method : str, optional
+        'product', 'sorted' or 'spectral'
+
+    Returns
+    -------
+    T : ndarray, shape (ns, nt)
+        coupling between the two spaces
+
+    References
+    ----------
+    .. [13] Mémoli, Facundo. Gromov–Wasserstein distances and the
+        metric approach to object matching. Foundations of computational
+        mathematics 11.4 (2011): 417-487.
+
+    """
+    p = np.asarray(p, dtype=np.float64)
+    q = np.asarray(q, dtype=np.float64)
+
+    if method == 'product':
+        return p[:, None] * q[None, :]
+
+    C1 = _as_cost(C1)
+    C2 = _as_cost(C2)
+
+    if method == 'sorted':
+        return _monotone_coupling(_dot(C1, p), _dot(C2, q), p, q)
+    elif method == 'spectral':
+        return _monotone_coupling(_leading_eigenvector(C1, len(p)),
+                                  _leading_eigenvector(C2, len(q)), p, q)
+    else:
+        raise ValueError("Unknown initialization method '{}'".format(method))
+
+
+def gromov_wasserstein(C1, C2, p, q, loss_fun, log=False, armijo=False,
+                       G0=None, **kwargs):
+    """
+    Returns the gromov-wasserstein transport between (C1,p) and (C2,q)
+
+    The function solves the following optimization problem:
+
+    .. math::
+        \GW_Dist = \min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+
+    Where :
+        C1 : Metric cost matrix in the source space
+        C2 : Metric cost matrix in the target space
+        p  : distribution in the source space
+        q  : distribution in the target space
+        L  : loss function to account for the misfit between the similarity matrices
+        H  : entropy
+
+    Parameters
+    ----------
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors (A, B) with C1=A*B^T for the square loss (see
+         sqeuclidean_factors)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
+    p :  ndarray, shape (ns,)
+         distribution in the source space
+    q :  ndarray, shape (nt,)
+         distribution in the target space
+    loss_fun :  string
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+
+    max_iter : int, optional
+        Max number of iterations
+    tol : float, optional
+        Stop threshold on error (>0)
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+    armijo : bool, optional
+        If True the steps of the conditional gradient are found with the
+        Armijo line search of ot.optim.cg, otherwise (default) with the exact
+        line search of ot.gromov.solve_gromov_linesearch
+    G0 : ndarray, shape (ns, nt) or str, optional
+        initial coupling (default is p*q^T), e.g. to warm start from a
+        previous solution, or the name of a method of
+        ot.gromov.init_coupling
+    **kwargs : dict
+        parameters can be directly pased to the ot.optim.cg solver (for
+        instance a control=ot.utils.SolverControl(...) budget, or stopGap
+        to stop on the Frank-Wolfe gap, whose history is in log['fw_gap'])
+
+    Returns
+    -------
+    T : ndarray, shape (ns, nt)
+        coupling between the two spaces that minimizes :
+            \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+    log : dict
+        convergence information and loss
+
+    References
+    ----------
+    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
+        "Gromov-Wasserstein averaging of kernel and distance matrices."
+        International Conference on Machine Learning (ICML). 2016.
+
+    .. [13] Mémoli, Facundo. Gromov–Wasserstein distances and the
+        metric approach to object matching. Foundations of computational
+        mathematics 11.4 (2011): 417-487.
+
+    """
+
+    C1 = _as_cost(C1)
+    C2 = _as_cost(C2)
+
+    T = np.eye(len(p), len(q))
+
+    constC, hC1, hC2 = init_matrix(C1, C2, T, p, q, loss_fun)
+
+    if G0 is None:
+        G0 = p[:, None] * q[None, :]
+    elif isinstance(G0, str):
+        G0 = init_coupling(C1, C2, p, q, G0)
+
+    f, df, line_search = _gw_cg_functions(constC, hC1, hC2)
+    if armijo:
+        line_search = None
+
+    if log:
+        res, log = cg(p, q, 0, 1, f, df, G0, log=True,
+                      line_search=line_search, **kwargs)
+        log['gw_dist'] = gwloss(constC, hC1, hC2, res)
+        return res, log
+    else:
+        return cg(p, q, 0, 1, f, df, G0, line_search=line_search, **kwargs)
+
+
+def gromov_wasserstein2(C1, C2, p, q, loss_fun, log=False, armijo=False,
+                        **kwargs):
+    """
+    Returns the gromov-wasserstein discrepancy between (C1,p) and (C2,q)
+
+    The function solves the following optimization problem:
+
+    .. math::
+        \GW_Dist = \min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+
+    Where :
+        C1 : Metric cost matrix in the source space
+        C2 : Metric cost matrix in the target space
+        p  : distribution in the source space
+        q  : distribution in the target space
+        L  : loss function to account for the misfit between the similarity matrices
+        H  : entropy
+
+    Parameters
+    ----------
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors (A, B) with C1=A*B^T for the square loss (see
+         sqeuclidean_factors)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
+    p :  ndarray, shape (ns,)
+         distribution in the source space
+    q :  ndarray, shape (nt,)
+         distribution in the target space
+    loss_fun :  string
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+
+    max_iter : int, optional
+        Max number of iterations
+    tol : float, optional
+        Stop threshold on error (>0)
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+    armijo : bool, optional
+        If True the steps of the conditional gradient are found with the
+        Armijo line search of ot.optim.cg, otherwise (default) with the exact
+        line search of ot.gromov.solve_gromov_linesearch
+
+    Returns
+    -------
+    gw_dist : float
+        Gromov-Wasserstein distance
+    log : dict
+        convergence information and Coupling marix
+
+    References
+    ----------
+    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
+        "Gromov-Wasserstein averaging of kernel and distance matrices."
+        International Conference on Machine Learning (ICML). 2016.
+
+    .. [13] Mémoli, Facundo. Gromov–Wasserstein distances and the
+        metric approach to object matching. Foundations of computational
+        mathematics 11.4 (2011): 417-487.
+
+    """
+
+    res, logv = gromov_wasserstein(C1, C2, p, q, loss_fun, log=True,
+                                   armijo=armijo, **kwargs)
+    logv['T'] = res
+    if log:
+        return logv['gw_dist'], logv
+    else:
+        return logv['gw_dist']
+
+
+def gromov_wasserstein_pairwise(Cs, ps, loss_fun='square_loss',
+                                armijo=False, processes=None, filename=None,
+                                verbose=False, **kwargs):
+    """
+    Returns the matrix of the gromov-wasserstein discrepancies between all
+    the pairs of spaces (Cs[i],ps[i])
+
+    The terms of ot.gromov.init_matrix that only depend on one space are
+    computed once per space, then the pairs are solved with
+    ot.gromov.gromov_wasserstein2 on a pool of threads. Only one pair per
+    thread is in memory at a time.
+
+    Parameters
+    ----------
+    Cs : list of S ndarray, shape (ns, ns)
+         Metric cost matrices (possibly sparse or low-rank factors, see
+         ot.gromov.gromov_wasserstein)
+    ps : list of S ndarray, shape (ns,)
+         distributions in each space
+    loss_fun :  string, optional
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+    armijo : bool, optional
+        If True the steps of the conditional gradient are found with the
+        Armijo line search of ot.optim.cg
+    processes : int, optional
+        number of threads solving the pairs (default is the number of cpus,
+        1 solves the pairs sequentially)
+    filename : str, optional
+        .npy file storing the matrix as it is filled. If the file already
+        exists, the entries that are not NaN are kept and only the missing
+        pairs are solved, so an interrupted computation can be resumed
+    verbose : bool, optional
+        Print information along iterations
+    **kwargs : dict
+        parameters can be directly pased to the ot.optim.cg solver
+
+    Returns
+    -------
+    D : ndarray, shape (S, S)
+        matrix of the gromov-wasserstein discrepancies D[i, j] between
+        (Cs[i],ps[i]) and (Cs[j],ps[j]) (with a zero diagonal). It is
+        symmetric for the 'square_loss', the 'kl_loss' is not symmetric and
+        both orders of each pair are solved
+
+    References
+    ----------
+    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
+        "Gromov-Wasserstein averaging of kernel and distance matrices."
+        International Conference on Machine Learning (ICML). 2016.
+
+    """
+
+    S = len(Cs)
+    Cs = [_as_cost(C) for C in Cs]
+    ps = [np.asarray(p, dtype=np.float64) for p in ps]
+
+    if filename is not None and os.path.exists(filename):
+        D = np.load(filename, mmap_mode='r+')
+        if D.shape != (S, S):
+            raise ValueError("The matrix stored in {} has shape {} but {} "
+                             "spaces are given".format(filename, D.shape, S))
+    elif filename is not None:
+        D = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float64,
+                                      shape=(S, S))
+        D[:] = np.nan
+    else:
+        D = np.full((S, S), np.nan)
+    np.fill_diagonal(D, 0)
+
+    # the discrepancy is symmetric for the square loss only
+    symmetric = loss_fun == 'square_loss'
+    pairs = [(i, j) for i in range(S) for j in range(S)
+             if (i < j or (i > j and not symmetric)) and np.isnan(D[i, j])]
+
+    # terms depending on one space only
+    sources = [_init_one_side(C, p, loss_fun, source=True)
+               for C, p in zip(Cs, ps)]
+    targets = [_init_one_side(C, p, loss_fun, source=False)
+               for C, p in zip(Cs, ps)]
+
+    def solve_pair(pair):
+        i, j = pair
+        constC1, hC1 = sources[i]
+        constC2, hC2 = targets[j]
+        constC = (constC1, constC2)
+        f, df, line_search = _gw_cg_functions(constC, hC1, hC2)
+        if armijo:
+            line_search = None
+        T = cg(ps[i], ps[j], 0, 1, f, df, np.outer(ps[i], ps[j]),
+               line_search=line_search, **kwargs)
+        return i, j, gwloss(constC, hC1, hC2, T)
+
+    if processes == 1 or len(pairs) < 2:
+        results = map(solve_pair, pairs)
+        pool = None
+    else:
+        pool = ThreadPool(processes)
+        results = pool.imap_unordered(solve_pair, pairs)
+
+    for cpt, (i, j, gw_dist) in enumerate(results):
+        D[i, j] = gw_dist
+        if symmetric:
+            D[j, i] = gw_dist
+        if filename is not None:
+            D.flush()
+        if verbose:
+            print('{:5d}/{:5d} pair ({}, {}): {:8e}'.format(
+                cpt + 1, len(pairs), i, j, gw_dist))
+
+    if pool is not None:
+        pool.close()
+
+    return np.array(D)
+
+
+def gromov_wasserstein_multistart(C1, C2, p, q, loss_fun,
+                                  inits=('product', 'sorted', 'spectral'),
+                                  armijo=False, processes=None, log=False,
+                                  **kwargs):
+    """
+    Returns the gromov-wasserstein transport between (C1,p) and (C2,q)
+    with the best of several initializations
+
+    The conditional gradient of ot.gromov.gromov_wasserstein only finds a
+    local minimum, so it is started from each coupling of inits (in
+    parallel threads) and the coupling with the lowest loss is returned.
+    The matrices of ot.gromov.init_matrix are computed only once.
+
+    Parameters
+    ----------
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (or its low-rank factors)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the target space (or its low-rank factors)
+    p :  ndarray, shape (ns,)
+         distribution in the source space
+    q :  ndarray, shape (nt,)
+         distribution in the target space
+    loss_fun :  string
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+    inits : list of str or ndarray, optional
+        initial couplings, given directly or as methods of
+        ot.gromov.init_coupling
+    armijo : bool, optional
+        If True the steps of the conditional gradient are found with the
+        Armijo line search of ot.optim.cg
+    processes : int, optional
+        number of threads (default is the number of cpus, 1 runs the
+        initializations sequentially)
+    log : bool, optional
+        record log if True
+    **kwargs : dict
+        parameters can be directly pased to the ot.optim.cg solver
+
+    Returns
+    -------
+    T : ndarray, shape (ns, nt)
+        best coupling found between the two spaces
+    log : dict
+        gw_dist of the best coupling, index of the best initialization
+        (best_init) and the distances (gw_dists) and numbers of iterations
+        (n_iter) of all the initializations
+
+    References
+    ----------
+    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
+        "Gromov-Wasserstein averaging of kernel and distance matrices."
+        International Conference on Machine Learning (ICML). 2016.
+
+    """
+
+    p = np.asarray(p, dtype=np.float64)
+    q = np.asarray(q, dtype=np.float64)
+    C1 = _as_cost(C1)
+    C2 = _as_cost(C2)
+
+    constC, hC1, hC2 = init_matrix(C1, C2, None, p, q, loss_fun)
+
+    def solve(G0):
+        if isinstance(G0, str):
+            G0 = init_coupling(C1, C2, p, q, G0)
+        f, df, line_search = _gw_cg_functions(constC, hC1, hC2)
+        if armijo:
+            line_search = None
+        T, logc = cg(p, q, 0, 1, f, df, G0, log=True,
+                     line_search=line_search, **kwargs)
+        return T, gwloss(constC, hC1, hC2, T), len(logc['loss']) - 1
+
+    res = _parallel_map(solve, list(inits), processes)
+    gw_dists = [r[1] for r in res]
+    best = int(np.argmin(gw_dists))
+
+    if log:
+        log = {'gw_dist': gw_dists[best], 'best_init': best,
+               'gw_dists': gw_dists, 'n_iter': [r[2] for r in res]}
+        return res[best][0], log
+    else:
+        return res[best][0]
+
+
+def entropic_gromov_wasserstein(C1, C2, p, q, loss_fun, epsilon,
+                                max_iter=1000, tol=1e-9, verbose=False, log=False,
+                                G0=None, solver='PGD'):
+    """
+    Returns the gromov-wasserstein transport between (C1,p) and (C2,q)
+
+    (C1,p) and (C2,q)
+
+    The function solves the following optimization problem:
+
+    .. math::
+        \GW = arg\min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}-\epsilon(H(T))
+
+        s.t. \GW 1 = p
+
+             \GW^T 1= q
+
+             \GW\geq 0
+
+    Where :
+        C1 : Metric cost matrix in the source space
+        C2 : Metric cost matrix in the target space
+        p  : distribution in the source space
+        q  : distribution in the target space
+        L  : loss function to account for the misfit between the similarity matrices
+        H  : entropy
+
+    Parameters
+    ----------
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors (A, B) with C1=A*B^T for the square loss (see
+         sqeuclidean_factors)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
+    p :  ndarray, shape (ns,)
+         distribution in the source space
+    q :  ndarray, shape (nt,)
+         distribution in the target space
+    loss_fun :  string
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+    epsilon : float
+        Regularization term >0
+    max_iter : int, optional
+       Max number of iterations
+    tol : float, optional
+        Stop threshold on error (>0)
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+    G0 : ndarray, shape (ns, nt), optional
+        initial coupling (default is p*q^T)
+    solver : string, optional
+        'PGD' for the projected gradient iterations of [12]_ (default) or
+        'PPA' for the proximal point iterations with a KL(T|T_k) term, which
+        converge to a (non entropic) GW solution and are stable with a
+        larger epsilon
+
+    Returns
+    -------
+    T : ndarray, shape (ns, nt)
+        coupling between the two spaces that minimizes :
+            \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}-\epsilon(H(T))
+
+    References
+    ----------
+    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
+    "Gromov-Wasserstein averaging of kernel and distance matrices."
+    International Conference on Machine Learning (ICML). 2016.
+
+    """
+
+    C1 = _as_cost(C1)
+    C2 = _as_cost(C2)
+
+    T = np.outer(p, q)  # Initialization
+
+    constC, hC1, hC2 = init_matrix(C1, C2, T, p, q, loss_fun)
+
+    T, log = _entropic_gw(p, q, constC, hC1, hC2, epsilon, max_iter=max_iter,
+                          tol=tol, verbose=verbose, log=log, G0=G0,
+                          solver=solver)
+
+    if log:
+        log['gw_dist'] = gwloss(constC, hC1, hC2, T)
+        return T, log
+    else:
+        return T
+
+
+def entropic_gromov_wasserstein2(C1, C2, p, q, loss_fun, epsilon,
+                                 max_iter=1000, tol=1e-9, verbose=False, log=False,
+                                 solver='PGD'):
+    """
+    Returns the entropic gromov-wasserstein discrepancy between the two measured similarity matrices
+
+    (C1,p) and (C2,q)
+
+    The function solves the following optimization problem:
+
+    .. math::
+        \GW_Dist = \min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}-\epsilon(H(T))
+
+    Where :
+        C1 : Metric cost matrix in the source space
+        C2 : Metric cost matrix in the target space
+        p  : distribution in the source space
+        q  : distribution in the target space
+        L  : loss function to account for the misfit between the similarity matrices
+        H  : entropy
+
+    Parameters
+    ----------
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors (A, B) with C1=A*B^T for the square loss (see
+         sqeuclidean_factors)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
+    p :  ndarray, shape (ns,)
+         distribution in the source space
+    q :  ndarray, shape (nt,)
+         distribution in the target space
+    loss_fun :  string
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+    epsilon : float
+        Regularization term >0
+    max_iter : int, optional
+        Max number of iterations
+    tol : float, optional
+        Stop threshold on error (>0)
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+    solver : string, optional
+        'PGD' (default) or 'PPA', see entropic_gromov_wasserstein
+
+    Returns
+    -------
+    gw_dist : float
+        Gromov-Wasserstein distance
+
+    References
+    ----------
+    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
+    "Gromov-Wasserstein averaging of kernel and distance matrices."
+    International Conference on Machine Learning (ICML). 2016.
+
+    """
+
+    gw, logv = entropic_gromov_wasserstein(
+        C1, C2, p, q, loss_fun, epsilon, max_iter, tol, verbose, log=True,
+        solver=solver)
+
+    logv['T'] = gw
+
+    if log:
+        return logv['gw_dist'], logv
+    else:
+        return logv['gw_dist']
+
+
+def _get_rows(C, index):
+    """ return the rows of a dense, sparse or callable cost matrix"""
+    if callable(C):
+        return np.asarray(C(index), dtype=np.float64)
+    if sp.issparse(C):
+        return C[index].toarray()
+    return C[index]
+
+
+def sampled_gromov_wasserstein(C1, C2, p, q, loss_fun, nb_samples_grad=100,
+                               epsilon=1, max_iter=500, tol=1e-9,
+                               verbose=False, log=False, random_state=None):
+    r"""
+    Returns the gromov-wasserstein transport between (C1,p) and (C2,q)
+    computed with a sampled gradient
+
+    The function solves the following optimization problem:
+
+    .. math::
+        \GW = arg\min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+
+        s.t. \GW 1 = p
+
+             \GW^T 1= q
+
+             \GW\geq 0
+
+    with the stochastic proximal algorithm of [22]_. At each iteration the
+    gradient sum_{i,j} L(C1_{i,k},C2_{j,l})*T_{i,j} is estimated from
+    nb_samples_grad pairs (i,j) drawn from the current coupling, so only
+    nb_samples_grad rows of C1 and C2 are accessed and an iteration costs
+    O(nb_samples_grad*ns*nt) without any O(n^3) product. The coupling is
+    then updated with a KL proximal step solved by Sinkhorn (or an exact OT
+    step if epsilon=0).
+
+    The coupling is a dense (ns, nt) array and each proximal step costs
+    O(ns*nt) per Sinkhorn iteration, so the memory is O(ns*nt) as for
+    gromov_wasserstein. When C1 and C2 fit in memory as dense arrays,
+    gromov_wasserstein is usually faster; this solver is meant for C1 and
+    C2 given as sparse matrices or functions, when the (ns, ns) and (nt, nt)
+    cost matrices or the O(ns^2*nt) gradient products are too large.
+
+    Where :
+        C1 : Metric cost matrix in the source space
+        C2 : Metric cost matrix in the target space
+        p  : distribution in the source space
+        q  : distribution in the target space
+        L  : loss function to account for the misfit between the similarity matrices
+
+    Parameters
+    ----------
+    C1 : ndarray, scipy.sparse matrix or function, shape (ns, ns)
+         Metric cost matrix in the source space. A function C1(index) must
+         return the rows index of the matrix as an array of shape
+         (len(index), ns) and a sparse matrix (e.g. a graph) is accessed by
+         rows
+    C2 : ndarray, scipy.sparse matrix or function, shape (nt, nt)
+         Metric costfr matrix in the target space
+    p :  ndarray, shape (ns,)
+         distribution in the source space
+    q :  ndarray, shape (nt,)
+         distribution in the target space
+    loss_fun :  string
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+    nb_samples_grad : int, optional
+        Number of pairs (i,j) sampled for the gradient estimation
+    epsilon : float, optional
+        Weight of the KL proximal term >=0 (exact OT steps if 0)
+    max_iter : int, optional
+        Max number of iterations
+    tol : float, optional
+        Stop threshold on the change of the coupling (checked every 10
+        iterations)
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+    random_state : int, RandomState instance or None, optional
+        Seed of the sampling
+
+    Returns
+    -------
+    T : ndarray, shape (ns, nt)
+        coupling between the two spaces that minimizes :
+            \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+    log : dict
+        convergence information and estimation of the loss in
+        'gw_dist_estimated' (mean of the estimates of the last 10
+        iterations)
+
+    References
+    ----------
+    .. [22] Kerdoncuff, Tanguy, Emonet, Rémi, Sebban, Marc
+        "Sampled Gromov Wasserstein."
+        Machine Learning Journal (MLJ). 2021.
+
+    """
+    generator = check_random_state(random_state)
+
+    if sp.issparse(C1):
+        C1 = sp.csr_matrix(C1)
+    if sp.issparse(C2):
+        C2 = sp.csr_matrix(C2)
+
+    f1, f2, h1, h2 = _loss_functions(loss_fun)
+
+    def sampled_gradient(T):
+        """mean of L(C1_{i,k},C2_{j,l}) on pairs (i,j) drawn from T"""
+        index_i = generator.choice(len(p), size=nb_samples_grad, p=p)
+        cumT = np.cumsum(T[index_i], 1)
+        u = generator.rand(nb_samples_grad) * cumT[:, -1]
+        index_j = np.minimum(np.sum(cumT < u[:, None], 1), len(q) - 1)
+
+        R1 = _get_rows(C1, index_i)
+        R2 = _get_rows(C2, index_j)
+
+        L = np.sum(f1(R1), 0)[:, None] + np.sum(f2(R2), 0)[None, :]
+        return (L - np.dot(h1(R1).T, h2(R2))) / nb_samples_grad
+
+    T = np.outer(p, q)  # Initialization
+    # unbiased estimations of the loss of the successive couplings
+    estimates = []
+
+    if log:
+        log = {'err': []}
+
+    for cpt in range(max_iter):
+
+        Lik = sampled_gradient(T)
+        estimates.append(np.sum(Lik * T))
+
+        max_Lik = np.max(np.abs(Lik))
+        if max_Lik == 0:
+            continue
+
+        if epsilon > 0:
+            # KL proximal step: kernel T*exp(-Lik/epsilon)
+            Tprev = T
+            M = Lik / max_Lik - epsilon * np.log(np.maximum(T, 1e-300))
+            T = sinkhorn(p, q, M - np.min(M), epsilon)
+            if np.any(np.isnan(T)):
+                print('Warning: numerical errors at iteration', cpt)
+                T = Tprev
+                break
+        else:
+            Tprev = T
+            T = emd(p, q, Lik / max_Lik)
+
+        if cpt % 10 == 0:
+            err = np.linalg.norm(T - Tprev)
+
+            if log:
+                log['err'].append(err)
+
+            if verbose:
+                if cpt % 200 == 0:
+                    print('{:5s}|{:12s}'.format(
+                        'It.', 'Err') + '\n' + '-' * 19)
+                print('{:5d}|{:8e}|'.format(cpt, err))
 
-    Returns
-    ----------
-    C : ndarray, shape (ns,ns)
-        updated C matrix
-    """
-    tmpsum = sum([lambdas[s] * np.dot(T[s].T, Cs[s]).dot(T[s])
-                  for s in range(len(T))])
-    ppt = np.outer(p, p)
+            if err < tol:
+                break
 
-    return np.exp(np.divide(tmpsum, ppt))
+    if log:
+        if not estimates:
+            estimates.append(np.sum(sampled_gradient(T) * T))
+        log['gw_dist_estimated'] = np.mean(estimates[-10:])
+        return T, log
+    else:
+        return T
 
 
-def gromov_wasserstein(C1, C2, p, q, loss_fun, log=False, **kwargs):
-    """
-    Returns the gromov-wasserstein transport between (C1,p) and (C2,q)
+def fused_gromov_wasserstein(M, C1, C2, p, q, loss_fun='square_loss',
+                             alpha=0.5, armijo=False, log=False, G0=None,
+                             **kwargs):
+    r"""
+    Returns the fused gromov-wasserstein transport between (C1,Y1,p) and
+    (C2,Y2,q)
 
     The function solves the following optimization problem:
 
     .. math::
-        \GW_Dist = \min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+        \gamma = arg\min_\gamma (1-\alpha)*<\gamma,M>_F + \alpha*\sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*\gamma_{i,j}*\gamma_{k,l}
+
+        s.t. \gamma 1 = p
+
+             \gamma^T 1= q
+
+             \gamma\geq 0
 
     Where :
+        M  : metric cost matrix between the features Y1 and Y2
         C1 : Metric cost matrix in the source space
         C2 : Metric cost matrix in the target space
         p  : distribution in the source space
         q  : distribution in the target space
         L  : loss function to account for the misfit between the similarity matrices
-        H  : entropy
+
+    The problem is solved with the conditional gradient of ot.optim.cg as
+    described in [23]_. The structure matrices are computed once by
+    init_matrix and the steps are found with the exact line search of
+    solve_gromov_linesearch.
 
     Parameters
     ----------
-    C1 : ndarray, shape (ns, ns)
-         Metric cost matrix in the source space
-    C2 : ndarray, shape (nt, nt)
-         Metric costfr matrix in the target space
+    M : ndarray, shape (ns, nt)
+        Metric cost matrix between features across domains
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors (A, B) with C1=A*B^T for the square loss (see
+         sqeuclidean_factors)
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
     p :  ndarray, shape (ns,)
          distribution in the source space
     q :  ndarray, shape (nt,)
          distribution in the target space
-    loss_fun :  string
+    loss_fun :  string, optional
         loss function used for the solver either 'square_loss' or 'kl_loss'
-
-    max_iter : int, optional
-        Max number of iterations
-    tol : float, optional
-        Stop threshold on error (>0)
-    verbose : bool, optional
-        Print information along iterations
+    alpha : float, optional
+        Trade-off parameter (0 < alpha < 1) between the features and the
+        structure
+    armijo : bool, optional
+        If True the steps of the conditional gradient are found with the
+        Armijo line search of ot.optim.cg
     log : bool, optional
         record log if True
+    G0 : ndarray, shape (ns, nt) or str, optional
+        initial coupling (default is p*q^T) or the name of a method of
+        ot.gromov.init_coupling
     **kwargs : dict
         parameters can be directly pased to the ot.optim.cg solver
 
     Returns
     -------
-    T : ndarray, shape (ns, nt)
-        coupling between the two spaces that minimizes :
-            \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+    gamma : ndarray, shape (ns, nt)
+        Optimal transportation matrix for the given parameters
     log : dict
-        convergence information and loss
+        log dictionary return only if log==True in parameters
 
     References
     ----------
-    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
-        "Gromov-Wasserstein averaging of kernel and distance matrices."
-        International Conference on Machine Learning (ICML). 2016.
-
-    .. [13] Mémoli, Facundo. Gromov–Wasserstein distances and the
-        metric approach to object matching. Foundations of computational
-        mathematics 11.4 (2011): 417-487.
+    .. [23] Vayer Titouan, Chapel Laetitia, Flamary Rémi, Tavenard Romain
+        and Courty Nicolas "Optimal Transport for structured data with
+        application on graphs", International Conference on Machine Learning
+        (ICML). 2019.
 
     """
 
+    M = np.asarray(M, dtype=np.float64)
+    C1 = _as_cost(C1)
+    C2 = _as_cost(C2)
+
     T = np.eye(len(p), len(q))
 
     constC, hC1, hC2 = init_matrix(C1, C2, T, p, q, loss_fun)
 
-    G0 = p[:, None] * q[None, :]
-
-    def f(G):
-        return gwloss(constC, hC1, hC2, G)
+    if G0 is None:
+        G0 = p[:, None] * q[None, :]
+    elif isinstance(G0, str):
+        G0 = init_coupling(C1, C2, p, q, G0)
 
-    def df(G):
-        return gwggrad(constC, hC1, hC2, G)
+    f, df, line_search = _gw_cg_functions(constC, hC1, hC2,
+                                          M=(1 - alpha) * M, reg=alpha)
+    if armijo:
+        line_search = None
 
     if log:
-        res, log = cg(p, q, 0, 1, f, df, G0, log=True, **kwargs)
-        log['gw_dist'] = gwloss(constC, hC1, hC2, res)
+        res, log = cg(p, q, (1 - alpha) * M, alpha, f, df, G0, log=True,
+                      line_search=line_search, **kwargs)
+        log['fgw_dist'] = log['loss'][-1]
         return res, log
     else:
-        return cg(p, q, 0, 1, f, df, G0, **kwargs)
+        return cg(p, q, (1 - alpha) * M, alpha, f, df, G0,
+                  line_search=line_search, **kwargs)
 
 
-def gromov_wasserstein2(C1, C2, p, q, loss_fun, log=False, **kwargs):
-    """
-    Returns the gromov-wasserstein discrepancy between (C1,p) and (C2,q)
+def fused_gromov_wasserstein2(M, C1, C2, p, q, loss_fun='square_loss',
+                              alpha=0.5, armijo=False, log=False, **kwargs):
+    r"""
+    Returns the fused gromov-wasserstein distance between (C1,Y1,p) and
+    (C2,Y2,q)
 
     The function solves the following optimization problem:
 
     .. math::
-        \GW_Dist = \min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}
+        \min_\gamma (1-\alpha)*<\gamma,M>_F + \alpha*\sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*\gamma_{i,j}*\gamma_{k,l}
+
+        s.t. \gamma 1 = p
+
+             \gamma^T 1= q
+
+             \gamma\geq 0
 
     Where :
+        M  : metric cost matrix between the features Y1 and Y2
         C1 : Metric cost matrix in the source space
         C2 : Metric cost matrix in the target space
         p  : distribution in the source space
         q  : distribution in the target space
         L  : loss function to account for the misfit between the similarity matrices
-        H  : entropy
 
     Parameters
     ----------
-    C1 : ndarray, shape (ns, ns)
-         Metric cost matrix in the source space
-    C2 : ndarray, shape (nt, nt)
-         Metric costfr matrix in the target space
+    M : ndarray, shape (ns, nt)
+        Metric cost matrix between features across domains
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
     p :  ndarray, shape (ns,)
          distribution in the source space
     q :  ndarray, shape (nt,)
          distribution in the target space
-    loss_fun :  string
+    loss_fun :  string, optional
         loss function used for the solver either 'square_loss' or 'kl_loss'
-
-    max_iter : int, optional
-        Max number of iterations
-    tol : float, optional
-        Stop threshold on error (>0)
-    verbose : bool, optional
-        Print information along iterations
+    alpha : float, optional
+        Trade-off parameter (0 < alpha < 1) between the features and the
+        structure
+    armijo : bool, optional
+        If True the steps of the conditional gradient are found with the
+        Armijo line search of ot.optim.cg
     log : bool, optional
         record log if True
+    **kwargs : dict
+        parameters can be directly pased to the ot.optim.cg solver
 
     Returns
     -------
-    gw_dist : float
-        Gromov-Wasserstein distance
+    fgw_dist : float
+        Fused Gromov-Wasserstein distance
     log : dict
-        convergence information and Coupling marix
+        convergence information and Coupling matrix
 
     References
     ----------
-    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
-        "Gromov-Wasserstein averaging of kernel and distance matrices."
-        International Conference on Machine Learning (ICML). 2016.
-
-    .. [13] Mémoli, Facundo. Gromov–Wasserstein distances and the
-        metric approach to object matching. Foundations of computational
-        mathematics 11.4 (2011): 417-487.
+    .. [23] Vayer Titouan, Chapel Laetitia, Flamary Rémi, Tavenard Romain
+        and Courty Nicolas "Optimal Transport for structured data with
+        application on graphs", International Conference on Machine Learning
+        (ICML). 2019.
 
     """
 
-    T = np.eye(len(p), len(q))
-
-    constC, hC1, hC2 = init_matrix(C1, C2, T, p, q, loss_fun)
-
-    G0 = p[:, None] * q[None, :]
-
-    def f(G):
-        return gwloss(constC, hC1, hC2, G)
-
-    def df(G):
-        return gwggrad(constC, hC1, hC2, G)
-    res, log = cg(p, q, 0, 1, f, df, G0, log=True, **kwargs)
-    log['gw_dist'] = gwloss(constC, hC1, hC2, res)
-    log['T'] = res
+    res, logv = fused_gromov_wasserstein(M, C1, C2, p, q, loss_fun, alpha,
+                                         armijo=armijo, log=True, **kwargs)
+    logv['T'] = res
     if log:
-        return log['gw_dist'], log
+        return logv['fgw_dist'], logv
     else:
-        return log['gw_dist']
+        return logv['fgw_dist']
 
 
-def entropic_gromov_wasserstein(C1, C2, p, q, loss_fun, epsilon,
-                                max_iter=1000, tol=1e-9, verbose=False, log=False):
-    """
-    Returns the gromov-wasserstein transport between (C1,p) and (C2,q)
-
-    (C1,p) and (C2,q)
+def entropic_fused_gromov_wasserstein(M, C1, C2, p, q, loss_fun, epsilon,
+                                      alpha=0.5, max_iter=1000, tol=1e-9,
+                                      verbose=False, log=False, G0=None,
+                                      solver='PGD'):
+    r"""
+    Returns the entropic fused gromov-wasserstein transport between
+    (C1,Y1,p) and (C2,Y2,q)
 
     The function solves the following optimization problem:
 
     .. math::
-        \GW = arg\min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}-\epsilon(H(T))
+        \gamma = arg\min_\gamma (1-\alpha)*<\gamma,M>_F + \alpha*\sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*\gamma_{i,j}*\gamma_{k,l}-\epsilon(H(\gamma))
 
-        s.t. \GW 1 = p
+        s.t. \gamma 1 = p
 
-             \GW^T 1= q
+             \gamma^T 1= q
 
-             \GW\geq 0
+             \gamma\geq 0
 
-    Where :
-        C1 : Metric cost matrix in the source space
-        C2 : Metric cost matrix in the target space
-        p  : distribution in the source space
-        q  : distribution in the target space
-        L  : loss function to account for the misfit between the similarity matrices
-        H  : entropy
+    with the projected gradient iterations of entropic_gromov_wasserstein
+    [12]_ applied to the fused gradient.
 
     Parameters
     ----------
-    C1 : ndarray, shape (ns, ns)
-         Metric cost matrix in the source space
-    C2 : ndarray, shape (nt, nt)
-         Metric costfr matrix in the target space
+    M : ndarray, shape (ns, nt)
+        Metric cost matrix between features across domains
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
     p :  ndarray, shape (ns,)
          distribution in the source space
     q :  ndarray, shape (nt,)
@@ -467,6 +1694,9 @@ def entropic_gromov_wasserstein(C1, C2, p, q, loss_fun, epsilon,
         loss function used for the solver either 'square_loss' or 'kl_loss'
     epsilon : float
         Regularization term >0
+    alpha : float, optional
+        Trade-off parameter (0 < alpha < 1) between the features and the
+        structure
     max_iter : int, optional
        Max number of iterations
     tol : float, optional
@@ -475,12 +1705,20 @@ def entropic_gromov_wasserstein(C1, C2, p, q, loss_fun, epsilon,
         Print information along iterations
     log : bool, optional
         record log if True
+    G0 : ndarray, shape (ns, nt), optional
+        initial coupling (default is p*q^T)
+    solver : string, optional
+        'PGD' for the projected gradient iterations of [12]_ (default) or
+        'PPA' for the proximal point iterations with a KL(T|T_k) term, which
+        converge to a (non entropic) GW solution and are stable with a
+        larger epsilon
 
     Returns
     -------
     T : ndarray, shape (ns, nt)
-        coupling between the two spaces that minimizes :
-            \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}-\epsilon(H(T))
+        Optimal transportation matrix for the given parameters
+    log : dict
+        log dictionary return only if log==True in parameters
 
     References
     ----------
@@ -488,79 +1726,51 @@ def entropic_gromov_wasserstein(C1, C2, p, q, loss_fun, epsilon,
     "Gromov-Wasserstein averaging of kernel and distance matrices."
     International Conference on Machine Learning (ICML). 2016.
 
+    .. [23] Vayer Titouan, Chapel Laetitia, Flamary Rémi, Tavenard Romain
+        and Courty Nicolas "Optimal Transport for structured data with
+        application on graphs", International Conference on Machine Learning
+        (ICML). 2019.
+
     """
 
-    C1 = np.asarray(C1, dtype=np.float64)
-    C2 = np.asarray(C2, dtype=np.float64)
+    M = np.asarray(M, dtype=np.float64)
+    C1 = _as_cost(C1)
+    C2 = _as_cost(C2)
 
     T = np.outer(p, q)  # Initialization
 
     constC, hC1, hC2 = init_matrix(C1, C2, T, p, q, loss_fun)
 
-    cpt = 0
-    err = 1
-
-    if log:
-        log = {'err': []}
-
-    while (err > tol and cpt < max_iter):
-
-        Tprev = T
-
-        # compute the gradient
-        tens = gwggrad(constC, hC1, hC2, T)
-
-        T = sinkhorn(p, q, tens, epsilon)
-
-        if cpt % 10 == 0:
-            # we can speed up the process by checking for the error only all
-            # the 10th iterations
-            err = np.linalg.norm(T - Tprev)
-
-            if log:
-                log['err'].append(err)
-
-            if verbose:
-                if cpt % 200 == 0:
-                    print('{:5s}|{:12s}'.format(
-                        'It.', 'Err') + '\n' + '-' * 19)
-                print('{:5d}|{:8e}|'.format(cpt, err))
-
-        cpt += 1
+    T, log = _entropic_gw(p, q, constC, hC1, hC2, epsilon, M=(1 - alpha) * M,
+                          alpha=alpha, max_iter=max_iter, tol=tol,
+                          verbose=verbose, log=log, G0=G0, solver=solver)
 
     if log:
-        log['gw_dist'] = gwloss(constC, hC1, hC2, T)
+        gw_dist = gwloss(constC, hC1, hC2, T)
+        log['fgw_dist'] = (1 - alpha) * np.sum(M * T) + alpha * gw_dist
         return T, log
     else:
         return T
 
 
-def entropic_gromov_wasserstein2(C1, C2, p, q, loss_fun, epsilon,
-                                 max_iter=1000, tol=1e-9, verbose=False, log=False):
+def entropic_fused_gromov_wasserstein2(M, C1, C2, p, q, loss_fun, epsilon,
+                                       alpha=0.5, max_iter=1000, tol=1e-9,
+                                       verbose=False, log=False, solver='PGD'):
     """
-    Returns the entropic gromov-wasserstein discrepancy between the two measured similarity matrices
-
-    (C1,p) and (C2,q)
+    Returns the entropic fused gromov-wasserstein distance between
+    (C1,Y1,p) and (C2,Y2,q)
 
-    The function solves the following optimization problem:
-
-    .. math::
-        \GW_Dist = \min_T \sum_{i,j,k,l} L(C1_{i,k},C2_{j,l})*T_{i,j}*T_{k,l}-\epsilon(H(T))
-
-    Where :
-        C1 : Metric cost matrix in the source space
-        C2 : Metric cost matrix in the target space
-        p  : distribution in the source space
-        q  : distribution in the target space
-        L  : loss function to account for the misfit between the similarity matrices
-        H  : entropy
+    See entropic_fused_gromov_wasserstein for the problem and the parameters.
 
     Parameters
     ----------
-    C1 : ndarray, shape (ns, ns)
-         Metric cost matrix in the source space
-    C2 : ndarray, shape (nt, nt)
-         Metric costfr matrix in the target space
+    M : ndarray, shape (ns, nt)
+        Metric cost matrix between features across domains
+    C1 : ndarray, shape (ns, ns), scipy.sparse matrix or tuple of ndarray
+         Metric cost matrix in the source space (possibly sparse), or its
+         low-rank factors
+    C2 : ndarray, shape (nt, nt), scipy.sparse matrix or tuple of ndarray
+         Metric costfr matrix in the target space, or its low-rank factors
     p :  ndarray, shape (ns,)
          distribution in the source space
     q :  ndarray, shape (nt,)
@@ -569,41 +1779,56 @@ def entropic_gromov_wasserstein2(C1, C2, p, q, loss_fun, epsilon,
         loss function used for the solver either 'square_loss' or 'kl_loss'
     epsilon : float
         Regularization term >0
+    alpha : float, optional
+        Trade-off parameter (0 < alpha < 1) between the features and the
+        structure
     max_iter : int, optional
-        Max number of iterations
+       Max number of iterations
     tol : float, optional
         Stop threshold on error (>0)
     verbose : bool, optional
         Print information along iterations
     log : bool, optional
         record log if True
+    solver : string, optional
+        'PGD' (default) or 'PPA', see entropic_gromov_wasserstein
 
     Returns
     -------
-    gw_dist : float
-        Gromov-Wasserstein distance
-
-    References
-    ----------
-    .. [12] Peyré, Gabriel, Marco Cuturi, and Justin Solomon,
-    "Gromov-Wasserstein averaging of kernel and distance matrices."
-    International Conference on Machine Learning (ICML). 2016.
+    fgw_dist : float
+        Fused Gromov-Wasserstein distance (without the entropy)
+    log : dict
+        convergence information and Coupling matrix
 
     """
 
-    gw, logv = entropic_gromov_wasserstein(
-        C1, C2, p, q, loss_fun, epsilon, max_iter, tol, verbose, log=True)
+    T, logv = entropic_fused_gromov_wasserstein(
+        M, C1, C2, p, q, loss_fun, epsilon, alpha, max_iter, tol, verbose,
+        log=True, solver=solver)
 
-    logv['T'] = gw
+    logv['T'] = T
 
     if log:
-        return logv['gw_dist'], logv
+        return logv['fgw_dist'], logv
     else:
-        return logv['gw_dist']
+        return logv['fgw_dist']
+
+
+def _parallel_map(f, X, processes):
+    """ map f on the list X with a pool of threads (no pool if processes=1)"""
+    if processes == 1 or len(X) < 2:
+        return [f(x) for x in X]
+    pool = ThreadPool(processes)
+    try:
+        return pool.map(f, X)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def entropic_gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun, epsilon,
-                                max_iter=1000, tol=1e-9, verbose=False, log=False, init_C=None):
+                                max_iter=1000, tol=1e-9, verbose=False, log=False, init_C=None,
+                                processes=None):
     """
     Returns the gromov-wasserstein barycenters of S measured similarity matrices
 
@@ -647,11 +1872,16 @@ def entropic_gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun, epsilon,
         record log if True
     init_C : bool, ndarray, shape(N,N)
              random initial value for the C matrix provided by user
+    processes : int, optional
+        number of threads solving the S Gromov-Wasserstein problems of an
+        iteration concurrently (default is the number of cpus, no thread if 1)
 
     Returns
     -------
     C : ndarray, shape (N, N)
         Similarity matrix in the barycenter space (permutated arbitrarily)
+    log : dict
+        convergence information, only returned if log==True in parameters
 
     References
     ----------
@@ -679,11 +1909,20 @@ def entropic_gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun, epsilon,
 
     error = []
 
-    while(err > tol and cpt < max_iter):
+    if log:
+        log = {'err': []}
+
+    # couplings of the previous iteration used as warm start
+    T = [None] * S
+
+    while (err > tol and cpt < max_iter):
         Cprev = C
 
-        T = [entropic_gromov_wasserstein(Cs[s], C, ps[s], p, loss_fun, epsilon,
-                                         max_iter, 1e-5, verbose, log) for s in range(S)]
+        T = _parallel_map(
+            lambda s: entropic_gromov_wasserstein(
+                Cs[s], C, ps[s], p, loss_fun, epsilon, max_iter, 1e-5,
+                verbose, G0=T[s]),
+            list(range(S)), processes)
         if loss_fun == 'square_loss':
             C = update_square_loss(p, lambdas, T, Cs)
 
@@ -707,11 +1946,15 @@ def entropic_gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun, epsilon,
 
         cpt += 1
 
-    return C
+    if log:
+        return C, log
+    else:
+        return C
 
 
 def gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun,
-                       max_iter=1000, tol=1e-9, verbose=False, log=False, init_C=None):
+                       max_iter=1000, tol=1e-9, verbose=False, log=False, init_C=None,
+                       processes=None):
     """
     Returns the gromov-wasserstein barycenters of S measured similarity matrices
 
@@ -754,11 +1997,16 @@ def gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun,
         record log if True
     init_C : bool, ndarray, shape(N,N)
              random initial value for the C matrix provided by user
+    processes : int, optional
+        number of threads solving the S Gromov-Wasserstein problems of an
+        iteration concurrently (default is the number of cpus, no thread if 1)
 
     Returns
     -------
     C : ndarray, shape (N, N)
         Similarity matrix in the barycenter space (permutated arbitrarily)
+    log : dict
+        convergence information, only returned if log==True in parameters
 
     References
     ----------
@@ -786,11 +2034,20 @@ def gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun,
 
     error = []
 
-    while(err > tol and cpt < max_iter):
+    if log:
+        log = {'err': []}
+
+    # couplings of the previous iteration used as warm start
+    T = [None] * S
+
+    while (err > tol and cpt < max_iter):
         Cprev = C
 
-        T = [gromov_wasserstein(Cs[s], C, ps[s], p, loss_fun,
-                                numItermax=max_iter, stopThr=1e-5, verbose=verbose, log=log) for s in range(S)]
+        T = _parallel_map(
+            lambda s: gromov_wasserstein(Cs[s], C, ps[s], p, loss_fun,
+                                         G0=T[s], numItermax=max_iter,
+                                         stopThr=1e-5, verbose=verbose),
+            list(range(S)), processes)
         if loss_fun == 'square_loss':
             C = update_square_loss(p, lambdas, T, Cs)
 
@@ -814,4 +2071,174 @@ def gromov_barycenters(N, Cs, ps, p, lambdas, loss_fun,
 
         cpt += 1
 
-    return C
+    if log:
+        return C, log
+    else:
+        return C
+
+
+def fgw_barycenters(N, Ys, Cs, ps, lambdas, alpha, fixed_structure=False,
+                    fixed_features=False, p=None, loss_fun='square_loss',
+                    max_iter=100, tol=1e-9, verbose=False, log=False,
+                    init_C=None, init_X=None, processes=None):
+    r"""
+    Compute the fused gromov-wasserstein barycenter of S labeled graphs
+
+    (Ys, Cs)_{s=1}^{s=S}
+
+    The function solves the following optimization problem with block
+    coordinate descent:
+
+    .. math::
+        (X, C) = argmin_{X, C} \sum_s \lambda_s FGW_{\alpha}((X, C, p), (Ys, Cs, ps))
+
+    The feature update is the barycentric projection update_feature_matrix
+    and the structure update is update_square_loss (or update_kl_loss) as in
+    gromov_barycenters [23]_.
+
+    Parameters
+    ----------
+    N : integer
+        Desired number of samples of the target barycenter
+    Ys: list of ndarray, each element has shape (ns,d)
+        Features of all samples
+    Cs : list of ndarray, each element has shape (ns,ns)
+        Structure matrices of all samples
+    ps : list of ndarray, each element has shape (ns,)
+        masses of all samples
+    lambdas : list of float
+        list of the S spaces' weights
+    alpha : float
+        Alpha parameter for the fgw distance
+    fixed_structure : bool, optional
+        Whether to fix the structure of the barycenter during the updates
+        (init_C must then be given)
+    fixed_features : bool, optional
+        Whether to fix the feature of the barycenter during the updates
+        (init_X must then be given)
+    p : ndarray, shape (N,), optional
+        weights in the targeted barycenter (default is uniform)
+    loss_fun : string, optional
+        loss function used for the solver either 'square_loss' or 'kl_loss'
+    max_iter : int, optional
+        Max number of iterations
+    tol : float, optional
+        Stop threshol on error (>0).
+    verbose : bool, optional
+        Print information along iterations.
+    log : bool, optional
+        record log if True
+    init_C : ndarray, shape (N,N), optional
+        Initialization for the barycenters' structure matrix (random if None)
+    init_X : ndarray, shape (N,d), optional
+        Initialization for the barycenters' features (zeros if None)
+    processes : int, optional
+        number of threads solving the S FGW problems of an iteration
+        concurrently (default is the number of cpus, no thread if 1)
+
+    Returns
+    -------
+    X : ndarray, shape (N,d)
+        Barycenters' features
+    C : ndarray, shape (N,N)
+        Barycenters' structure matrix
+    log : dict
+        Only returned when log=True. It contains the keys:
+        T : list of (N,ns) transport matrices
+        Ms : all distance matrices between the feature of the barycenter
+        and the other features dist(X,Ys) shape (N,ns)
+
+    References
+    ----------
+    .. [23] Vayer Titouan, Chapel Laetitia, Flamary Rémi, Tavenard Romain
+        and Courty Nicolas "Optimal Transport for structured data with
+        application on graphs", International Conference on Machine Learning
+        (ICML). 2019.
+
+    """
+    S = len(Cs)
+    d = Ys[0].shape[1]  # dimension on the node features
+    if p is None:
+        p = np.ones(N) / N
+
+    Cs = [np.asarray(Cs[s], dtype=np.float64) for s in range(S)]
+    Ys = [np.asarray(Ys[s], dtype=np.float64) for s in range(S)]
+    lambdas = np.asarray(lambdas, dtype=np.float64)
+
+    if fixed_structure:
+        if init_C is None:
+            raise ValueError('If C is fixed it must be initialized')
+        C = init_C
+    else:
+        if init_C is None:
+            xalea = np.random.randn(N, 2)
+            C = dist(xalea, xalea)
+            C /= C.max()
+        else:
+            C = init_C
+
+    if fixed_features:
+        if init_X is None:
+            raise ValueError('If X is fixed it must be initialized')
+        X = init_X
+    else:
+        if init_X is None:
+            X = np.zeros((N, d))
+        else:
+            X = init_X
+
+    T = [np.outer(p, q) for q in ps]
+
+    cpt = 0
+    err_feature = 1
+    err_structure = 1
+
+    if log:
+        log = {'err_feature': [], 'err_structure': []}
+
+    while ((err_feature > tol or err_structure > tol) and cpt < max_iter):
+        Cprev = C
+        Xprev = X
+
+        if not fixed_features:
+            X = update_feature_matrix(lambdas, Ys, T, p)
+
+        Ms = [dist(X, Ys[s]) for s in range(S)]
+
+        if not fixed_structure:
+            if loss_fun == 'square_loss':
+                C = update_square_loss(p, lambdas, [t.T for t in T], Cs)
+
+            elif loss_fun == 'kl_loss':
+                C = update_kl_loss(p, lambdas, [t.T for t in T], Cs)
+
+        T = _parallel_map(
+            lambda s: fused_gromov_wasserstein(Ms[s], C, Cs[s], p, ps[s],
+                                               loss_fun, alpha, G0=T[s],
+                                               numItermax=max_iter,
+                                               stopThr=1e-5),
+            list(range(S)), processes)
+
+        # T is N,ns
+        err_feature = np.linalg.norm(X - Xprev)
+        err_structure = np.linalg.norm(C - Cprev)
+
+        if log:
+            log['err_feature'].append(err_feature)
+            log['err_structure'].append(err_structure)
+
+        if verbose:
+            if cpt % 200 == 0:
+                print('{:5s}|{:12s}|{:12s}'.format(
+                    'It.', 'Err feature', 'Err structure') + '\n' + '-' * 32)
+            print('{:5d}|{:8e}|{:8e}'.format(cpt, err_feature,
+                                             err_structure))
+
+        cpt += 1
+
+    if log:
+        log['T'] = T
+        log['Ms'] = Ms
+        return X, C, log
+    else:
+        return X, C
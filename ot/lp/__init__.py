@@ -114,7 +114,8 @@ def emd(a, b, M, numItermax=100000, log=False):
 
 
 def emd2(a, b, M, processes=multiprocessing.cpu_count(),
-         numItermax=100000, log=False, return_matrix=False):
+         numItermax=100000, log=False, return_matrix=False,
+         return_grad=False):
     """Solves the Earth Movers distance problem and returns the loss
 
     .. math::
@@ -146,11 +147,16 @@ def emd2(a, b, M, processes=multiprocessing.cpu_count(),
         variables. Otherwise returns only the optimal transportation cost.
     return_matrix: boolean, optional (default=False)
         If True, returns the optimal transportation matrix in the log.
+    return_grad: boolean, optional (default=False)
+        If True, returns the gradients of the loss w.r.t. a, b and M.
 
     Returns
     -------
     gamma: (ns x nt) ndarray
         Optimal transportation matrix for the given parameters
+    grad: tuple of ndarray (ns,), (nt,) and (ns,nt)
+        If return_grad is True, the gradients w.r.t. a, b and M given by
+        the centered dual variables and the optimal transportation matrix
     log: dict
         If input log is true, a dictionary containing the cost and dual
         variables and exit status
@@ -204,7 +210,14 @@ def emd2(a, b, M, processes=multiprocessing.cpu_count(),
             log['v'] = v
             log['warning'] = result_code_string
             log['result_code'] = resultCode
+            if return_grad:
+                return [cost, (u - np.mean(u), v - np.mean(v), G), log]
             return [cost, log]
+    elif return_grad:
+        def f(b):
+            G, cost, u, v, result_code = emd_c(a, b, M, numItermax)
+            check_result(result_code)
+            return [cost, (u - np.mean(u), v - np.mean(v), G)]
     else:
         def f(b):
             G, cost, u, v, result_code = emd_c(a, b, M, numItermax)
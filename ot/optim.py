@@ -11,6 +11,7 @@ import numpy as np
 from scipy.optimize.linesearch import scalar_search_armijo
 from .lp import emd
 from .bregman import sinkhorn
+from .utils import SolverControl
 
 # The corresponding scipy function does not work for matrices
 
@@ -72,8 +73,245 @@ def line_search_armijo(f, xk, pk, gfk, old_fval,
     return alpha, fc[0], phi1
 
 
+def solve_1d_linesearch_quad(a, b, c):
+    """
+    For any convex or non-convex 1d quadratic function f(x) = a*x^2 + b*x + c,
+    return the minimum of f on [0,1]
+
+    Parameters
+    ----------
+    a, b, c : float
+        coefficients of the quadratic function
+
+    Returns
+    -------
+    x : float
+        the optimal value which leads to the minimal cost on [0,1]
+    """
+    f0 = c
+    df0 = b
+    f1 = a + f0 + df0
+
+    if a > 0:  # convex
+        minimum = min(1, max(0, -b / (2.0 * a)))
+        return minimum
+    else:  # non convex
+        if f0 > f1:
+            return 1
+        else:
+            return 0
+
+
+class LineSearch(object):
+    """
+    Base class of the line search strategies of ot.optim.cg and ot.optim.gcg
+
+    The strategies search the step along deltaG through the one dimensional
+    function phi(alpha) = cost(G + alpha*deltaG) given by the solvers. The
+    linear term <M, G + alpha*deltaG> of the cost is computed from values
+    cached by the solver so that only the non-linear terms are evaluated
+    for each trial step.
+    """
+
+    def search(self, phi, dphi0, phi0):
+        """ return the step alpha in [0,1], the number of evaluations of phi
+        and phi(alpha)
+
+        Parameters
+        ----------
+        phi : function
+            cost along the descent direction
+        dphi0 : float
+            derivative of phi at 0
+        phi0 : float
+            phi(0)
+        """
+        raise NotImplementedError
+
+
+class LineSearchArmijo(LineSearch):
+    """
+    Armijo line search strategy (see ot.optim.line_search_armijo)
+
+    Parameters
+    ----------
+    c1 : float, optional
+        c1 const in armijo rule (>0)
+    alpha0 : float, optional
+        initial step (>0)
+    """
+
+    def __init__(self, c1=1e-4, alpha0=0.99):
+        self.c1 = c1
+        self.alpha0 = alpha0
+
+    def search(self, phi, dphi0, phi0):
+        fc = [0]
+        if dphi0 >= 0:
+            # not a descent direction (e.g. inexact linear problem), the
+            # armijo steps would be negative
+            return 0., fc[0], phi0
+
+        def phi_count(alpha):
+            fc[0] += 1
+            return phi(alpha)
+
+        alpha, phi1 = scalar_search_armijo(phi_count, phi0, dphi0,
+                                           c1=self.c1, alpha0=self.alpha0)
+        if alpha is None:
+            # no descent step found
+            return 0., fc[0], phi0
+        return alpha, fc[0], phi1
+
+
+class LineSearchQuadratic(LineSearch):
+    """
+    Exact line search strategy for quadratic costs
+
+    phi(alpha) = a*alpha^2 + b*alpha + phi(0) is identified with its
+    derivative at 0 and one evaluation at alpha=1, then minimized on [0,1]
+    with ot.optim.solve_1d_linesearch_quad.
+    """
+
+    def search(self, phi, dphi0, phi0):
+        a = phi(1.) - dphi0 - phi0
+        alpha = solve_1d_linesearch_quad(a, dphi0, phi0)
+        return alpha, 1, phi0 + a * alpha ** 2 + dphi0 * alpha
+
+
+def _count_calls(f, df):
+    """ return f and df counting their calls in calls[0] and calls[1]"""
+    calls = np.zeros(2, dtype=int)
+
+    def f_count(G):
+        calls[0] += 1
+        return f(G)
+
+    def df_count(G):
+        calls[1] += 1
+        return df(G)
+
+    return f_count, df_count, calls
+
+
+def _line_search_step(line_search, cost, G, deltaG, Mi, f_val, M, lin_G,
+                      nonlin):
+    """ return the step, the number of cost evaluations, the new cost and
+    the new <M, G> for a LineSearch object or a line search function
+
+    nonlin(G) is the non-linear part of the cost and Mi its gradient.
+    """
+    if isinstance(line_search, LineSearch):
+        # <M, deltaG> is shared by all the trial steps
+        lin_dG = np.sum(M * deltaG)
+
+        def phi(alpha):
+            return lin_G + alpha * lin_dG + nonlin(G + alpha * deltaG)
+
+        alpha, fc, f_val = line_search.search(phi, np.sum(deltaG * Mi),
+                                              f_val)
+        return alpha, fc, f_val, lin_G + alpha * lin_dG
+    alpha, fc, f_val = line_search(cost, G, deltaG, Mi, f_val)
+    return alpha, fc, f_val, None
+
+
+class _ActiveSet(object):
+    """ Active set of the away-step and pairwise conditional gradients
+
+    G is kept as the convex combination sum_k weights[k]*V_k of the
+    starting point G0 = V_0 and of sparse vertices (solutions of the linear
+    programs). G0 is usually dense and is kept apart until it is dropped.
+    The supports of the other vertices are concatenated in buffers grown
+    with their number of nonzeros (the first nnz entries are used) so that
+    the costs <V_k, Mi> of all the vertices are computed in one pass.
+    """
+
+    def __init__(self, G0):
+        self.G0 = G0
+        self.nnz = 0
+        self.rows = np.zeros(0, dtype=int)
+        self.cols = np.zeros(0, dtype=int)
+        self.values = np.zeros(0)
+        self.owner = np.zeros(0, dtype=int)
+        self.weights = np.ones(1)
+        # G0 is not compared with the other vertices
+        self.keys = [None]
+        self.index = {None: 0}
+
+    def __len__(self):
+        return len(self.index)
+
+    def costs(self, Mi):
+        """ return <V_k, Mi> for all vertices (-inf for dropped ones)"""
+        n = self.nnz
+        costs = np.bincount(self.owner[:n],
+                            self.values[:n] * Mi[self.rows[:n], self.cols[:n]],
+                            minlength=len(self.weights)).astype(float)
+        if self.G0 is not None and self.weights[0] > 0:
+            costs[0] = np.sum(self.G0 * Mi)
+        costs[self.weights <= 0] = -np.inf
+        return costs
+
+    def subtract(self, X, k):
+        """ subtract vertex k from X (in place)"""
+        if k == 0 and self.G0 is not None:
+            X -= self.G0
+        else:
+            sel = np.flatnonzero(self.owner[:self.nnz] == k)
+            X[self.rows[sel], self.cols[sel]] -= self.values[sel]
+
+    def add(self, G, step):
+        """ add step to the weight of the vertex G (added if needed)"""
+        rows, cols = np.nonzero(G)
+        values = G[rows, cols]
+        key = (rows.tobytes(), cols.tobytes(), values.tobytes())
+        if key in self.index:
+            self.weights[self.index[key]] += step
+            return
+        k = len(self.weights)
+        self.index[key] = k
+        self.keys.append(key)
+        self.weights = np.append(self.weights, step)
+        n = self.nnz + len(rows)
+        if n > len(self.rows):
+            size = max(n, 2 * len(self.rows))
+            for name in ['rows', 'cols', 'values', 'owner']:
+                buf = getattr(self, name)
+                setattr(self, name, np.resize(buf, size))
+        self.rows[self.nnz:n] = rows
+        self.cols[self.nnz:n] = cols
+        self.values[self.nnz:n] = values
+        self.owner[self.nnz:n] = k
+        self.nnz = n
+
+    def drop(self, k=None):
+        """ drop vertex k and the vertices with a non-positive weight"""
+        if k is not None:
+            self.weights[k] = 0
+        for k in np.flatnonzero(self.weights <= 0):
+            self.index.pop(self.keys[k], None)
+        if None not in self.index:
+            # G0 is dropped (vertex 0 stays dead until the compaction)
+            self.G0 = None
+        if len(self.index) < len(self.weights) / 2:
+            # remove the dropped vertices from the storage
+            alive = self.weights > 0
+            new_index = np.cumsum(alive) - 1
+            sel = np.flatnonzero(alive[self.owner[:self.nnz]])
+            n = len(sel)
+            self.rows[:n] = self.rows[sel]
+            self.cols[:n] = self.cols[sel]
+            self.values[:n] = self.values[sel]
+            self.owner[:n] = new_index[self.owner[sel]]
+            self.nnz = n
+            self.weights = self.weights[alive]
+            self.keys = [key for key, a in zip(self.keys, alive) if a]
+            self.index = {key: k for k, key in enumerate(self.keys)}
+
+
 def cg(a, b, M, reg, f, df, G0=None, numItermax=200,
-       stopThr=1e-9, verbose=False, log=False):
+       stopThr=1e-9, verbose=False, log=False, control=None,
+       line_search=None, variant='fw', stopGap=None):
     """
     Solve the general regularized OT problem with conditional gradient
 
@@ -116,13 +354,37 @@ def cg(a, b, M, reg, f, df, G0=None, numItermax=200,
         Print information along iterations
     log : bool, optional
         record log if True
+    control : ot.utils.SolverControl, optional
+        time, matvec and duality gap budgets. One matvec is counted for
+        each evaluation of df and of the cost, and the duality gap is the
+        Frank-Wolfe gap <G - Gc, M + reg*df(G)>
+    line_search : ot.optim.LineSearch or function, optional
+        line search strategy, e.g. ot.optim.LineSearchArmijo() (default)
+        or ot.optim.LineSearchQuadratic() for a quadratic f, or a closed
+        form line_search(cost, G, deltaG, Mi, f_val) returning the step,
+        the number of cost evaluations and the new cost
+    variant : str, optional
+        'fw' for the classical conditional gradient, 'away' for the
+        away-step and 'pairwise' for the pairwise Frank-Wolfe algorithms
+        of [24]_. The last two keep G as a convex combination of the
+        solutions of the linear programs (the active set) and can move
+        mass away from the worst of them, which gives a linear convergence
+        rate on the transport polytope for strongly convex f.
+    stopGap : float, optional
+        If given, stop when the Frank-Wolfe gap <G - Gc, M + reg*df(G)> is
+        below stopGap (or when the loss does not decrease anymore) instead
+        of using the relative variation of the loss. For a convex f the gap
+        bounds the suboptimality of the loss, for a non-convex f (e.g.
+        Gromov-Wasserstein) it measures stationarity.
 
     Returns
     -------
     gamma : (ns x nt) ndarray
         Optimal transportation matrix for the given parameters
     log : dict
-        log dictionary return only if log==True in parameters
+        log dictionary return only if log==True in parameters, with the
+        number of evaluations of f and df of each iteration in n_f and n_df
+        and the Frank-Wolfe gap of each iteration in fw_gap
 
 
     References
@@ -130,6 +392,8 @@ def cg(a, b, M, reg, f, df, G0=None, numItermax=200,
 
     .. [1] Ferradans, S., Papadakis, N., Peyré, G., & Aujol, J. F. (2014). Regularized discrete optimal transport. SIAM Journal on Imaging Sciences, 7(3), 1853-1882.
 
+    .. [24] Lacoste-Julien, S., & Jaggi, M. (2015). On the global linear convergence of Frank-Wolfe optimization variants. Advances in Neural Information Processing Systems (NIPS), 496-504.
+
     See Also
     --------
     ot.lp.emd : Unregularized optimal ransport
@@ -140,17 +404,42 @@ def cg(a, b, M, reg, f, df, G0=None, numItermax=200,
     loop = 1
 
     if log:
-        log = {'loss': []}
+        log = {'loss': [], 'n_f': [], 'n_df': [], 'fw_gap': []}
 
     if G0 is None:
         G = np.outer(a, b)
     else:
         G = G0
 
+    if control is not None:
+        control.start()
+
+    f, df, calls = _count_calls(f, df)
+
+    if variant not in ('fw', 'away', 'pairwise'):
+        raise ValueError("Unknown conditional gradient variant "
+                         "'{}'".format(variant))
+
+    if line_search is None and variant == 'fw':
+        line_search = LineSearchArmijo()
+    elif line_search is None:
+        # the full step must be tried to drop atoms of the active set
+        line_search = LineSearchArmijo(alpha0=1.)
+
+    if variant != 'fw':
+        # G0 is the first atom of the active set
+        active = _ActiveSet(G)
+        if log:
+            log['n_active'] = [1]
+
     def cost(G):
         return np.sum(M * G) + reg * f(G)
 
-    f_val = cost(G)
+    def nonlin(G):
+        return reg * f(G)
+
+    lin_G = np.sum(M * G)
+    f_val = lin_G + nonlin(G)
     if log:
         log['loss'].append(f_val)
 
@@ -165,6 +454,7 @@ def cg(a, b, M, reg, f, df, G0=None, numItermax=200,
 
         it += 1
         old_fval = f_val
+        calls[:] = 0
 
         # problem linearization
         Mi = M + reg * df(G)
@@ -174,23 +464,85 @@ def cg(a, b, M, reg, f, df, G0=None, numItermax=200,
         # solve linear program
         Gc = emd(a, b, Mi)
 
-        deltaG = Gc - G
+        if variant == 'fw':
+            deltaG = Gc - G
+        else:
+            # away vertex: the atom of the active set with the largest cost
+            costs = active.costs(Mi)
+            k_away = int(np.argmax(costs))
+            weight_away = active.weights[k_away]
+            cost_G = np.sum(Mi * G)
+            cost_Gc = np.sum(Mi * Gc)
+            away_gain = costs[k_away] - cost_G
+
+            if variant == 'pairwise':
+                deltaG = Gc.copy()
+                active.subtract(deltaG, k_away)
+                max_step = weight_away
+                away = False
+            elif weight_away < 1 and away_gain > cost_G - cost_Gc:
+                # away step, better than the Frank-Wolfe direction
+                deltaG = G.copy()
+                active.subtract(deltaG, k_away)
+                max_step = weight_away / (1 - weight_away)
+                away = True
+            else:
+                deltaG = Gc - G
+                max_step = 1
+                away = False
+            # the line search is done in [0, max_step]
+            if max_step != 1:
+                deltaG *= max_step
+
+        # Frank-Wolfe gap (the shift of Mi does not change it)
+        if variant == 'fw':
+            gap = -np.sum(deltaG * Mi)
+        else:
+            gap = cost_G - cost_Gc
 
         # line search
-        alpha, fc, f_val = line_search_armijo(cost, G, deltaG, Mi, f_val)
+        alpha, fc, f_val, lin_G = _line_search_step(
+            line_search, cost, G, deltaG, Mi, f_val, M, lin_G, nonlin)
 
         G = G + alpha * deltaG
 
+        if variant != 'fw':
+            step = alpha * max_step
+            if variant == 'pairwise':
+                active.weights[k_away] -= step
+            elif away:
+                active.weights *= 1 + step
+                active.weights[k_away] -= step
+            else:
+                active.weights *= 1 - step
+            if not away and step > 0:
+                active.add(Gc, step)
+            # drop step
+            active.drop(k_away if away and alpha == 1 else None)
+
         # test convergence
         if it >= numItermax:
             loop = 0
 
         delta_fval = (f_val - old_fval) / abs(f_val)
-        if abs(delta_fval) < stopThr:
+        if stopGap is None:
+            if abs(delta_fval) < stopThr:
+                loop = 0
+        elif gap <= stopGap or f_val == old_fval:
             loop = 0
 
+        if control is not None:
+            control.add_matvec(1 + fc)
+            if control.stop(gap):
+                loop = 0
+
         if log:
             log['loss'].append(f_val)
+            log['n_f'].append(calls[0])
+            log['n_df'].append(calls[1])
+            log['fw_gap'].append(gap)
+            if variant != 'fw':
+                log['n_active'].append(len(active))
 
         if verbose:
             if it % 20 == 0:
@@ -199,13 +551,17 @@ def cg(a, b, M, reg, f, df, G0=None, numItermax=200,
             print('{:5d}|{:8e}|{:8e}'.format(it, f_val, delta_fval))
 
     if log:
+        if control is not None:
+            control.update_log(log)
         return G, log
     else:
         return G
 
 
 def gcg(a, b, M, reg1, reg2, f, df, G0=None, numItermax=10,
-        numInnerItermax=200, stopThr=1e-9, verbose=False, log=False):
+        numInnerItermax=200, stopThr=1e-9, stopInnerThr=1e-9, verbose=False,
+        log=False, line_search=None, method='sinkhorn', warmstart=True,
+        stopGap=None):
     """
     Solve the general regularized OT problem with the generalized conditional gradient
 
@@ -249,17 +605,41 @@ def gcg(a, b, M, reg1, reg2, f, df, G0=None, numItermax=10,
         Max number of iterations of Sinkhorn
     stopThr : float, optional
         Stop threshol on error (>0)
+    stopInnerThr : float, optional
+        Stop threshold of Sinkhorn. It is tightened along the iterations to
+        the square of the conditional gradient gap <G - Gc, grad>, down to
+        stopInnerThr / 1000
     verbose : bool, optional
         Print information along iterations
     log : bool, optional
         record log if True
+    line_search : ot.optim.LineSearch or function, optional
+        line search strategy (default is ot.optim.LineSearchArmijo()), see
+        ot.optim.cg
+    method : str, optional
+        Sinkhorn solver of ot.bregman.sinkhorn ('sinkhorn',
+        'sinkhorn_stabilized' or 'sinkhorn_epsilon_scaling')
+    warmstart : bool, optional
+        If True (default) Sinkhorn starts from the dual potentials of the
+        previous iteration, as the linearized cost Mi changes little
+        between two iterations
+    stopGap : float, optional
+        If given, stop when the generalized conditional gradient gap
+        <G - Gc, M + reg2*df(G)> + reg1*(Omega(G) - Omega(Gc)) is below
+        stopGap (or when the loss does not decrease anymore) instead of
+        using the relative variation of the loss. For a convex f it bounds
+        the suboptimality of the loss, up to the accuracy of the Sinkhorn
+        solutions Gc.
 
     Returns
     -------
     gamma : (ns x nt) ndarray
         Optimal transportation matrix for the given parameters
     log : dict
-        log dictionary return only if log==True in parameters
+        log dictionary return only if log==True in parameters, with the
+        number of evaluations of f and df of each iteration in n_f and n_df,
+        the number of matvecs of Sinkhorn in n_inner_matvec and the gap of
+        each iteration in fw_gap
 
 
     References
@@ -277,20 +657,37 @@ def gcg(a, b, M, reg1, reg2, f, df, G0=None, numItermax=10,
     loop = 1
 
     if log:
-        log = {'loss': []}
+        log = {'loss': [], 'n_f': [], 'n_df': [], 'n_inner_matvec': [],
+               'fw_gap': []}
 
     if G0 is None:
         G = np.outer(a, b)
     else:
         G = G0
 
+    f, df, calls = _count_calls(f, df)
+
+    if line_search is None:
+        line_search = LineSearchArmijo()
+
     def cost(G):
         return np.sum(M * G) + reg1 * np.sum(G * np.log(G)) + reg2 * f(G)
 
-    f_val = cost(G)
+    def nonlin(G):
+        return reg1 * np.sum(G * np.log(G)) + reg2 * f(G)
+
+    def entropy(G):
+        G = G[G > 0]
+        return np.sum(G * np.log(G))
+
+    lin_G = np.sum(M * G)
+    f_val = lin_G + nonlin(G)
     if log:
         log['loss'].append(f_val)
 
+    innerThr = stopInnerThr
+    potentials = None
+
     it = 0
 
     if verbose:
@@ -302,19 +699,31 @@ def gcg(a, b, M, reg1, reg2, f, df, G0=None, numItermax=10,
 
         it += 1
         old_fval = f_val
+        calls[:] = 0
 
         # problem linearization
         Mi = M + reg2 * df(G)
+        logG = np.log(G)
+        dcost = Mi + reg1 * (1 + logG)  # ??
 
         # solve linear program with Sinkhorn
-        # Gc = sinkhorn_stabilized(a,b, Mi, reg1, numItermax = numInnerItermax)
-        Gc = sinkhorn(a, b, Mi, reg1, numItermax=numInnerItermax)
+        control = SolverControl()
+        Gc, logc = sinkhorn(a, b, Mi, reg1, method=method,
+                            numItermax=numInnerItermax, stopThr=innerThr,
+                            log=True, warmstart=potentials, control=control)
+        if warmstart:
+            potentials = logc['warmstart']
 
         deltaG = Gc - G
 
+        # generalized conditional gradient gap, the inner problems get more
+        # accurate as it decreases
+        gap = -np.sum(deltaG * Mi) + reg1 * (np.sum(G * logG) - entropy(Gc))
+        innerThr = max(min(innerThr, gap ** 2), 1e-3 * stopInnerThr)
+
         # line search
-        dcost = Mi + reg1 * (1 + np.log(G))  # ??
-        alpha, fc, f_val = line_search_armijo(cost, G, deltaG, dcost, f_val)
+        alpha, fc, f_val, lin_G = _line_search_step(
+            line_search, cost, G, deltaG, dcost, f_val, M, lin_G, nonlin)
 
         G = G + alpha * deltaG
 
@@ -323,11 +732,19 @@ def gcg(a, b, M, reg1, reg2, f, df, G0=None, numItermax=10,
             loop = 0
 
         delta_fval = (f_val - old_fval) / abs(f_val)
-        if abs(delta_fval) < stopThr:
+        if stopGap is None:
+            if abs(delta_fval) < stopThr:
+                loop = 0
+        elif abs(gap) <= stopGap or f_val == old_fval:
+            # a negative gap comes from the error of Sinkhorn
             loop = 0
 
         if log:
             log['loss'].append(f_val)
+            log['n_f'].append(calls[0])
+            log['n_df'].append(calls[1])
+            log['n_inner_matvec'].append(control.n_matvec)
+            log['fw_gap'].append(gap)
 
         if verbose:
             if it % 20 == 0:
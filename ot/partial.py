@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+"""
+Partial optimal transport (transport of a fraction of the mass)
+"""
+
+# Author: Remi Flamary <remi.flamary@unice.fr>
+#
+# License: MIT License
+
+import numpy as np
+
+from .lp import emd
+
+
+def _check_mass(a, b, m):
+    """return the transported mass m checked against the marginals"""
+    mmax = min(np.sum(a), np.sum(b))
+    if m is None:
+        return mmax
+    if m < 0:
+        raise ValueError("Problem infeasible. Parameter m should be "
+                         "greater than 0.")
+    if m > mmax:
+        raise ValueError("Problem infeasible. Parameter m should be lower "
+                         "or equal to min(|a|_1, |b|_1).")
+    return m
+
+
+def partial_wasserstein(a, b, M, m=None, numItermax=100000, log=False):
+    r"""
+    Solves the exact partial optimal transport problem and returns the OT
+    matrix
+
+    The function solves the following optimization problem:
+
+    .. math::
+        \gamma = arg\min_\gamma <\gamma,M>_F
+
+        s.t. \gamma 1 \leq a
+
+             \gamma^T 1 \leq b
+
+             \gamma\geq 0
+
+             1^T \gamma^T 1 = m \leq \min\{|a|_1, |b|_1\}
+
+    where :
+
+    - M is the (ns,nt) metric cost matrix
+    - a and b are source and target weights
+    - m is the amount of mass to be transported
+
+    The problem is solved with the network simplex of ot.emd on a graph
+    extended with one dummy source and one dummy target node [21]_. The
+    dummy nodes absorb the mass that is not transported and the transport
+    between them is forbidden with a prohibitive cost, so the problem size
+    only grows by one row and one column.
+
+    Parameters
+    ----------
+    a : np.ndarray (ns,)
+        samples weights in the source domain
+    b : np.ndarray (nt,)
+        samples weights in the target domain
+    M : np.ndarray (ns,nt)
+        loss matrix
+    m : float, optional
+        amount of mass to be transported (default is min(|a|_1, |b|_1))
+    numItermax : int, optional (default=100000)
+        The maximum number of iterations of the network simplex
+    log : bool, optional
+        record log if True
+
+    Returns
+    -------
+    gamma : (ns x nt) ndarray
+        Optimal transportation matrix for the given parameters
+    log : dict
+        log dictionary return only if log==True in parameters
+
+    Examples
+    --------
+
+    >>> import ot
+    >>> a=[.1,.2]
+    >>> b=[.1,.1]
+    >>> M=[[0.,1.],[2.,3.]]
+    >>> np.round(ot.partial.partial_wasserstein(a,b,M,m=0.1),2)
+    array([[ 0.1,  0. ],
+           [ 0. ,  0. ]])
+
+    References
+    ----------
+
+    .. [21] Chapel, L., Alaya, M., Gasso, G. (2020). Partial Optimal
+        Transport with Applications on Positive-Unlabeled Learning.
+        arXiv preprint arXiv:2002.08276.
+
+    See Also
+    --------
+    ot.partial.entropic_partial_wasserstein : Entropic partial OT
+    ot.lp.emd : Unregularized OT
+    r"""
+
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    M = np.asarray(M, dtype=np.float64)
+
+    m = _check_mass(a, b, m)
+
+    na, nb = M.shape
+
+    # the dummy source receives the target mass that is not transported
+    # (and conversely) with a null cost, the dummy to dummy cost is larger
+    # than -M so that exactly m is transported between the real points
+    a_extended = np.append(a, np.sum(b) - m)
+    b_extended = np.append(b, np.sum(a) - m)
+    M_extended = np.zeros((na + 1, nb + 1))
+    M_extended[:na, :nb] = M
+    M_extended[-1, -1] = 2 * np.max(np.abs(M)) + 1
+
+    gamma, log_emd = emd(a_extended, b_extended, M_extended,
+                         numItermax=numItermax, log=True)
+    gamma = gamma[:na, :nb]
+
+    if log:
+        log_emd['cost'] = np.sum(gamma * M)
+        log_emd['u'] = log_emd['u'][:na]
+        log_emd['v'] = log_emd['v'][:nb]
+        return gamma, log_emd
+    else:
+        return gamma
+
+
+def partial_wasserstein2(a, b, M, m=None, numItermax=100000, log=False):
+    r"""
+    Solves the exact partial optimal transport problem and returns the loss
+
+    The function solves the following optimization problem:
+
+    .. math::
+        W = \min_\gamma <\gamma,M>_F
+
+        s.t. \gamma 1 \leq a
+
+             \gamma^T 1 \leq b
+
+             \gamma\geq 0
+
+             1^T \gamma^T 1 = m \leq \min\{|a|_1, |b|_1\}
+
+    where :
+
+    - M is the (ns,nt) metric cost matrix
+    - a and b are source and target weights
+    - m is the amount of mass to be transported
+
+    Parameters
+    ----------
+    a : np.ndarray (ns,)
+        samples weights in the source domain
+    b : np.ndarray (nt,)
+        samples weights in the target domain
+    M : np.ndarray (ns,nt)
+        loss matrix
+    m : float, optional
+        amount of mass to be transported (default is min(|a|_1, |b|_1))
+    numItermax : int, optional (default=100000)
+        The maximum number of iterations of the network simplex
+    log : bool, optional
+        record log if True
+
+    Returns
+    -------
+    W : float
+        partial OT loss for the given parameters
+    log : dict
+        log dictionary (with the OT matrix in 'T') return only if log==True
+        in parameters
+
+    See Also
+    --------
+    ot.partial.partial_wasserstein : Exact partial OT matrix
+    r"""
+
+    gamma, log_emd = partial_wasserstein(a, b, M, m, numItermax=numItermax,
+                                         log=True)
+    log_emd['T'] = gamma
+
+    if log:
+        return log_emd['cost'], log_emd
+    else:
+        return log_emd['cost']
+
+
+def entropic_partial_wasserstein(a, b, M, reg, m=None, numItermax=1000,
+                                 stopThr=1e-9, verbose=False, log=False):
+    r"""
+    Solves the entropic partial optimal transport problem and returns the
+    OT matrix
+
+    The function solves the following optimization problem:
+
+    .. math::
+        \gamma = arg\min_\gamma <\gamma,M>_F + reg\cdot\Omega(\gamma)
+
+        s.t. \gamma 1 \leq a
+
+             \gamma^T 1 \leq b
+
+             \gamma\geq 0
+
+             1^T \gamma^T 1 = m \leq \min\{|a|_1, |b|_1\}
+
+    where :
+
+    - M is the (ns,nt) metric cost matrix
+    - :math:`\Omega` is the entropic regularization term :math:`\Omega(\gamma)=\sum_{i,j} \gamma_{i,j}\log(\gamma_{i,j})`
+    - a and b are source and target weights
+    - m is the amount of mass to be transported
+
+    The problem is solved with the iterative Bregman projections (Dykstra
+    algorithm) of [3]_ (section 5.1). All the projections are diagonal
+    scalings of the kernel, so the iterations are Sinkhorn-like matrix
+    vector products on the scaling vectors u and v.
+
+    Parameters
+    ----------
+    a : np.ndarray (ns,)
+        samples weights in the source domain
+    b : np.ndarray (nt,)
+        samples weights in the target domain
+    M : np.ndarray (ns,nt)
+        loss matrix
+    reg : float
+        Regularization term >0
+    m : float, optional
+        amount of mass to be transported (default is min(|a|_1, |b|_1))
+    numItermax : int, optional
+        Max number of iterations
+    stopThr : float, optional
+        Stop threshol on error (>0)
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+
+    Returns
+    -------
+    gamma : (ns x nt) ndarray
+        Optimal transportation matrix for the given parameters
+    log : dict
+        log dictionary return only if log==True in parameters
+
+    References
+    ----------
+
+    .. [3] Benamou, J. D., Carlier, G., Cuturi, M., Nenna, L., & Peyré, G. (2015). Iterative Bregman projections for regularized transportation problems. SIAM Journal on Scientific Computing, 37(2), A1111-A1138.
+
+    See Also
+    --------
+    ot.partial.partial_wasserstein : Exact partial OT
+    ot.bregman.sinkhorn_knopp : Classic Sinkhorn [2]
+    r"""
+
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    M = np.asarray(M, dtype=np.float64)
+
+    m = _check_mass(a, b, m)
+
+    na, nb = M.shape
+
+    if log:
+        log = {'err': []}
+
+    # Next 3 lines equivalent to K= np.exp(-M/reg), but faster to compute
+    K = np.empty(M.shape, dtype=M.dtype)
+    np.divide(M, -reg, out=K)
+    np.exp(K, out=K)
+
+    # gamma = diag(u) K diag(v) with initial mass m
+    u = np.ones(na) * m / np.sum(K)
+    v = np.ones(nb)
+
+    # Dykstra corrections of the inequality constraints (also diagonal)
+    q1 = np.ones(na)
+    q2 = np.ones(nb)
+
+    cpt = 0
+    err = 1
+    while (err > stopThr and cpt < numItermax):
+        uprev = u
+        vprev = v
+
+        # projection on gamma 1 <= a
+        u = u * q1
+        r = np.minimum(a / (u * np.dot(K, v) + 1e-300), 1)
+        u = u * r
+        q1 = 1. / r
+
+        # projection on gamma^T 1 <= b
+        v = v * q2
+        c = np.minimum(b / (v * np.dot(K.T, u) + 1e-300), 1)
+        v = v * c
+        q2 = 1. / c
+
+        # projection on the total mass
+        u = u * (m / np.dot(u, np.dot(K, v)))
+
+        if not (np.all(np.isfinite(u)) and np.all(np.isfinite(v))):
+            # we have reached the machine precision
+            # come back to previous solution and quit loop
+            print('Warning: numerical errors at iteration', cpt)
+            u = uprev
+            v = vprev
+            break
+        if cpt % 10 == 0:
+            # we can speed up the process by checking for the error only all
+            # the 10th iterations
+            err = np.sum((u - uprev)**2) / np.sum((u)**2) + \
+                np.sum((v - vprev)**2) / np.sum((v)**2)
+            if log:
+                log['err'].append(err)
+
+            if verbose:
+                if cpt % 200 == 0:
+                    print(
+                        '{:5s}|{:12s}'.format('It.', 'Err') + '\n' + '-' * 19)
+                print('{:5d}|{:8e}|'.format(cpt, err))
+        cpt = cpt + 1
+
+    gamma = u.reshape((-1, 1)) * K * v.reshape((1, -1))
+
+    if log:
+        log['u'] = u
+        log['v'] = v
+        log['niter'] = cpt
+        log['cost'] = np.sum(gamma * M)
+        return gamma, log
+    else:
+        return gamma
+
+
+def entropic_partial_wasserstein2(a, b, M, reg, m=None, numItermax=1000,
+                                  stopThr=1e-9, verbose=False, log=False):
+    r"""
+    Solves the entropic partial optimal transport problem and returns the
+    loss
+
+    The function solves the following optimization problem:
+
+    .. math::
+        W = \min_\gamma <\gamma,M>_F + reg\cdot\Omega(\gamma)
+
+        s.t. \gamma 1 \leq a
+
+             \gamma^T 1 \leq b
+
+             \gamma\geq 0
+
+             1^T \gamma^T 1 = m \leq \min\{|a|_1, |b|_1\}
+
+    and returns :math:`<\gamma,M>_F` for the optimal :math:`\gamma`, as
+    ot.sinkhorn2 does.
+
+    Parameters
+    ----------
+    a : np.ndarray (ns,)
+        samples weights in the source domain
+    b : np.ndarray (nt,)
+        samples weights in the target domain
+    M : np.ndarray (ns,nt)
+        loss matrix
+    reg : float
+        Regularization term >0
+    m : float, optional
+        amount of mass to be transported (default is min(|a|_1, |b|_1))
+    numItermax : int, optional
+        Max number of iterations
+    stopThr : float, optional
+        Stop threshol on error (>0)
+    verbose : bool, optional
+        Print information along iterations
+    log : bool, optional
+        record log if True
+
+    Returns
+    -------
+    W : float
+        entropic partial OT loss for the given parameters
+    log : dict
+        log dictionary (with the OT matrix in 'T') return only if log==True
+        in parameters
+
+    See Also
+    --------
+    ot.partial.entropic_partial_wasserstein : Entropic partial OT matrix
+    r"""
+
+    gamma, logv = entropic_partial_wasserstein(
+        a, b, M, reg, m, numItermax=numItermax, stopThr=stopThr,
+        verbose=verbose, log=True)
+    logv['T'] = gamma
+
+    if log:
+        return logv['cost'], logv
+    else:
+        return logv['cost']
@@ -84,7 +84,8 @@ def coordinate_grad_semi_dual(b, M, reg, beta, i):
     return b - khi
 
 
-def sag_entropic_transport(a, b, M, reg, numItermax=10000, lr=None):
+def sag_entropic_transport(a, b, M, reg, numItermax=10000, lr=None,
+                           control=None):
     '''
     Compute the SAG algorithm to solve the regularized discrete measures
         optimal transport max problem
@@ -120,6 +121,8 @@ def sag_entropic_transport(a, b, M, reg, numItermax=10000, lr=None):
         number of iteration
     lr : float number
         learning rate
+    control : ot.utils.SolverControl, optional
+        time and matvec budgets (one matvec every n_source iterations)
 
     Returns
     -------
@@ -161,6 +164,8 @@ def sag_entropic_transport(a, b, M, reg, numItermax=10000, lr=None):
     cur_beta = np.zeros(n_target)
     stored_gradient = np.zeros((n_source, n_target))
     sum_stored_gradient = np.zeros(n_target)
+    if control is not None:
+        control.start()
     for _ in range(numItermax):
         i = np.random.randint(n_source)
         cur_coord_grad = a[i] * coordinate_grad_semi_dual(b, M, reg,
@@ -168,10 +173,15 @@ def sag_entropic_transport(a, b, M, reg, numItermax=10000, lr=None):
         sum_stored_gradient += (cur_coord_grad - stored_gradient[i])
         stored_gradient[i] = cur_coord_grad
         cur_beta += lr * (1. / n_source) * sum_stored_gradient
+        if control is not None:
+            control.add_matvec(1. / n_source)
+            if control.stop():
+                break
     return cur_beta
 
 
-def averaged_sgd_entropic_transport(a, b, M, reg, numItermax=300000, lr=None):
+def averaged_sgd_entropic_transport(a, b, M, reg, numItermax=300000, lr=None,
+                                    control=None):
     '''
     Compute the ASGD algorithm to solve the regularized semi contibous measures
         optimal transport max problem
@@ -205,6 +215,8 @@ def averaged_sgd_entropic_transport(a, b, M, reg, numItermax=300000, lr=None):
         number of iteration
     lr : float number
         learning rate
+    control : ot.utils.SolverControl, optional
+        time and matvec budgets (one matvec every n_source iterations)
 
 
     Returns
@@ -246,12 +258,18 @@ def averaged_sgd_entropic_transport(a, b, M, reg, numItermax=300000, lr=None):
     n_target = np.shape(M)[1]
     cur_beta = np.zeros(n_target)
     ave_beta = np.zeros(n_target)
+    if control is not None:
+        control.start()
     for cur_iter in range(numItermax):
         k = cur_iter + 1
         i = np.random.randint(n_source)
         cur_coord_grad = coordinate_grad_semi_dual(b, M, reg, cur_beta, i)
         cur_beta += (lr / np.sqrt(k)) * cur_coord_grad
         ave_beta = (1. / k) * cur_beta + (1 - 1. / k) * ave_beta
+        if control is not None:
+            control.add_matvec(1. / n_source)
+            if control.stop():
+                break
     return ave_beta
 
 
@@ -329,7 +347,7 @@ def c_transform_entropic(b, M, reg, beta):
 
 
 def solve_semi_dual_entropic(a, b, M, reg, method, numItermax=10000, lr=None,
-                                log=False):
+                                log=False, control=None):
     '''
     Compute the transportation matrix to solve the regularized discrete
         measures optimal transport max problem
@@ -373,6 +391,8 @@ def solve_semi_dual_entropic(a, b, M, reg, method, numItermax=10000, lr=None,
         size of the target measure
     log : bool, optional
         record log if True
+    control : ot.utils.SolverControl, optional
+        time and matvec budgets (one matvec every n_source iterations)
 
     Returns
     -------
@@ -410,9 +430,11 @@ def solve_semi_dual_entropic(a, b, M, reg, method, numItermax=10000, lr=None,
     '''
 
     if method.lower() == "sag":
-        opt_beta = sag_entropic_transport(a, b, M, reg, numItermax, lr)
+        opt_beta = sag_entropic_transport(a, b, M, reg, numItermax, lr,
+                                          control)
     elif method.lower() == "asgd":
-        opt_beta = averaged_sgd_entropic_transport(a, b, M, reg, numItermax, lr)
+        opt_beta = averaged_sgd_entropic_transport(a, b, M, reg, numItermax, lr,
+                                                   control)
     else:
         print("Please, select your method between SAG and ASGD")
         return None
@@ -425,6 +447,8 @@ def solve_semi_dual_entropic(a, b, M, reg, method, numItermax=10000, lr=None,
         log = {}
         log['alpha'] = opt_alpha
         log['beta'] = opt_beta
+        if control is not None:
+            control.update_log(log)
         return pi, log
     else:
         return pi
@@ -603,7 +627,7 @@ def batch_grad_dual_beta(M, reg, alpha, beta, batch_size, batch_alpha,
 
 
 def sgd_entropic_regularization(M, reg, batch_size, numItermax, lr,
-                                alternate=True):
+                                alternate=True, control=None):
     '''
     Compute the sgd algorithm to solve the regularized discrete measures
         optimal transport dual problem
@@ -636,6 +660,9 @@ def sgd_entropic_regularization(M, reg, batch_size, numItermax, lr,
         learning rate
     alternate : bool, optional
         alternating algorithm
+    control : ot.utils.SolverControl, optional
+        time and matvec budgets (a batch counts for
+        2 * batch_size**2 / (ns * nt) matvecs)
 
     Returns
     -------
@@ -679,6 +706,9 @@ def sgd_entropic_regularization(M, reg, batch_size, numItermax, lr,
     n_target = np.shape(M)[1]
     cur_alpha = np.random.randn(n_source)
     cur_beta = np.random.randn(n_target)
+    batch_matvec = 2. * batch_size**2 / (n_source * n_target)
+    if control is not None:
+        control.start()
     if alternate:
         for cur_iter in range(numItermax):
             k = np.sqrt(cur_iter + 1)
@@ -692,6 +722,10 @@ def sgd_entropic_regularization(M, reg, batch_size, numItermax, lr,
                                                batch_size, batch_alpha,
                                                batch_beta)
             cur_beta[batch_beta] += (lr / k) * grad_F_beta
+            if control is not None:
+                control.add_matvec(batch_matvec)
+                if control.stop():
+                    break
 
     else:
         for cur_iter in range(numItermax):
@@ -706,12 +740,16 @@ def sgd_entropic_regularization(M, reg, batch_size, numItermax, lr,
                                                batch_beta)
             cur_alpha[batch_alpha] += (lr / k) * grad_F_alpha
             cur_beta[batch_beta] += (lr / k) * grad_F_beta
+            if control is not None:
+                control.add_matvec(batch_matvec)
+                if control.stop():
+                    break
 
     return cur_alpha, cur_beta
 
 
 def solve_dual_entropic(a, b, M, reg, batch_size, numItermax=10000, lr=1,
-                        log=False):
+                        log=False, control=None):
     '''
     Compute the transportation matrix to solve the regularized discrete measures
         optimal transport dual problem
@@ -748,6 +786,9 @@ def solve_dual_entropic(a, b, M, reg, batch_size, numItermax=10000, lr=1,
         learning rate
     log : bool, optional
         record log if True
+    control : ot.utils.SolverControl, optional
+        time and matvec budgets
+        (see ot.stochastic.sgd_entropic_regularization)
 
     Returns
     -------
@@ -788,13 +829,16 @@ def solve_dual_entropic(a, b, M, reg, batch_size, numItermax=10000, lr=1,
     '''
 
     opt_alpha, opt_beta = sgd_entropic_regularization(M, reg, batch_size,
-                                                      numItermax, lr)
+                                                      numItermax, lr,
+                                                      control=control)
     pi = (np.exp((opt_alpha[:, None] + opt_beta[None, :] - M[:, :]) / reg) *
           a[:, None] * b[None, :])
     if log:
         log = {}
         log['alpha'] = opt_alpha
         log['beta'] = opt_beta
+        if control is not None:
+            control.update_log(log)
         return pi, log
     else:
         return pi
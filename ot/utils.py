@@ -10,6 +10,7 @@ Various function that can be usefull
 import multiprocessing
 from functools import reduce
 import time
+import threading
 
 import numpy as np
 from scipy.spatial.distance import cdist
@@ -274,6 +275,89 @@ def check_random_state(seed):
                      ' instance'.format(seed))
 
 
+class SolverControl(object):
+
+    """Budget shared by the iterative solvers
+
+    The solvers accepting a control object (ot.sinkhorn, ot.optim.cg,
+    ot.gromov.gromov_wasserstein and the stochastic solvers) stop as soon as
+    one of the budgets is exhausted and return the best iterate found so far.
+    The reason of the stop is stored in the status attribute and copied in
+    the log of the solver.
+
+    Parameters
+    ----------
+    max_time : float, optional
+        wall-clock deadline in seconds from the start of the solver
+    max_matvec : float, optional
+        maximum number of products with a (ns,nt) matrix (kernel or cost)
+        or equivalent amount of work for the stochastic solvers
+    target_gap : float, optional
+        stop when the duality gap computed by the solver is below target_gap
+
+    Attributes
+    ----------
+    status : int
+        0 if the solver stopped on its own criterion, 1 if the time budget
+        was exhausted, 2 if the matvec budget was exhausted and 3 if the
+        target duality gap was reached
+    n_matvec : float
+        number of matvecs performed since the start of the solver
+    gap : float or None
+        last duality gap given by the solver
+
+    """
+
+    STATUS_MESSAGES = {0: 'Solver stopping criterion',
+                       1: 'Time budget exhausted',
+                       2: 'Matvec budget exhausted',
+                       3: 'Target duality gap reached'}
+
+    def __init__(self, max_time=None, max_matvec=None, target_gap=None):
+        self.max_time = max_time
+        self.max_matvec = max_matvec
+        self.target_gap = target_gap
+        # the chunks of targets of ot.sinkhorn share the control in threads
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        """Reset the counters (called at the beginning of each solver)"""
+        self.t0 = time.time()
+        self.n_matvec = 0
+        self.gap = None
+        self.status = 0
+        return self
+
+    def add_matvec(self, n=1):
+        """Count n matvecs"""
+        with self._lock:
+            self.n_matvec += n
+
+    def stop(self, gap=None):
+        """Return True if a budget is exhausted (and set the status)"""
+        with self._lock:
+            if gap is not None:
+                self.gap = gap
+                if self.target_gap is not None and gap <= self.target_gap:
+                    self.status = 3
+            if self.max_time is not None and time.time() - self.t0 >= self.max_time:
+                self.status = 1
+            if self.max_matvec is not None and self.n_matvec >= self.max_matvec:
+                self.status = 2
+            return self.status != 0
+
+    def update_log(self, log):
+        """Copy the status and counters in the log dictionary of a solver"""
+        log['status'] = self.status
+        log['status_message'] = self.STATUS_MESSAGES[self.status]
+        log['n_matvec'] = self.n_matvec
+        log['time'] = time.time() - self.t0
+        if self.gap is not None:
+            log['gap'] = self.gap
+        return log
+
+
 class deprecated(object):
 
     """Decorator to mark a function or class as deprecated.
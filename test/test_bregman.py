@@ -78,6 +78,168 @@ def test_sinkhorn_variants():
     np.testing.assert_allclose(G0, Gerr)
 
 
+def test_sinkhorn_epsilon_scaling():
+    # test epsilon scaling schedule and kernel truncation
+    n = 100
+    rng = np.random.RandomState(0)
+
+    x = rng.randn(n, 2)
+    u = ot.utils.unif(n)
+
+    M = ot.dist(x, x)
+    M /= M.max()
+
+    reg = 1e-2
+
+    Gs = ot.bregman.sinkhorn_stabilized(u, u, M, reg, numItermax=10000,
+                                        stopThr=1e-12)
+    Ges, log = ot.bregman.sinkhorn_epsilon_scaling(
+        u, u, M, reg, scaling_base=0.5, stopThr=1e-12, log=True)
+    Get = ot.bregman.sinkhorn_epsilon_scaling(
+        u, u, M, reg, scaling_base=0.5, truncate=1e-30, stopThr=1e-12)
+
+    # check values
+    np.testing.assert_allclose(Gs, Ges, atol=1e-05)
+    np.testing.assert_allclose(Gs, Get, atol=1e-05)
+
+    # one kernel per epsilon level (plus absorptions)
+    assert log['nkernel'] < log['niter']
+
+    # truncated kernel built by several blocks of rows
+    xt = rng.randn(2 * n, 2)
+    xs = rng.randn(7 * n, 2)
+    M = ot.dist(xs, xt)
+    M /= M.max()
+    a, b = ot.utils.unif(7 * n), ot.utils.unif(2 * n)
+    Ges = ot.bregman.sinkhorn_epsilon_scaling(a, b, M, reg, scaling_base=0.5,
+                                              stopThr=1e-12)
+    Get = ot.bregman.sinkhorn_epsilon_scaling(
+        a, b, M, reg, scaling_base=0.5, truncate=1e-30, stopThr=1e-12)
+    np.testing.assert_allclose(Ges, Get, atol=1e-07)
+
+
+def test_sinkhorn2_grad():
+    # test gradients returned by sinkhorn2
+    n = 50
+    rng = np.random.RandomState(0)
+
+    xs = rng.randn(n, 2)
+    xt = rng.randn(n, 2) + 1
+    u = ot.utils.unif(n)
+
+    M = ot.dist(xs, xt)
+    reg = 1
+
+    G, log = ot.sinkhorn(u, u, M, reg, stopThr=1e-12, log=True)
+
+    w, (ga, gb, gM) = ot.sinkhorn2(u, u, M, reg, stopThr=1e-12,
+                                   return_grad=True)
+
+    # the loss is the regularized objective of the gradients
+    np.testing.assert_allclose(
+        w, np.sum(G * M) + reg * np.sum(G * np.log(G)), rtol=1e-5)
+    np.testing.assert_allclose(gM, G)
+    f = reg * np.log(log['u'])
+    np.testing.assert_allclose(ga, f - f.mean())
+
+    # finite differences along directions keeping the masses equal
+    eps = 1e-6
+    da = rng.randn(n)
+    da -= da.mean()
+    w_a, _ = ot.sinkhorn2(u + eps * da, u, M, reg, stopThr=1e-12,
+                          return_grad=True)
+    np.testing.assert_allclose((w_a - w) / eps, np.sum(ga * da), rtol=1e-3)
+    dM = rng.randn(n, n)
+    w_M, _ = ot.sinkhorn2(u, u, M + eps * dM, reg, stopThr=1e-12,
+                          return_grad=True)
+    np.testing.assert_allclose((w_M - w) / eps, np.sum(gM * dM), rtol=1e-3)
+
+    # same potentials with the stabilized version
+    w, (ga2, gb2, gM2), log = ot.sinkhorn2(
+        u, u, M, reg, method='sinkhorn_stabilized', stopThr=1e-12,
+        return_grad=True, log=True)
+    np.testing.assert_allclose(log['transport_loss'],
+                               ot.sinkhorn2(u, u, M, reg, stopThr=1e-12),
+                               rtol=1e-5)
+    np.testing.assert_allclose(ga, ga2, atol=1e-4)
+    np.testing.assert_allclose(gb, gb2, atol=1e-4)
+
+
+def test_sinkhorn2_multi():
+    # test sinkhorn2 with multiple targets (fused, chunked and lazy)
+    n = 50
+    nbb = 7
+    rng = np.random.RandomState(0)
+
+    x = rng.randn(n, 2)
+    u = ot.utils.unif(n)
+    B = rng.rand(n, nbb)
+    B /= B.sum(0, keepdims=True)
+
+    M = ot.dist(x, x)
+    M /= M.max()
+
+    w0 = np.array([ot.sinkhorn2(u, B[:, i], M, 1e-1, stopThr=1e-12)[0]
+                   for i in range(nbb)])
+
+    w, log = ot.sinkhorn2(u, B, M, 1e-1, stopThr=1e-12, log=True)
+    np.testing.assert_allclose(w, w0, rtol=1e-6)
+
+    # lazy couplings
+    for i, G in enumerate(log['couplings']):
+        np.testing.assert_allclose(np.sum(G * M), w[i])
+        np.testing.assert_allclose(G.sum(0), B[:, i], atol=1e-6)
+
+    # chunks of targets solved in parallel
+    w2, log2 = ot.sinkhorn2(u, B, M, 1e-1, stopThr=1e-12, batch_size=3,
+                            processes=2, log=True)
+    np.testing.assert_allclose(w2, w0, rtol=1e-6)
+    assert all(np.isscalar(e) for e in log2['err'])
+    assert log2['err'][-1] <= 1e-12
+
+
+def test_sinkhorn_control():
+    # test budgets on the sinkhorn solvers
+    n = 100
+    rng = np.random.RandomState(0)
+
+    x = rng.randn(n, 2)
+    u = ot.utils.unif(n)
+
+    M = ot.dist(x, x)
+    M /= M.max()
+
+    for method in ['sinkhorn', 'sinkhorn_stabilized']:
+        control = ot.utils.SolverControl(max_matvec=50)
+        G, log = ot.sinkhorn(u, u, M, 1e-2, method=method, stopThr=1e-12,
+                             log=True, control=control)
+        assert log['status'] == 2
+        assert log['n_matvec'] == 50
+        np.testing.assert_allclose(u, G.sum(1), atol=1e-5)
+
+        control = ot.utils.SolverControl(target_gap=1e-5)
+        G, log = ot.sinkhorn(u, u, M, 1e-2, method=method, stopThr=1e-12,
+                             log=True, control=control)
+        assert log['status'] == 3
+        assert log['gap'] <= 1e-5
+
+        control = ot.utils.SolverControl(max_time=0)
+        G, log = ot.sinkhorn(u, u, M, 1e-2, method=method, log=True,
+                             control=control)
+        assert log['status'] == 1
+
+    # budget shared by the chunks of targets solved in parallel
+    B = rng.rand(n, 6)
+    B /= B.sum(0, keepdims=True)
+    control = ot.utils.SolverControl(max_matvec=300)
+    w, log = ot.sinkhorn2(u, B, M, 1e-2, stopThr=1e-12, batch_size=2,
+                          processes=3, log=True, control=control)
+    assert log['status'] == 2
+    assert log['n_matvec'] >= 300
+    for i, G in enumerate(log['couplings']):
+        np.testing.assert_allclose(G.sum(1), u, atol=1e-5)
+
+
 def test_bary():
 
     n_bins = 100  # nb bins
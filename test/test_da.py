@@ -5,6 +5,7 @@
 # License: MIT License
 
 import numpy as np
+import pytest
 from numpy.testing.utils import assert_allclose, assert_equal
 
 import ot
@@ -84,6 +85,17 @@ def test_sinkhorn_lpl1_transport_class():
         otda_semi.coupling_[otda_semi.cost_ == otda_semi.limit_max])
     assert mass_semi == 0, "semisupervised mode not working"
 
+    # check everything runs well with log=True
+    otda = ot.da.SinkhornLpl1Transport(log=True)
+    otda.fit(Xs=Xs, ys=ys, Xt=Xt)
+    assert len(otda.log_['err']) <= otda.max_iter
+
+    # the majoration-minimization stops when the weights do not change
+    G, log = ot.da.sinkhorn_lpl1_mm(unif(ns), ys, unif(nt), otda.cost_, 1.,
+                                    numItermax=1000, stopThr=1e-3, log=True)
+    assert len(log['err']) < 1000
+    assert log['err'][-1] < 1e-3
+
 
 def test_sinkhorn_l1l2_transport_class():
     """test_sinkhorn_transport
@@ -166,6 +178,38 @@ def test_sinkhorn_l1l2_transport_class():
     assert len(otda.log_.keys()) != 0
 
 
+def test_sinkhorn_l1l2_gl():
+
+    ns = 50
+    nt = 60
+
+    Xs, ys = make_data_classif('3gauss', ns)
+    Xt, yt = make_data_classif('3gauss2', nt)
+    a, b = unif(ns), unif(nt)
+    M = ot.dist(Xs, Xt)
+    M /= M.max()
+
+    G = ot.da.sinkhorn_l1l2_gl(a, ys, b, M, 1e-1, eta=1e-1)
+
+    # same solution as the group lasso written with masks
+    def f(G):
+        return sum(np.linalg.norm(G[ys == lab, i])
+                   for i in range(G.shape[1]) for lab in np.unique(ys))
+
+    def df(G):
+        W = np.zeros(G.shape)
+        for i in range(G.shape[1]):
+            for lab in np.unique(ys):
+                temp = G[ys == lab, i]
+                n = np.linalg.norm(temp)
+                if n:
+                    W[ys == lab, i] = temp / n
+        return W
+
+    G0 = ot.optim.gcg(a, b, M, 1e-1, 1e-1, f, df)
+    assert_allclose(G, G0, atol=1e-12)
+
+
 def test_sinkhorn_transport_class():
     """test_sinkhorn_transport
     """
@@ -245,6 +289,94 @@ def test_sinkhorn_transport_class():
     assert len(otda.log_.keys()) != 0
 
 
+def test_transform_nn_index():
+
+    ns = 150
+    nt = 200
+
+    Xs, ys = make_data_classif('3gauss', ns)
+    Xt, yt = make_data_classif('3gauss2', nt)
+    Xs_new, _ = make_data_classif('3gauss', ns + 1)
+    Xt_new, _ = make_data_classif('3gauss2', nt + 1)
+
+    otda = ot.da.EMDTransport().fit(Xs=Xs, Xt=Xt)
+    transp_Xs = otda.transform(Xs=Xs)
+    transp_Xs_new = otda.transform(Xs=Xs_new)
+    transp_Xt_new = otda.inverse_transform(Xt=Xt_new)
+
+    # the cached mapping is updated with the coupling
+    otda.fit(Xs=Xs, Xt=Xt[:nt // 2])
+    assert_equal(otda.transform(Xs=Xs).shape, Xs.shape)
+    otda.fit(Xs=Xs, Xt=Xt)
+    assert_allclose(otda.transform(Xs=Xs), transp_Xs)
+
+    class BruteIndex(object):
+
+        def __init__(self, X):
+            self.X = X
+
+        def query(self, X):
+            D = ot.dist(X, self.X)
+            return np.min(D, 1), np.argmin(D, 1)
+
+    for nn_index in ['brute', BruteIndex]:
+        otda.nn_index = nn_index
+        assert_allclose(otda.transform(Xs=Xs_new), transp_Xs_new)
+        assert_allclose(otda.inverse_transform(Xt=Xt_new), transp_Xt_new)
+
+    otda.nn_index = 'unknown'
+    with pytest.raises(ValueError):
+        otda.transform(Xs=Xs_new)
+
+
+def test_minibatch_transport():
+
+    ns = 150
+    nt = 200
+
+    Xs, ys = make_data_classif('3gauss', ns)
+    Xt, yt = make_data_classif('3gauss2', nt)
+
+    for otda in [ot.da.EMDTransport(), ot.da.SinkhornTransport(reg_e=1)]:
+        otda.fit(Xs=Xs, Xt=Xt, batch_size=50, n_epochs=2)
+        assert otda.coupling_ is None
+
+        # in sample and out of sample transforms
+        transp_Xs = otda.transform(Xs=Xs)
+        assert_equal(transp_Xs.shape, Xs.shape)
+        assert_allclose(np.mean(transp_Xs, 0), np.mean(Xt, 0), atol=0.5)
+        assert_equal(otda.transform(Xs=Xs[:10] + 1e-3).shape, (10, 2))
+        transp_Xt = otda.inverse_transform(Xt=Xt)
+        assert_equal(transp_Xt.shape, Xt.shape)
+        assert_allclose(np.mean(transp_Xt, 0), np.mean(Xs, 0), atol=0.5)
+
+        # same minibatches with the same seed
+        transp_Xs = otda.fit(Xs=Xs, Xt=Xt, batch_size=50,
+                             random_state=0).transform(Xs=Xs)
+        assert_allclose(otda.fit(Xs=Xs, Xt=Xt, batch_size=50,
+                                 random_state=0).transform(Xs=Xs), transp_Xs)
+
+    # one chunk is the same as a full fit on the chunk
+    otda = ot.da.EMDTransport().fit(Xs=Xs[:50], Xt=Xt[:60])
+    otda_stream = ot.da.EMDTransport()
+    otda_stream.partial_fit(Xs=Xs[:50], Xt=Xt[:60])
+    assert_allclose(otda_stream.transform(Xs=Xs[:50]),
+                    otda.transform(Xs=Xs[:50]))
+    assert_allclose(otda_stream.inverse_transform(Xt=Xt[:60]),
+                    otda.inverse_transform(Xt=Xt[:60]))
+
+    # the chunks are added to the training samples
+    otda_stream.partial_fit(Xs=Xs[50:], Xt=Xt[60:])
+    assert_equal(otda_stream.xs_, Xs)
+    assert_equal(otda_stream.xt_, Xt)
+    assert_equal(otda_stream.transform(Xs=Xs).shape, Xs.shape)
+
+    # a full fit restarts the stream
+    otda_stream.fit(Xs=Xs, Xt=Xt)
+    otda_stream.partial_fit(Xs=Xs[:50], Xt=Xt[:60])
+    assert_equal(otda_stream.xs_.shape, (50, 2))
+
+
 def test_emd_transport_class():
     """test_sinkhorn_transport
     """
@@ -321,6 +453,15 @@ def test_emd_transport_class():
     assert_allclose(mass_semi, np.zeros_like(mass_semi),
                     rtol=1e-2, atol=1e-2)
 
+    # only the labeled pairs of samples with different labels are forbidden,
+    # unlabeled target samples keep their cost
+    yt_semi = yt.copy()
+    yt_semi[::2] = -1
+    otda_semi.fit(Xs=Xs, ys=ys, Xt=Xt, yt=yt_semi)
+    labeled = yt_semi[None, :] != -1
+    forbidden = (ys[:, None] != yt_semi[None, :]) & labeled
+    assert_equal(otda_semi.cost_ == otda_semi.limit_max, forbidden)
+
 
 def test_mapping_transport_class():
     """test_mapping_transport
@@ -443,6 +584,38 @@ def test_mapping_transport_class():
     otda.fit(Xs=Xs, Xt=Xt)
     assert len(otda.log_.keys()) != 0
 
+    # kernel approximations
+    otda = ot.da.MappingTransport(kernel="gaussian")
+    transp_Xs_new = otda.fit(Xs=Xs, Xt=Xt).transform(Xs_new)
+    for kernel_approx, bias in [('nystroem', False), ('rff', True)]:
+        otda_approx = ot.da.MappingTransport(
+            kernel="gaussian", bias=bias, kernel_approx=kernel_approx,
+            n_components=ns)
+        otda_approx.fit(Xs=Xs, Xt=Xt)
+        assert otda_approx.mapping_.shape[0] <= ns + bias
+        assert_equal(otda_approx.mapping_.shape[1], Xt.shape[1])
+        assert_equal(otda_approx.transform(Xs_new).shape, Xs_new.shape)
+
+        # same features with the same seed
+        phi1 = ot.da.kernel_approximation(Xs, kernel_approx, n_components=10,
+                                          random_state=0)
+        phi2 = ot.da.kernel_approximation(Xs, kernel_approx, n_components=10,
+                                          random_state=0)
+        assert_allclose(phi1(Xs_new), phi2(Xs_new))
+
+    # the nystroem features on all the samples give the exact kernel
+    otda_approx = ot.da.MappingTransport(
+        kernel="gaussian", kernel_approx='nystroem', n_components=ns)
+    otda_approx.fit(Xs=Xs, Xt=Xt)
+    assert_allclose(otda_approx.transform(Xs_new), transp_Xs_new,
+                    rtol=1e-3, atol=1e-3)
+
+    assert ot.da.MappingTransport().fit(Xs=Xs, Xt=Xt).features_ is None
+
+    with pytest.raises(ValueError):
+        ot.da.MappingTransport(kernel="gaussian", kernel_approx='unknown'
+                               ).fit(Xs=Xs, Xt=Xt)
+
 
 def test_linear_mapping():
 
@@ -77,3 +77,30 @@ def test_gpu_sinkhorn_lpl1():
         describe_res(G2)
 
         np.testing.assert_allclose(G1, G2, rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.skipif(nogpu, reason="No GPU available")
+def test_gpu_sinkhorn_lpl1_mm():
+
+    rng = np.random.RandomState(0)
+
+    ns, nt = 50, 60
+    xs = rng.rand(ns, 10)
+    labels_a = rng.randint(3, size=ns)
+    xt = rng.rand(nt, 10)
+    a, b = ot.unif(ns), ot.unif(nt)
+    M = ot.dist(xs, xt)
+    M_GPU = ot.gpu.da.cudamat.CUDAMatrix(M)
+
+    # several outer iterations, stopped on the variation of the weights
+    G1, log1 = ot.da.sinkhorn_lpl1_mm(a, labels_a, b, M, 1., eta=1.,
+                                      numItermax=5, log=True)
+    G2, log2 = ot.gpu.da.sinkhorn_lpl1_mm(a, labels_a, b, M_GPU, 1., eta=1.,
+                                          numItermax=5, log=True)
+    assert len(log2['err']) > 1
+    np.testing.assert_allclose(G1, G2, rtol=1e-3, atol=1e-3)
+
+    # a large threshold stops after the first iteration
+    G2, log2 = ot.gpu.da.sinkhorn_lpl1_mm(a, labels_a, b, M_GPU, 1., eta=1.,
+                                          numItermax=5, log=True, stopThr=10.)
+    assert len(log2['err']) == 1
@@ -6,7 +6,9 @@
 # License: MIT License
 
 import numpy as np
+import scipy.sparse as sp
 import ot
+import pytest
 
 
 def test_gromov():
@@ -117,6 +119,20 @@ def test_gromov_barycenter():
                                        max_iter=100, tol=1e-3)
     np.testing.assert_allclose(Cb2.shape, (n_samples, n_samples))
 
+    # the problems solved by a pool of threads or sequentially
+    init_C = ot.dist(Xs[:n_samples], Xs[:n_samples])
+    init_C /= init_C.max()
+    Cb, log = ot.gromov.gromov_barycenters(
+        n_samples, [C1, C2], [ot.unif(ns), ot.unif(nt)], ot.unif(n_samples),
+        [.5, .5], 'square_loss', max_iter=100, tol=1e-3, init_C=init_C,
+        processes=2, log=True)
+    Cb1 = ot.gromov.gromov_barycenters(
+        n_samples, [C1, C2], [ot.unif(ns), ot.unif(nt)], ot.unif(n_samples),
+        [.5, .5], 'square_loss', max_iter=100, tol=1e-3, init_C=init_C,
+        processes=1)
+    np.testing.assert_allclose(Cb, Cb1)
+    assert len(log['err']) > 0
+
 
 def test_gromov_entropic_barycenter():
 
@@ -143,3 +159,456 @@ def test_gromov_entropic_barycenter():
                                                 'kl_loss', 2e-3,
                                                 max_iter=100, tol=1e-3)
     np.testing.assert_allclose(Cb2.shape, (n_samples, n_samples))
+
+
+def test_gromov_linesearch():
+    n_samples = 30  # nb samples
+
+    mu_s = np.array([0, 0])
+    cov_s = np.array([[1, 0], [0, 1]])
+
+    xs = ot.datasets.make_2D_samples_gauss(n_samples, mu_s, cov_s)
+    xt = ot.datasets.make_2D_samples_gauss(n_samples, mu_s, cov_s)
+
+    p = ot.unif(n_samples)
+    q = ot.unif(n_samples)
+
+    C1 = ot.dist(xs, xs)
+    C2 = ot.dist(xt, xt)
+
+    C1 /= C1.max()
+    C2 /= C2.max()
+
+    constC, hC1, hC2 = ot.gromov.init_matrix(C1, C2, None, p, q,
+                                             'square_loss')
+    G = np.outer(p, q)
+    deltaG = ot.emd(p, q, ot.gromov.gwggrad(constC, hC1, hC2, G)) - G
+    cost_G = ot.gromov.gwloss(constC, hC1, hC2, G)
+
+    alpha, fc, cost = ot.gromov.solve_gromov_linesearch(
+        G, deltaG, cost_G, constC, hC1, hC2)
+
+    # exact cost at the step and optimality among a grid of steps
+    np.testing.assert_allclose(
+        cost, ot.gromov.gwloss(constC, hC1, hC2, G + alpha * deltaG))
+    costs = [ot.gromov.gwloss(constC, hC1, hC2, G + t * deltaG)
+             for t in np.linspace(0, 1, 21)]
+    assert cost <= min(costs) + 1e-12
+
+    # constC given by its two vectors or as a dense matrix
+    constC_dense = constC[0][:, None] + constC[1][None, :]
+    np.testing.assert_allclose(
+        ot.gromov.gwloss(constC_dense, hC1, hC2, G), cost_G)
+    np.testing.assert_allclose(
+        ot.gromov.tensor_product(constC_dense, hC1, hC2, G),
+        ot.gromov.tensor_product(constC, hC1, hC2, G))
+    np.testing.assert_allclose(ot.gromov.solve_gromov_linesearch(
+        G, deltaG, cost_G, constC_dense, hC1, hC2), (alpha, fc, cost))
+
+    for loss_fun in ['square_loss', 'kl_loss']:
+        gw, log = ot.gromov.gromov_wasserstein2(C1, C2, p, q, loss_fun,
+                                                log=True)
+        gw_armijo = ot.gromov.gromov_wasserstein2(C1, C2, p, q, loss_fun,
+                                                  armijo=True)
+
+        # the loss tracked by the line search is the loss of the coupling
+        np.testing.assert_allclose(log['loss'][-1], gw)
+        np.testing.assert_allclose(gw, gw_armijo, atol=1e-2, rtol=1e-1)
+
+        G = log['T']
+        np.testing.assert_allclose(p, G.sum(1), atol=1e-04)
+        np.testing.assert_allclose(q, G.sum(0), atol=1e-04)
+
+
+def test_gromov_factors():
+    n_samples = 30  # nb samples
+
+    mu_s = np.array([0, 0])
+    cov_s = np.array([[1, 0], [0, 1]])
+
+    xs = ot.datasets.make_2D_samples_gauss(n_samples, mu_s, cov_s)
+    xt = ot.datasets.make_2D_samples_gauss(n_samples, mu_s, cov_s) * 2
+
+    p = ot.unif(n_samples)
+    q = ot.unif(n_samples)
+
+    C1 = ot.dist(xs, xs)
+    C2 = ot.dist(xt, xt)
+    F1 = ot.gromov.sqeuclidean_factors(xs)
+    F2 = ot.gromov.sqeuclidean_factors(xt)
+
+    np.testing.assert_allclose(F1[0].dot(F1[1].T), C1, atol=1e-10)
+
+    # same loss and gradient as with the dense matrices
+    T = np.random.rand(n_samples, n_samples)
+    constC, hC1, hC2 = ot.gromov.init_matrix(C1, C2, None, p, q)
+    constCf, hC1f, hC2f = ot.gromov.init_matrix(F1, C2, None, p, q)
+    np.testing.assert_allclose(constCf, constC)
+    np.testing.assert_allclose(ot.gromov.gwggrad(constCf, hC1f, hC2f, T),
+                               ot.gromov.gwggrad(constC, hC1, hC2, T))
+
+    G = ot.gromov.gromov_wasserstein(C1, C2, p, q, 'square_loss')
+    Gf = ot.gromov.gromov_wasserstein(F1, F2, p, q, 'square_loss')
+    np.testing.assert_allclose(Gf, G, atol=1e-6)
+
+    G = ot.gromov.entropic_gromov_wasserstein(
+        C1, C2, p, q, 'square_loss', epsilon=1e-1)
+    Gf = ot.gromov.entropic_gromov_wasserstein(
+        F1, F2, p, q, 'square_loss', epsilon=1e-1)
+    np.testing.assert_allclose(Gf, G, atol=1e-6)
+
+    with pytest.raises(ValueError):
+        ot.gromov.gromov_wasserstein(F1, F2, p, q, 'kl_loss')
+
+
+def test_sampled_gromov():
+    n_samples = 30  # nb samples
+
+    mu_s = np.array([0, 0])
+    cov_s = np.array([[1, 0], [0, 1]])
+
+    xs = ot.datasets.make_2D_samples_gauss(n_samples, mu_s, cov_s)
+
+    xt = xs[::-1].copy()
+
+    p = ot.unif(n_samples)
+    q = ot.unif(n_samples)
+
+    C1 = ot.dist(xs, xs)
+    C2 = ot.dist(xt, xt)
+
+    C1 /= C1.max()
+    C2 /= C2.max()
+
+    for loss_fun in ['square_loss', 'kl_loss']:
+        G, log = ot.gromov.sampled_gromov_wasserstein(
+            C1, C2, p, q, loss_fun, epsilon=1e-1, max_iter=100, log=True,
+            random_state=42)
+
+        # check constraints
+        np.testing.assert_allclose(p, G.sum(1), atol=1e-04)
+        np.testing.assert_allclose(q, G.sum(0), atol=1e-04)
+
+    # the reversed samples are recovered
+    constC, hC1, hC2 = ot.gromov.init_matrix(C1, C2, None, p, q)
+    G0 = ot.gromov.gromov_wasserstein(C1, C2, p, q, 'square_loss')
+    G = ot.gromov.sampled_gromov_wasserstein(
+        C1, C2, p, q, 'square_loss', epsilon=0, max_iter=50,
+        random_state=42)
+    np.testing.assert_allclose(ot.gromov.gwloss(constC, hC1, hC2, G),
+                               ot.gromov.gwloss(constC, hC1, hC2, G0),
+                               atol=1e-2)
+
+    # same iterates with sparse and callable cost matrices
+    G1 = ot.gromov.sampled_gromov_wasserstein(
+        sp.csr_matrix(C1), lambda index: C2[index], p, q, 'square_loss',
+        epsilon=0, max_iter=50, random_state=42)
+    np.testing.assert_allclose(G1, G)
+
+    # estimated loss, averaged over the last iterations
+    G, log = ot.gromov.sampled_gromov_wasserstein(
+        C1, C2, p, q, 'square_loss', epsilon=0, max_iter=50, log=True,
+        random_state=42)
+    np.testing.assert_allclose(log['gw_dist_estimated'],
+                               ot.gromov.gwloss(constC, hC1, hC2, G),
+                               atol=1e-2)
+
+    G, log = ot.gromov.sampled_gromov_wasserstein(
+        C1, C2, p, q, 'square_loss', epsilon=0, max_iter=50, tol=np.inf,
+        log=True, random_state=42)
+    assert len(log['err']) == 1
+
+    G, log = ot.gromov.sampled_gromov_wasserstein(
+        C1, C2, p, q, 'square_loss', max_iter=0, log=True, random_state=42)
+    np.testing.assert_allclose(G, np.outer(p, q))
+    assert np.isfinite(log['gw_dist_estimated'])
+
+
+def test_fgw():
+    n_samples = 50  # nb samples
+
+    mu_s = np.array([0, 0])
+    cov_s = np.array([[1, 0], [0, 1]])
+
+    xs = ot.datasets.make_2D_samples_gauss(n_samples, mu_s, cov_s)
+
+    xt = xs[::-1].copy()
+
+    ys = np.random.randn(xs.shape[0], 2)
+    yt = ys[::-1].copy()
+
+    p = ot.unif(n_samples)
+    q = ot.unif(n_samples)
+
+    C1 = ot.dist(xs, xs)
+    C2 = ot.dist(xt, xt)
+
+    C1 /= C1.max()
+    C2 /= C2.max()
+
+    M = ot.dist(ys, yt)
+    M /= M.max()
+
+    G, log = ot.gromov.fused_gromov_wasserstein(M, C1, C2, p, q, 'square_loss',
+                                                alpha=0.5, log=True)
+
+    # check constratints
+    np.testing.assert_allclose(
+        p, G.sum(1), atol=1e-04)  # cf convergence fgw
+    np.testing.assert_allclose(
+        q, G.sum(0), atol=1e-04)  # cf convergence fgw
+
+    Id = (1 / (1.0 * n_samples)) * np.eye(n_samples, n_samples)
+
+    np.testing.assert_allclose(
+        G, np.flipud(Id), atol=1e-04)  # cf convergence gromov
+
+    fgw, log = ot.gromov.fused_gromov_wasserstein2(M, C1, C2, p, q,
+                                                   'square_loss', alpha=0.5,
+                                                   log=True)
+
+    G = log['T']
+
+    np.testing.assert_allclose(fgw, 0, atol=1e-1, rtol=1e-1)
+
+    # alpha=1 is the GW problem
+    np.testing.assert_allclose(
+        ot.gromov.fused_gromov_wasserstein2(M, C1, C2, p, q, alpha=1),
+        ot.gromov.gromov_wasserstein2(C1, C2, p, q, 'square_loss'),
+        atol=1e-10)
+
+    G, log = ot.gromov.entropic_fused_gromov_wasserstein(
+        M, C1, C2, p, q, 'square_loss', epsilon=5e-4, alpha=0.5, log=True)
+
+    # check constratints
+    np.testing.assert_allclose(
+        p, G.sum(1), atol=1e-04)  # cf convergence fgw
+    np.testing.assert_allclose(
+        q, G.sum(0), atol=1e-04)  # cf convergence fgw
+
+    fgw = ot.gromov.entropic_fused_gromov_wasserstein2(
+        M, C1, C2, p, q, 'square_loss', epsilon=5e-4, alpha=0.5)
+    np.testing.assert_allclose(fgw, log['fgw_dist'])
+    np.testing.assert_allclose(fgw, 0, atol=1e-1, rtol=1e-1)
+
+
+def test_fgw_barycenter():
+    np.random.seed(42)
+
+    ns = 50
+    nt = 60
+
+    Xs, ys = ot.datasets.make_data_classif('3gauss', ns)
+    Xt, yt = ot.datasets.make_data_classif('3gauss2', nt)
+
+    ys = ys.reshape(-1, 1)
+    yt = yt.reshape(-1, 1)
+
+    C1 = ot.dist(Xs)
+    C2 = ot.dist(Xt)
+
+    n_samples = 3
+    X, C = ot.gromov.fgw_barycenters(n_samples, [ys, yt], [C1, C2],
+                                     [ot.unif(ns), ot.unif(nt)], [.5, .5],
+                                     0.5, fixed_structure=False,
+                                     fixed_features=False,
+                                     p=ot.unif(n_samples),
+                                     loss_fun='square_loss', max_iter=100,
+                                     tol=1e-3)
+    np.testing.assert_allclose(C.shape, (n_samples, n_samples))
+    np.testing.assert_allclose(X.shape, (n_samples, ys.shape[1]))
+
+    xalea = np.random.randn(n_samples, 2)
+    init_C = ot.dist(xalea, xalea)
+
+    X, C, log = ot.gromov.fgw_barycenters(
+        n_samples, [ys, yt], [C1, C2], ps=[ot.unif(ns), ot.unif(nt)],
+        lambdas=[.5, .5], alpha=0.5, fixed_structure=True, init_C=init_C,
+        fixed_features=False, p=ot.unif(n_samples), loss_fun='square_loss',
+        max_iter=100, tol=1e-3, log=True)
+    np.testing.assert_allclose(C, init_C)
+    np.testing.assert_allclose(X.shape, (n_samples, ys.shape[1]))
+    assert len(log['T']) == 2
+
+    with pytest.raises(ValueError):
+        ot.gromov.fgw_barycenters(n_samples, [ys, yt], [C1, C2],
+                                  [ot.unif(ns), ot.unif(nt)], [.5, .5], 0.5,
+                                  fixed_features=True)
+
+
+def test_entropic_gromov_solvers():
+    n_samples = 50  # nb samples
+
+    mu_s = np.array([0, 0])
+    cov_s = np.array([[1, 0], [0, 1]])
+
+    xs = ot.datasets.make_2D_samples_gauss(n_samples, mu_s, cov_s)
+
+    xt = xs[::-1].copy()
+
+    p = ot.unif(n_samples)
+    q = ot.unif(n_samples)
+
+    C1 = ot.dist(xs, xs)
+    C2 = ot.dist(xt, xt)
+
+    C1 /= C1.max()
+    C2 /= C2.max()
+
+    for solver in ['PGD', 'PPA']:
+        G, log = ot.gromov.entropic_gromov_wasserstein(
+            C1, C2, p, q, 'square_loss', epsilon=1e-2, solver=solver,
+            log=True)
+
+        # check constraints
+        np.testing.assert_allclose(p, G.sum(1), atol=1e-04)
+        np.testing.assert_allclose(q, G.sum(0), atol=1e-04)
+
+        # one error per iteration and the inner iterations are counted
+        assert len(log['err']) == log['niter']
+        assert log['n_inner_iter'] >= log['niter']
+
+    # the proximal point iterations recover the permutation with a large
+    # epsilon
+    gw = ot.gromov.entropic_gromov_wasserstein2(
+        C1, C2, p, q, 'square_loss', epsilon=1e-2, solver='PPA')
+    np.testing.assert_allclose(gw, 0, atol=1e-3)
+
+    with pytest.raises(ValueError):
+        ot.gromov.entropic_gromov_wasserstein(C1, C2, p, q, 'square_loss',
+                                              epsilon=1e-2, solver='foo')
+
+
+def test_gromov_sparse():
+    rng = np.random.RandomState(0)
+    n_samples = 30  # nb nodes
+
+    # random symmetric weighted graphs
+    A1 = sp.random(n_samples, n_samples, density=0.2, random_state=rng)
+    A2 = sp.random(n_samples, n_samples, density=0.2, random_state=rng)
+    C1 = sp.csr_matrix(A1 + A1.T)
+    C2 = sp.csr_matrix(A2 + A2.T)
+
+    p = ot.unif(n_samples)
+    q = ot.unif(n_samples)
+
+    for loss_fun in ['square_loss', 'kl_loss']:
+        constC, hC1, hC2 = ot.gromov.init_matrix(C1, C2, None, p, q,
+                                                 loss_fun)
+        constCd, hC1d, hC2d = ot.gromov.init_matrix(C1.toarray(),
+                                                    C2.toarray(), None, p, q,
+                                                    loss_fun)
+        assert sp.issparse(hC1)
+        np.testing.assert_allclose(constC, constCd)
+
+        T = np.outer(p, q)
+        np.testing.assert_allclose(ot.gromov.gwggrad(constC, hC1, hC2, T),
+                                   ot.gromov.gwggrad(constCd, hC1d, hC2d, T))
+
+    G = ot.gromov.gromov_wasserstein(C1, C2, p, q, 'square_loss')
+    Gd = ot.gromov.gromov_wasserstein(C1.toarray(), C2.toarray(), p, q,
+                                      'square_loss')
+    np.testing.assert_allclose(G, Gd, atol=1e-6)
+
+    G = ot.gromov.entropic_gromov_wasserstein(C1, C2, p, q, 'square_loss',
+                                              epsilon=1e-1)
+    Gd = ot.gromov.entropic_gromov_wasserstein(C1.toarray(), C2.toarray(),
+                                               p, q, 'square_loss',
+                                               epsilon=1e-1)
+    np.testing.assert_allclose(G, Gd, atol=1e-6)
+
+
+def test_gromov_pairwise(tmpdir):
+    np.random.seed(0)
+    Cs, ps = [], []
+    for n in [10, 12, 15, 8]:
+        x = np.random.randn(n, 2)
+        C = ot.dist(x, x)
+        Cs.append(C / C.max())
+        ps.append(ot.unif(n))
+
+    D = ot.gromov.gromov_wasserstein_pairwise(Cs, ps, processes=1)
+    np.testing.assert_allclose(D, D.T)
+    np.testing.assert_allclose(np.diag(D), 0)
+    for i, j in [(0, 1), (1, 3), (2, 3)]:
+        gw = ot.gromov.gromov_wasserstein2(Cs[i], Cs[j], ps[i], ps[j],
+                                           'square_loss')
+        np.testing.assert_allclose(D[i, j], gw)
+
+    # threads and a partially filled file on disk
+    filename = str(tmpdir.join('gw.npy'))
+    D2 = D.copy()
+    D2[0, 2] = D2[2, 0] = D2[1, 3] = D2[3, 1] = np.nan
+    D2[0, 1] = D2[1, 0] = -1.  # kept as is when resuming
+    np.save(filename, D2)
+    D3 = ot.gromov.gromov_wasserstein_pairwise(Cs, ps, processes=2,
+                                               filename=filename)
+    np.testing.assert_allclose(D3[2:], D[2:])
+    np.testing.assert_allclose(D3[0, 1], -1.)
+    np.testing.assert_allclose(np.load(filename), D3)
+
+    # new file
+    filename = str(tmpdir.join('gw_new.npy'))
+    D4 = ot.gromov.gromov_wasserstein_pairwise(Cs, ps, filename=filename)
+    np.testing.assert_allclose(D4, D)
+
+    with pytest.raises(ValueError):
+        ot.gromov.gromov_wasserstein_pairwise(Cs[:3], ps[:3],
+                                              filename=filename)
+
+    # the kl loss is not symmetric, both orders are solved
+    Cs = [C + 0.1 for C in Cs[:3]]
+    D = ot.gromov.gromov_wasserstein_pairwise(Cs, ps[:3], loss_fun='kl_loss',
+                                              processes=1)
+    for i, j in [(0, 1), (1, 0), (2, 1)]:
+        gw = ot.gromov.gromov_wasserstein2(Cs[i], Cs[j], ps[i], ps[j],
+                                           'kl_loss')
+        np.testing.assert_allclose(D[i, j], gw)
+    assert not np.allclose(D, D.T)
+
+
+def test_gromov_init():
+    np.random.seed(0)
+    n, m = 20, 15
+    xs = np.random.randn(n, 2)
+    xt = np.random.randn(m, 2)
+    C1 = ot.dist(xs, xs)
+    C2 = ot.dist(xt, xt)
+    p = ot.unif(n)
+    q = ot.unif(m)
+
+    for method in ['product', 'sorted', 'spectral']:
+        T = ot.gromov.init_coupling(C1, C2, p, q, method)
+        np.testing.assert_allclose(T.sum(1), p)
+        np.testing.assert_allclose(T.sum(0), q)
+        Ts = ot.gromov.init_coupling(sp.csr_matrix(C1), sp.csr_matrix(C2),
+                                     p, q, method)
+        np.testing.assert_allclose(Ts, T)
+        Tf = ot.gromov.init_coupling(ot.gromov.sqeuclidean_factors(xs),
+                                     ot.gromov.sqeuclidean_factors(xt),
+                                     p, q, method)
+        np.testing.assert_allclose(Tf, T)
+
+    with pytest.raises(ValueError):
+        ot.gromov.init_coupling(C1, C2, p, q, 'unknown')
+
+    # the sorted and spectral couplings recover a permutation of the space
+    perm = np.random.permutation(n)
+    C3 = C1[perm][:, perm]
+    for method in ['sorted', 'spectral']:
+        T, log = ot.gromov.gromov_wasserstein(C1, C3, p, p, 'square_loss',
+                                              G0=method, log=True)
+        np.testing.assert_allclose(T[perm, np.arange(n)], p)
+        np.testing.assert_allclose(log['gw_dist'], 0, atol=1e-10)
+
+    G0 = ot.gromov.init_coupling(C1, C2, p, q, 'product')
+    T, log = ot.gromov.gromov_wasserstein_multistart(
+        C1, C2, p, q, 'square_loss', inits=['sorted', 'spectral', G0],
+        processes=2, log=True)
+    assert len(log['n_iter']) == 3
+    np.testing.assert_allclose(log['gw_dist'], min(log['gw_dists']))
+    np.testing.assert_allclose(log['gw_dists'][2],
+                               ot.gromov.gromov_wasserstein2(
+                                   C1, C2, p, q, 'square_loss'))
+    np.testing.assert_allclose(T.sum(1), p)
+    np.testing.assert_allclose(T.sum(0), q)
@@ -6,6 +6,7 @@
 
 import numpy as np
 import ot
+import pytest
 
 
 def test_conditional_gradient():
@@ -65,3 +66,238 @@ def test_generalized_conditional_gradient():
 
     np.testing.assert_allclose(a, G.sum(1), atol=1e-05)
     np.testing.assert_allclose(b, G.sum(0), atol=1e-05)
+
+
+def test_conditional_gradient_control():
+
+    n_bins = 100  # nb bins
+    np.random.seed(0)
+    # bin positions
+    x = np.arange(n_bins, dtype=np.float64)
+
+    # Gaussian distributions
+    a = ot.datasets.make_1D_gauss(n_bins, m=20, s=5)  # m= mean, s= std
+    b = ot.datasets.make_1D_gauss(n_bins, m=60, s=10)
+
+    # loss matrix
+    M = ot.dist(x.reshape((n_bins, 1)), x.reshape((n_bins, 1)))
+    M /= M.max()
+
+    def f(G):
+        return 0.5 * np.sum(G**2)
+
+    def df(G):
+        return G
+
+    reg = 1e-1
+
+    control = ot.utils.SolverControl(target_gap=1e-4)
+    G, log = ot.optim.cg(a, b, M, reg, f, df, stopThr=0, log=True,
+                         control=control)
+
+    assert log['status'] == 3
+    assert log['gap'] <= 1e-4
+    np.testing.assert_allclose(a, G.sum(1))
+    np.testing.assert_allclose(b, G.sum(0))
+
+    control = ot.utils.SolverControl(max_matvec=10)
+    G, log = ot.optim.cg(a, b, M, reg, f, df, stopThr=0, log=True,
+                         control=control)
+    assert log['status'] == 2
+    assert len(log['loss']) < 10
+
+
+def test_solve_1d_linesearch_quad():
+    # convex with minimum inside and outside [0, 1]
+    np.testing.assert_allclose(ot.optim.solve_1d_linesearch_quad(1, -1, 0),
+                               0.5)
+    np.testing.assert_allclose(ot.optim.solve_1d_linesearch_quad(1, 5, 0), 0)
+    np.testing.assert_allclose(ot.optim.solve_1d_linesearch_quad(1, -5, 0), 1)
+
+    # concave: one of the bounds
+    np.testing.assert_allclose(ot.optim.solve_1d_linesearch_quad(-1, 0.5, 0),
+                               1)
+    np.testing.assert_allclose(ot.optim.solve_1d_linesearch_quad(-1, 2, 0), 0)
+
+
+def test_conditional_gradient_variants():
+
+    n_bins = 50  # nb bins
+    np.random.seed(0)
+    # bin positions
+    x = np.arange(n_bins, dtype=np.float64)
+
+    # Gaussian distributions
+    a = ot.datasets.make_1D_gauss(n_bins, m=20, s=5)  # m= mean, s= std
+    b = ot.datasets.make_1D_gauss(n_bins, m=30, s=10)
+
+    # loss matrix
+    M = ot.dist(x.reshape((n_bins, 1)), x.reshape((n_bins, 1)))
+    M /= M.max()
+
+    def f(G):
+        return 0.5 * np.sum(G**2)
+
+    def df(G):
+        return G
+
+    reg = 1e-1
+
+    G, log = ot.optim.cg(a, b, M, reg, f, df, numItermax=500, stopThr=0,
+                         log=True)
+
+    for variant in ['away', 'pairwise']:
+        Gv, logv = ot.optim.cg(a, b, M, reg, f, df, numItermax=100,
+                               stopThr=0, log=True, variant=variant)
+        np.testing.assert_allclose(a, Gv.sum(1))
+        np.testing.assert_allclose(b, Gv.sum(0))
+        # better than 5 times more vanilla conditional gradient iterations
+        assert logv['loss'][-1] <= log['loss'][-1]
+        assert len(logv['n_active']) == len(logv['loss'])
+
+    with pytest.raises(ValueError):
+        ot.optim.cg(a, b, M, reg, f, df, variant='unknown')
+
+    # the dense starting point is kept out of the sparse storage
+    active = ot.optim._ActiveSet(np.outer(a, b))
+    Gc = ot.emd(a, b, M)
+    active.weights *= 0.5
+    active.add(Gc, 0.5)
+    assert active.nnz == np.count_nonzero(Gc)
+    np.testing.assert_allclose(active.costs(M),
+                               [np.sum(np.outer(a, b) * M), np.sum(Gc * M)])
+    X = Gc.copy()
+    active.subtract(X, 1)
+    np.testing.assert_allclose(X, 0)
+    active.drop(0)
+    assert len(active) == 1
+    assert active.G0 is None
+
+
+def test_line_search_strategies():
+
+    n_bins = 50  # nb bins
+    np.random.seed(0)
+    # bin positions
+    x = np.arange(n_bins, dtype=np.float64)
+
+    # Gaussian distributions
+    a = ot.datasets.make_1D_gauss(n_bins, m=20, s=5)  # m= mean, s= std
+    b = ot.datasets.make_1D_gauss(n_bins, m=30, s=10)
+
+    # loss matrix
+    M = ot.dist(x.reshape((n_bins, 1)), x.reshape((n_bins, 1)))
+    M /= M.max()
+
+    def f(G):
+        return 0.5 * np.sum(G**2)
+
+    def df(G):
+        return G
+
+    reg = 1e-1
+
+    # the default Armijo strategy gives the same iterates as the function
+    G0, log0 = ot.optim.cg(a, b, M, reg, f, df, log=True,
+                           line_search=ot.optim.line_search_armijo)
+    G, log = ot.optim.cg(a, b, M, reg, f, df, log=True)
+    np.testing.assert_allclose(G, G0, atol=1e-12)
+    np.testing.assert_allclose(log['loss'], log0['loss'])
+    assert len(log['n_f']) == len(log['loss']) - 1
+    assert min(log['n_df']) == max(log['n_df']) == 1
+
+    # exact line search for the quadratic cost
+    Gq, logq = ot.optim.cg(a, b, M, reg, f, df, log=True,
+                           line_search=ot.optim.LineSearchQuadratic())
+    assert max(logq['n_f']) == 1
+    np.testing.assert_allclose(logq['loss'][-1], f(Gq) * reg + np.sum(M * Gq))
+    assert logq['loss'][-1] <= log['loss'][-1] + 1e-12
+
+    G, log = ot.optim.gcg(a, b, M, 1e-3, reg, f, df, log=True,
+                          line_search=ot.optim.LineSearchArmijo(c1=1e-3))
+    np.testing.assert_allclose(a, G.sum(1), atol=1e-05)
+    assert len(log['n_f']) == len(log['loss']) - 1
+
+    # no step along an ascent direction
+    assert ot.optim.LineSearchArmijo().search(lambda t: t, 1., 0.) == (0, 0, 0)
+
+
+def test_generalized_conditional_gradient_warmstart():
+
+    n_bins = 100  # nb bins
+    np.random.seed(0)
+    # bin positions
+    x = np.arange(n_bins, dtype=np.float64)
+
+    # Gaussian distributions
+    a = ot.datasets.make_1D_gauss(n_bins, m=20, s=5)  # m= mean, s= std
+    b = ot.datasets.make_1D_gauss(n_bins, m=60, s=10)
+
+    # loss matrix
+    M = ot.dist(x.reshape((n_bins, 1)), x.reshape((n_bins, 1)))
+    M /= M.max()
+
+    def f(G):
+        return 0.5 * np.sum(G**2)
+
+    def df(G):
+        return G
+
+    reg1 = 1e-2
+    reg2 = 1e-1
+
+    G, log = ot.optim.gcg(a, b, M, reg1, reg2, f, df, log=True)
+    G0, log0 = ot.optim.gcg(a, b, M, reg1, reg2, f, df, log=True,
+                            warmstart=False)
+    np.testing.assert_allclose(log['loss'][-1], log0['loss'][-1], rtol=1e-3)
+    assert sum(log['n_inner_matvec']) < sum(log0['n_inner_matvec'])
+    np.testing.assert_allclose(b, G.sum(0), atol=1e-04)
+
+    for method in ['sinkhorn_stabilized', 'sinkhorn_epsilon_scaling']:
+        Gm, logm = ot.optim.gcg(a, b, M, reg1, reg2, f, df, log=True,
+                                method=method)
+        np.testing.assert_allclose(a, Gm.sum(1), atol=1e-04)
+        np.testing.assert_allclose(logm['loss'][-1], log['loss'][-1],
+                                   rtol=1e-3)
+
+
+def test_conditional_gradient_gap():
+
+    n_bins = 100  # nb bins
+    np.random.seed(0)
+    # bin positions
+    x = np.arange(n_bins, dtype=np.float64)
+
+    # Gaussian distributions
+    a = ot.datasets.make_1D_gauss(n_bins, m=20, s=5)  # m= mean, s= std
+    b = ot.datasets.make_1D_gauss(n_bins, m=60, s=10)
+
+    # loss matrix
+    M = ot.dist(x.reshape((n_bins, 1)), x.reshape((n_bins, 1)))
+    M /= M.max()
+
+    def f(G):
+        return 0.5 * np.sum(G**2)
+
+    def df(G):
+        return G
+
+    reg = 1e-1
+
+    Gs, logs = ot.optim.cg(a, b, M, reg, f, df, log=True, numItermax=2000,
+                           stopThr=0, stopGap=1e-5)
+    assert logs['fw_gap'][-1] <= 1e-5
+    assert len(logs['fw_gap']) == len(logs['loss']) - 1
+
+    for stopGap in [1e-3, 1e-4]:
+        G, log = ot.optim.cg(a, b, M, reg, f, df, log=True,
+                             numItermax=2000, stopThr=0, stopGap=stopGap)
+        assert log['fw_gap'][-1] <= stopGap
+        assert len(log['loss']) < len(logs['loss'])
+        # the gap bounds the suboptimality of the loss
+        assert log['loss'][-1] - logs['loss'][-1] <= stopGap + 1e-5
+
+    G, log = ot.optim.gcg(a, b, M, 1e-3, reg, f, df, log=True,
+                          numItermax=100, stopGap=1e-5)
+    assert abs(log['fw_gap'][-1]) <= 1e-5
+    assert len(log['fw_gap']) == len(log['loss']) - 1
@@ -46,6 +46,35 @@ def test_emd_emd2():
     np.testing.assert_allclose(w, 0)
 
 
+def test_emd2_grad():
+    # test gradients returned by emd2 against finite differences
+    n = 20
+    rng = np.random.RandomState(0)
+
+    xs = rng.randn(n, 2)
+    xt = rng.randn(n, 2) + 2
+    a = ot.utils.unif(n)
+    b = rng.rand(n)
+    b /= b.sum()
+
+    M = ot.dist(xs, xt)
+
+    w, (ga, gb, gM), log = ot.emd2(a, b, M, return_grad=True, log=True)
+
+    np.testing.assert_allclose(gM, ot.emd(a, b, M))
+    np.testing.assert_allclose(w, np.sum(gM * M))
+    np.testing.assert_allclose(ga.sum(), 0, atol=1e-10)
+
+    # directional derivative along a mass preserving direction
+    d = rng.randn(n)
+    d -= d.mean()
+    eps = 1e-6
+    dd = d * a
+    dd -= dd.mean()
+    wd = ot.emd2(a + eps * dd, b, M)
+    np.testing.assert_allclose((wd - w) / eps, np.dot(ga, dd), rtol=1e-4)
+
+
 def test_emd_empty():
     # test emd and emd2 for simple identity
     n = 100
@@ -0,0 +1,77 @@
+"""Tests for module partial  """
+
+# Author: Remi Flamary <remi.flamary@unice.fr>
+#
+# License: MIT License
+
+import numpy as np
+import ot
+import pytest
+
+
+def test_partial_wasserstein():
+
+    n_samples = 20  # nb samples (gaussian)
+    n_noise = 5  # nb of samples (noise)
+
+    mu = np.array([0, 0])
+    cov = np.array([[1, 0], [0, 2]])
+
+    xs = ot.datasets.make_2D_samples_gauss(n_samples, mu, cov)
+    xs = np.append(xs, (np.random.rand(n_noise, 2) + 1) * 4).reshape((-1, 2))
+    xt = ot.datasets.make_2D_samples_gauss(n_samples, mu, cov)
+    xt = np.append(xt, (np.random.rand(n_noise, 2) + 1) * -3).reshape((-1, 2))
+
+    M = ot.dist(xs, xt)
+
+    p = ot.unif(n_samples + n_noise)
+    q = ot.unif(n_samples + n_noise)
+
+    m = 0.5
+
+    with pytest.raises(ValueError):
+        ot.partial.partial_wasserstein(p, q, M, m=2)
+
+    w0, log0 = ot.partial.partial_wasserstein(p, q, M, m=m, log=True)
+
+    # check constraints
+    np.testing.assert_equal(w0.sum(1) - p <= 1e-5, [True] * len(p))
+    np.testing.assert_equal(w0.sum(0) - q <= 1e-5, [True] * len(q))
+    np.testing.assert_allclose(np.sum(w0), m, atol=1e-04)
+
+    # same as the emd with dummy points added by hand
+    n = n_samples + n_noise
+    M_dummy = np.zeros((2 * n, 2 * n))
+    M_dummy[:n, :n] = M
+    M_dummy[n:, n:] = 2 * np.max(M) + 1
+    p_dummy = np.append(p, ot.unif(n) * (1 - m))
+    q_dummy = np.append(q, ot.unif(n) * (1 - m))
+    w_dummy = ot.emd(p_dummy, q_dummy, M_dummy)
+    np.testing.assert_allclose(log0['cost'], np.sum(w_dummy[:n, :n] * M))
+
+    w, log = ot.partial.partial_wasserstein2(p, q, M, m=m, log=True)
+    np.testing.assert_allclose(w, log0['cost'])
+    np.testing.assert_allclose(log['T'], w0)
+
+    # negative costs
+    M_neg = -10 * np.random.rand(n, n)
+    w_neg = ot.partial.partial_wasserstein(p, q, M_neg, m=m)
+    np.testing.assert_allclose(np.sum(w_neg), m, atol=1e-10)
+    np.testing.assert_equal(w_neg.sum(1) - p <= 1e-10, [True] * len(p))
+    np.testing.assert_equal(w_neg.sum(0) - q <= 1e-10, [True] * len(q))
+
+    # full mass is the exact OT
+    np.testing.assert_allclose(ot.partial.partial_wasserstein2(p, q, M),
+                               ot.emd2(p, q, M), atol=1e-10)
+
+    # entropic partial OT
+    w1, log1 = ot.partial.entropic_partial_wasserstein(p, q, M, reg=1, m=m,
+                                                       log=True)
+    np.testing.assert_equal(w1.sum(1) - p <= 1e-5, [True] * len(p))
+    np.testing.assert_equal(w1.sum(0) - q <= 1e-5, [True] * len(q))
+    np.testing.assert_allclose(np.sum(w1), m, atol=1e-04)
+
+    w, log = ot.partial.entropic_partial_wasserstein2(p, q, M, reg=1, m=m,
+                                                      log=True)
+    np.testing.assert_allclose(w, np.sum(w1 * M))
+    np.testing.assert_allclose(log['T'], w1)
@@ -189,3 +189,32 @@ def test_dual_sgd_sinkhorn():
         zero, (G_sgd - G_sinkhorn).sum(0), atol=1e-02)  # cf convergence sgd
     np.testing.assert_allclose(
         G_sgd, G_sinkhorn, atol=1e-02)  # cf convergence sgd
+
+
+def test_stochastic_control():
+    # test budgets on the stochastic solvers
+
+    n_source = 7
+    n_target = 4
+    reg = 1
+    rng = np.random.RandomState(0)
+
+    a = ot.utils.unif(n_source)
+    b = ot.utils.unif(n_target)
+
+    X_source = rng.randn(n_source, 2)
+    Y_target = rng.randn(n_target, 2)
+    M = ot.dist(X_source, Y_target)
+
+    control = ot.utils.SolverControl(max_matvec=100)
+    G, log = ot.stochastic.solve_semi_dual_entropic(a, b, M, reg, "sag",
+                                                    numItermax=100000,
+                                                    log=True, control=control)
+    assert log['status'] == 2
+    np.testing.assert_allclose(log['n_matvec'], 100, rtol=1e-2)
+
+    control = ot.utils.SolverControl(max_matvec=100)
+    G, log = ot.stochastic.solve_dual_entropic(a, b, M, reg, 2,
+                                               numItermax=100000, log=True,
+                                               control=control)
+    assert log['status'] == 2